@@ -1,17 +1,140 @@
 #! /bin/bash/env python
 # Code to deinterleave FASTA files.
-import sys
-linenum = 0
-infile = open(sys.argv[1], 'r')
-with open(sys.argv[1] + '2', 'w') as outfile:
-    for line in infile:
-        line = line.strip()
-        if len(line) > 0:
-            if line[0] == '>':
-                if linenum == 0:
-                    outfile.write(line + '\n')
-                    linenum += 1
-                else:
-                    outfile.write('\n' + line + '\n')
+# Usage:
+#   python deinterleave.py genome.fna [genome2.fna.gz ...] [--jobs 4] [--gzip]
+# Writes each record as one header line and one sequence line to genome.fna2 (genome2.fna2 for genome2.fna.gz). Inputs that would share an output, such as genome.fna and genome.fna.gz, are rejected.
+# Input is read in large blocks and every block is written with one joined write. Files compressed with gzip or bgzip are decompressed on the fly, and --gzip compresses the output (genome.fna2.gz).
+# --jobs deinterleaves several files at once in a pool of processes. The throughput of every file is reported in MB/s.
+from __future__ import print_function
+import os, re, time, gzip, argparse, multiprocessing
+
+BLOCKSIZE = 8*1024**2
+GZIP_MAGIC = b'\x1f\x8b'
+HEADER = re.compile(br'^[ \t\r\x0b\x0c]*>.*$', re.M)  # a line that starts with '>' once stripped
+STRAY_WHITESPACE = (b' ', b'\t', b'\r', b'\x0b', b'\x0c')  # whitespace other than line breaks, checked with fast substring tests
+LINE_BREAK = re.compile(br'\s*\n\s*')  # a line break with the whitespace stripped from both neighbouring lines
+
+def open_input(filename):
+    """Open a FASTA file for reading bytes, decompressing gzip and bgzip files."""
+    with open(filename, 'rb') as handle:
+        compressed = handle.read(2) == GZIP_MAGIC
+    return gzip.open(filename, 'rb') if compressed else open(filename, 'rb')
+
+def output_name(filename, compress):
+    """genome.fna -> genome.fna2, genome.fna.gz -> genome.fna2, plus .gz when compressing the output."""
+    if filename.endswith('.gz'):
+        filename = filename[:-3]
+    return filename + '2' + ('.gz' if compress else '')
+
+def has_stray_whitespace(text):
+    """True if text has whitespace that the line-by-line version would have stripped, besides line breaks."""
+    return any(char in text for char in STRAY_WHITESPACE)
+
+def header_lines(part, stray):
+    """Yield the (start, end) of every header line in a block of whole lines.
+    Blocks without stray whitespace are searched for line breaks followed by '>', which is much faster than the regular expression."""
+    if stray:
+        for match in HEADER.finditer(part):
+            yield match.start(), match.end()
+        return
+    start = 0 if part.startswith(b'>') else part.find(b'\n>')+1 or -1
+    while start >= 0:
+        end = part.find(b'\n', start)
+        yield start, end
+        start = part.find(b'\n>', end)+1 or -1
+
+def join_lines(seq, stray):
+    """Join whole sequence lines, stripping each line as the line-by-line version did."""
+    if stray:
+        return LINE_BREAK.sub(b'', seq).lstrip()
+    return seq.replace(b'\n', b'')
+
+def deinterleave(filename, compress=False, blocksize=BLOCKSIZE):
+    """Deinterleave one file. Returns the output name, the bytes read and the seconds taken."""
+    started, nbytes = time.time(), 0
+    first_header, at_line_start, carry = True, True, b''
+    outname = output_name(filename, compress)
+    infile = open_input(filename)
+    outfile = gzip.open(outname, 'wb', 6) if compress else open(outname, 'wb')
+    try:
+        while True:
+            block = infile.read(blocksize)
+            nbytes += len(block)
+            buf = carry + block
+            if not buf:
+                break
+            if block:
+                cut = buf.rfind(b'\n')+1
             else:
-                outfile.write(line)
+                cut = len(buf)  # end of file: the last line is complete
+                if buf and not buf.endswith(b'\n'):
+                    buf += b'\n'
+                    cut += 1
+            out = []
+            if cut == 0:
+                # No line break in the buffer. Keep a header (or blank start of a line) for the next block; write what is certain of a long sequence line.
+                if at_line_start and (not buf.strip() or buf.lstrip().startswith(b'>')):
+                    carry = buf
+                    continue
+                seq = buf.rstrip()
+                out.append(seq.lstrip() if at_line_start else seq)
+                carry, at_line_start = buf[len(seq):], False
+            else:
+                part, carry = buf[:cut], buf[cut:]
+                if not at_line_start:
+                    # The first line continues a sequence line from the previous block.
+                    newline = part.find(b'\n')
+                    out.append(part[:newline].rstrip())
+                    part = part[newline+1:]
+                pos, stray = 0, has_stray_whitespace(part)
+                for start, end in header_lines(part, stray):
+                    out.append(join_lines(part[pos:start], stray))
+                    out.append((b'' if first_header else b'\n') + part[start:end].strip() + b'\n')
+                    first_header, pos = False, end+1
+                out.append(join_lines(part[pos:], stray))
+                at_line_start = True
+            outfile.write(b''.join(out))
+            if not block:
+                break
+    finally:
+        infile.close()
+        outfile.close()
+    return outname, nbytes, time.time()-started
+
+def deinterleave_job(job):
+    """Pool wrapper around deinterleave."""
+    return (job[0],) + deinterleave(*job)
+
+def report(filename, outname, nbytes, seconds):
+    """Print the throughput of one file."""
+    mb = nbytes/1024.0**2
+    print('{}: {:.1f} MB in {:.2f} s ({:.1f} MB/s) -> {}'.format(filename, mb, seconds, mb/max(seconds, 1e-9), outname))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write every record of FASTA files as one header line and one sequence line.')
+    parser.add_argument('inputfiles', nargs='+', help='FASTA files to deinterleave, optionally gzip or bgzip compressed')
+    parser.add_argument('--jobs', type=int, default=1, help='number of files to deinterleave at once (default 1)')
+    parser.add_argument('--gzip', action='store_true', help='compress the output with gzip')
+    args = parser.parse_args()
+    outputs = {}
+    for filename in args.inputfiles:
+        outputs.setdefault(os.path.abspath(output_name(filename, args.gzip)), []).append(filename)
+    clashes = [' and '.join(filenames) + ' -> ' + outname for outname, filenames in sorted(outputs.items()) if len(filenames) > 1]
+    if clashes:
+        parser.error('these inputs would be written to the same output: ' + ', '.join(clashes))
+    jobs = [(filename, args.gzip) for filename in args.inputfiles]
+    start, total = time.time(), 0
+    if args.jobs > 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(min(args.jobs, len(jobs)))
+        results = pool.imap(deinterleave_job, jobs)
+    else:
+        pool = None
+        results = (deinterleave_job(job) for job in jobs)
+    for filename, outname, nbytes, seconds in results:
+        report(filename, outname, nbytes, seconds)
+        total += nbytes
+    if pool is not None:
+        pool.close()
+        pool.join()
+    if len(jobs) > 1:
+        report('all files', str(len(jobs))+' outputs', total, time.time()-start)
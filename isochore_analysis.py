@@ -0,0 +1,669 @@
+#!/usr/bin/python
+
+##  Importable GC content analysis of FASTA files, used by isochore_analyzer1.831.py and isochore_batch.py.
+##  Usage:
+##    >>> import isochore_analysis
+##    >>> manifests = isochore_analysis.analyze('filename.fasta', 'organism', 'group', [1000, 5000], memory_budget='4G', jobs=4)
+##  analyze writes the same run folders as the analyzer script (see isochore_analyzer1.831.py for the options and the outputs) to outputdir (default: the working directory) and returns the manifest of every window size. Input it cannot analyze raises ValueError instead of exiting, so one process can analyze many genomes in turn without starting a new interpreter and importing NumPy for each.
+##  The steps of an analysis can also be used on their own:
+##    read << check_input, stream_fasta and Analysis.contigs, which read the contigs of a file in file order or by name
+##    count << stream_cumulative_counts and indexed_cumulative_counts, which count every contig in blocks of the greatest common divisor of the window sizes; Analysis.plan counts one window size at a time instead when the counts of the longest contig (count_memory) would not fit within the memory budget
+##    window << window_gc, which derives the GC percentages of the windows of one window size from the cumulative block counts of a contig
+##    summarize << summarize, which returns the summary statistics of the GC percentages of a run
+##    write << WindowRun, which writes the output files, log, statistics and manifest of one window size
+##    segment << isochore_segment.segment, which splits a contig into GC domains from the same cumulative block counts; with segment (a unit size in bases), every contig is segmented as it is counted and the domains of the genome are written to domains_<organism>_<time since epoch>.bed in the output folder
+##    metrics << isochore_metrics, which counts the bases and dinucleotides its metrics need in the same blocks and pass as the GC content; with metrics (names of isochore_metrics.METRICS), contig_cumulative_counts, RegionCounter and indexed_cumulative_counts also return their cumulative counts, and WindowRun adds the metric columns of every analyzed window to its output. The cache only holds GC and AT counts, so it is not used with metrics.
+##  Every run is timed by stage with StageTimers, and the wall-clock and CPU seconds of each stage are added to the end of the log and to the manifest with the throughput and peak memory of the run:
+##    check << checking the window sizes, the input format and the memory budget, which reads the index of the input
+##    cache << looking up the counts in the cache (which checksums the input) and saving them there
+##    read << reading (and decompressing) streamed input; memory-mapped input is read as it is counted, so its reading is part of count
+##    count << splitting the sequence into contigs and counting their blocks (or loading them from the cache), including the worker processes of jobs
+##    window << deriving the windows of every window size and their metrics
+##    stats << updating the summary statistics of every window size with its windows
+##    write << writing the windows to the output files (the TSV files and the binary output)
+##    segment << segmenting every contig into GC domains, with segment
+##    checksum << the SHA-256 checksum of the input, when the cache did not compute it
+##    summarize << the summary statistics of one window size, reported in its own log and manifest only
+##  With profile, the counting loop (the read, count, window, stats, write and segment stages) runs under cProfile. The statistics are saved to profile_<organism>_<time since epoch>.prof in the output folder, for pstats or snakeviz, and the 20 functions with the most cumulative time are printed. Only this process is profiled, not the worker processes of jobs.
+
+##  Setup environment:
+from  __future__ import print_function
+import sys, os, time, datetime, errno, json, itertools, functools, contextlib, multiprocessing, resource, cProfile, pstats, numpy
+import isochore_counts, isochore_fasta, isochore_stats, isochore_cache, isochore_pack, isochore_windows, isochore_segment, isochore_metrics
+from collections import OrderedDict
+
+SCRIPT = 'isochore_analyzer1.831.py'	##script named in the manifests
+cpu_clock = getattr(time, 'process_time', None) or time.clock	##seconds of processor time; time.clock is gone from Python 3.8
+FORMATS = ['tsv', 'binary', 'both']	##output formats of the windows: the three TSV files, the columnar binary output of isochore_windows.py, or both
+STAGES = ['check', 'cache', 'read', 'count', 'window', 'stats', 'write', 'segment', 'checksum']	##stages timed for every run, in the order they are reported
+
+##  Functions:
+def check_input(inputfile):
+	"""Return True for a packed genome store and False for a FASTA file (plain or compressed), and raise ValueError for anything else."""
+	if isochore_pack.is_packed(inputfile):
+		print('Looks like you supplied a packed genome store.')
+		return True
+	with isochore_fasta.open_fasta(inputfile) as inputdata:
+		for line in inputdata:
+			if line.startswith(b'#'):
+				continue
+			else:
+				if line.startswith(b'>'):
+					print('Looks like you supplied a fasta-formatted file.')
+					break
+				else:
+					raise ValueError('could not verify that the input file was a fasta-formatted file. Check the input data.')
+	return False
+
+def stream_fasta(handle, chunksize):
+	"""Yield (record number, header, sequence piece) tuples from a binary file, reading at most chunksize bytes at a time.
+	Each record starts with an empty piece so that contigs without sequence are still reported. Newlines and other whitespace are removed from the sequence, so interleaved records are joined."""
+	recordno, header, buf, in_header, at_line_start = 0, None, b'', False, True
+	while True:
+		chunk = handle.read(chunksize)
+		if not chunk:
+			break
+		buf, pos = buf + chunk, 0
+		while pos < len(buf):
+			if in_header:
+				newline = buf.find(b'\n', pos)
+				if newline < 0:
+					break	##the header line continues in the next chunk
+				recordno, header = recordno+1, isochore_fasta._text(buf[pos:newline]).replace('>', '').strip().replace(' ', '_')
+				in_header, at_line_start, pos = False, True, newline+1
+				yield recordno, header, b''
+			elif at_line_start and buf[pos:pos+1] == b'>':
+				in_header = True
+			else:
+				nextheader = buf.find(b'\n>', pos)
+				end = len(buf) if nextheader < 0 else nextheader+1
+				if header is not None:
+					piece = b''.join(buf[pos:end].split())
+					if piece:
+						yield recordno, header, piece
+				at_line_start, pos = buf[end-1:end] == b'\n', end
+		buf = buf[pos:]
+
+def contig_cumulative_counts(pieces, blocksize, columns=None):
+	"""Count one contig, given as pieces of sequence, in blocks of blocksize bases and return its cumulative GC and AT counts at every block boundary, its length and, with columns, the cumulative counts of those bases and dinucleotides (see isochore_metrics.block_counts; otherwise None)."""
+	carry, gc_blocks, at_blocks, extra_blocks, previous, length = b'', [], [], [], b'', 0
+	for piece in pieces:
+		buf = carry + piece
+		gc, at = isochore_counts.window_counts(buf, blocksize)
+		gc_blocks.append(gc)
+		at_blocks.append(at)
+		if columns:
+			extra_blocks.append(isochore_metrics.block_counts(buf, blocksize, columns, previous))
+			if len(gc):
+				previous = buf[len(gc)*blocksize-1:len(gc)*blocksize]	##the base before the carry, for the dinucleotide that spans it
+		carry, length = buf[len(gc)*blocksize:], length+len(piece)
+	cum_gc, cum_at = isochore_counts.cumulative_counts(numpy.concatenate(gc_blocks), numpy.concatenate(at_blocks))
+	return cum_gc, cum_at, length, isochore_counts.cumulative(numpy.concatenate(extra_blocks)) if columns else None
+
+def stream_cumulative_counts(handle, chunksize, blocksize, columns=None):
+	"""Yield (record number, key, cumulative GC counts, cumulative AT counts, length, cumulative counts of columns or None) for every record of a FASTA file read from start to end, renaming repeated keys as the analyzer always has."""
+	seen = set()
+	for (recordno, key), records in itertools.groupby(stream_fasta(handle, chunksize), lambda record: record[:2]):
+		if key in seen:
+			key = key+'_duplicate'
+		seen.add(key)
+		cum_gc, cum_at, length, cum_extra = contig_cumulative_counts((record[2] for record in records), blocksize, columns)
+		yield recordno, key, cum_gc, cum_at, length, cum_extra
+
+class RegionCounter(object):
+	"""Memory map of the input file (a FASTA file or a packed genome store) through its index, and the blocks to count in its regions."""
+	def __init__(self, inputfile, index, packed, blocksize, columns=None):
+		self.reader = isochore_pack.PackedGenome(inputfile, index) if packed else isochore_fasta.FastaMmap(inputfile, index)
+		self.index, self.packed, self.blocksize, self.columns = self.reader.index, packed, blocksize, columns
+
+	def count(self, region):
+		"""Count the GC and AT blocks of one region of a contig, given as (index record, first base, end base), and the blocks of the bases and dinucleotides of columns, if any."""
+		record, start, end = region
+		if self.columns:
+			seq = self.reader.region(record, start, end)
+			return isochore_counts.window_counts(seq, self.blocksize)+(isochore_metrics.block_counts(seq, self.blocksize, self.columns, self.reader.region(record, max(start-1, 0), start)),)
+		if self.packed:
+			return self.reader.window_counts(record, start, end, self.blocksize)
+		return isochore_counts.window_counts(self.reader.region(record, start, end), self.blocksize)
+
+	def close(self):
+		"""Release the memory map."""
+		self.reader.close()
+
+def _start_worker(inputfile, index, packed, blocksize, columns):
+	"""Open the RegionCounter of a worker process of indexed_cumulative_counts, which only gets the coordinates of its regions, so sequence data never has to be pickled."""
+	global _worker
+	_worker = RegionCounter(inputfile, index, packed, blocksize, columns)
+
+def _count_in_worker(region):
+	"""Count one region in a worker process with its RegionCounter."""
+	return _worker.count(region)
+
+def indexed_cumulative_counts(counter, records, jobs, regionsize):
+	"""Yield (cumulative GC counts, cumulative AT counts, cumulative counts of the columns of counter or None) for every index record, in order.
+	Contigs longer than regionsize are counted in regions of regionsize bases, a multiple of the block size, by a pool of jobs worker processes that each open their own RegionCounter (or by counter, if jobs is 1), and the regions are merged in order."""
+	columns = counter.columns
+	regions, nregions = [], []
+	for record in records:
+		pieces = [(record, start, min(start+regionsize, record.length)) for start in range(0, record.length, regionsize)]
+		regions.extend(pieces)
+		nregions.append(len(pieces))
+	if jobs > 1:
+		pool = multiprocessing.Pool(jobs, _start_worker, (counter.reader.path, counter.index, counter.packed, counter.blocksize, columns))
+		results = pool.imap(_count_in_worker, regions)
+	else:
+		pool = None
+		results = (counter.count(region) for region in regions)
+	try:
+		for n in nregions:
+			parts = [next(results) for i in range(n)]
+			gc = numpy.concatenate([part[0] for part in parts]) if parts else numpy.zeros(0, dtype=numpy.int64)
+			at = numpy.concatenate([part[1] for part in parts]) if parts else numpy.zeros(0, dtype=numpy.int64)
+			extra = isochore_counts.cumulative(numpy.concatenate([part[2] for part in parts]) if parts else numpy.zeros((0, len(columns)), dtype=numpy.int64)) if columns else None
+			yield isochore_counts.cumulative_counts(gc, at)+(extra,)
+	finally:
+		if pool is not None:
+			pool.terminate()
+
+def window_totals(cum_gc, cum_at, windowsize, blocksize, step=None):
+	"""Return the GC and AT counts of every complete window of one contig, from its cumulative block counts."""
+	if step:
+		return isochore_counts.sliding_windows_from_cumulative(cum_gc, cum_at, windowsize//blocksize, step//blocksize)
+	return isochore_counts.windows_from_cumulative(cum_gc, cum_at, windowsize//blocksize)
+
+def window_gc(cum_gc, cum_at, windowsize, blocksize, step=None):
+	"""Return the GC percentages of the windows of one contig that precede its first missing-data window, the index of that window (None if there is none) and the number of complete windows, from its cumulative block counts."""
+	gc, at = window_totals(cum_gc, cum_at, windowsize, blocksize, step)
+	GCPercent, first_missing = isochore_counts.classify_windows(gc, at, windowsize)
+	return GCPercent, first_missing, len(gc)
+
+def count_memory(length, blocksize, windowsizes, step=None, ncolumns=0):
+	"""Return the most memory the counts of one contig of length bases take while it is windowed: its block counts, merged into cumulative counts (three int64 arrays of every count at once), and the window counts and GC percentages of every window size."""
+	nblocks = length//blocksize+1
+	nwindows = sum(length//(step or windowsize)+1 for windowsize in windowsizes)
+	return 24*(2+ncolumns)*nblocks+8*(6+ncolumns)*nwindows
+
+def cpu_seconds():
+	"""Processor seconds used by this process and by the worker processes it has waited for."""
+	times = os.times()
+	return times[0]+times[1]+times[2]+times[3]
+
+def peak_memory():
+	"""Return the peak resident set size of this process and of its largest finished child process (the workers of jobs), in bytes (ru_maxrss is in kilobytes on Linux)."""
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss*1024
+
+class StageTimers(object):
+	"""Wall-clock and CPU seconds spent in each stage of a run. Stages can be nested, and every second is counted in the innermost stage running, so the stages add up to the time of the run."""
+	def __init__(self):
+		self.seconds = OrderedDict()	##stage: [wall seconds, CPU seconds]
+		self.running = []	##[stage, wall clock, CPU clock] of the stages running, innermost last
+
+	def _charge(self, wall, cpu):
+		"""Add the time since the innermost running stage was last charged to it."""
+		stage = self.running[-1]
+		totals = self.seconds.setdefault(stage[0], [0.0, 0.0])
+		totals[0], totals[1] = totals[0]+wall-stage[1], totals[1]+cpu-stage[2]
+		stage[1], stage[2] = wall, cpu
+
+	@contextlib.contextmanager
+	def stage(self, name):
+		"""Time the body of a with statement as the given stage."""
+		wall, cpu = time.time(), cpu_seconds()
+		if self.running:
+			self._charge(wall, cpu)
+		self.running.append([name, wall, cpu])
+		try:
+			yield
+		finally:
+			wall, cpu = time.time(), cpu_seconds()
+			self._charge(wall, cpu)
+			self.running.pop()
+			if self.running:
+				self.running[-1][1], self.running[-1][2] = wall, cpu
+
+	def wall(self, name):
+		"""Wall-clock seconds spent in a stage."""
+		return self.seconds.get(name, [0.0, 0.0])[0]
+
+class _TimedFile(object):
+	"""File whose reads are timed as the read stage."""
+	def __init__(self, handle, timers):
+		self.handle, self.timers = handle, timers
+
+	def read(self, size):
+		with self.timers.stage('read'):
+			return self.handle.read(size)
+
+def summarize(stats):
+	"""Return the number of windows, mean, SD, lowest, highest and median GC percentage of a GcStats, all 0 if it has no windows."""
+	stats.flush()
+	if stats.count > 0.0:
+		return stats.count, stats.mean, numpy.float64(stats.sd()), stats.minimum, stats.maximum, stats.median()	##the SD is printed like numpy.std, and the median is from the histogram, to within 100/isochore_stats.BINS percent
+	return stats.count, 0, 0, 0, 0, 0
+
+class WindowRun(object):
+	"""Output folder, files, counters and GC percentages for the analysis at one window size."""
+	def __init__(self, analysis, windowsize):
+		self.analysis, self.windowsize = analysis, windowsize
+		self.dgc_num, self.dmissing_num, self.dshort_num = 0, 0, 0
+		self.stats = isochore_stats.GcStats()	##running summary statistics of the GC percentages, so the windows are never held or sorted
+		name = str(analysis.organism)+'_'+str(windowsize)+'_'+str(analysis.timesinceepoch)
+		self.outfolder = 'Run1.831_GC_output_'+name
+		self.outfolder_path = analysis.outputdir+'/'+self.outfolder
+		try:
+			os.makedirs(self.outfolder_path)
+		except OSError as exc:  # Python >2.5
+			if exc.errno == errno.EEXIST and os.path.isdir(self.outfolder_path):
+				pass
+			else:
+				raise
+		self.dgc_ = 'gc_content_'+name+'.tsv'
+		self.dmissing_ = 'unused_contigs_missing_data_'+name+'.tsv'
+		self.dshort_ = 'unused_short_contigs_content_'+name+'.tsv'
+		self.log_ = 'log_'+name+'.txt'
+		self.stats_ = 'stats_'+name+'.json'
+		self.manifest_ = 'manifest_'+name+'.json'
+		self.windows_ = 'windows_'+name+'.npy'
+		self.contigs_ = 'contigs_'+name+'.json'
+		self.tsv, self.columns = analysis.output_format in ('tsv', 'both'), None
+		if self.tsv:
+			self.dgc_output = open(os.path.join(self.outfolder_path, self.dgc_), 'w')
+			self.dmissing_output = open(os.path.join(self.outfolder_path, self.dmissing_), 'w')
+			self.dshort_output = open(os.path.join(self.outfolder_path, self.dshort_), 'w')
+		if analysis.output_format in ('binary', 'both'):
+			self.columns = isochore_windows.WindowColumns(os.path.join(self.outfolder_path, self.windows_), os.path.join(self.outfolder_path, self.contigs_), analysis.metric_types)
+
+	def add_contig(self, key, cum_gc, cum_at, cum_extra=None):
+		"""Analyze the windows of one contig from its cumulative block counts and write them to the output files.
+		As before, the first missing-data window or the final partial window ends the analysis of the contig. With a step, every line also gets the start and end of its window, and with metrics every analyzed window gets their columns, from the cumulative metric counts cum_extra."""
+		analysis, step = self.analysis, self.analysis.step
+		gc, at = window_totals(cum_gc, cum_at, self.windowsize, analysis.blocksize, step)
+		GCPercent, first_missing = isochore_counts.classify_windows(gc, at, self.windowsize)
+		nwindows = len(gc)
+		with analysis.timers.stage('stats'):
+			self.stats.update(GCPercent)
+		metrics = []
+		if cum_extra is not None:
+			counts = isochore_counts.window_sums(cum_extra, self.windowsize//analysis.blocksize, step//analysis.blocksize if step else None)[:len(GCPercent)]
+			metrics = isochore_metrics.window_metrics(analysis.metrics, analysis.metric_counts, counts, self.windowsize)
+		self.dgc_num = self.dgc_num+len(GCPercent)
+		if first_missing is not None:
+			self.dmissing_num = self.dmissing_num+1
+		else:
+			self.dshort_num = self.dshort_num+1
+		with analysis.timers.stage('write'):
+			if self.columns:
+				self.columns.add_contig(key, GCPercent, self.windowsize-gc-at, first_missing, nwindows, metrics)
+			if self.tsv:
+				self.write_tsv(key, GCPercent, first_missing, nwindows, metrics)
+
+	def write_tsv(self, key, GCPercent, first_missing, nwindows, metrics):
+		"""Write the windows of one contig to the three TSV files."""
+		organism, group, step = self.analysis.organism, self.analysis.group, self.analysis.step
+		if step:
+			coordinates = lambda i: "\t{}\t{}".format(i*step, i*step+self.windowsize)
+		else:
+			coordinates = lambda i: ''
+		GCPercent = GCPercent.tolist()
+		if metrics:
+			extra = ['\t'+'\t'.join(row) for row in zip(*isochore_metrics.text_columns(metrics))]
+			self.dgc_output.writelines("{}\t{}\t{}\t{}{}{}\n".format(str(key)+'_'+str(i), value, organism, group, coordinates(i), extra[i]) for i, value in enumerate(GCPercent))
+		else:
+			self.dgc_output.writelines("{}\t{}\t{}\t{}{}\n".format(str(key)+'_'+str(i), value, organism, group, coordinates(i)) for i, value in enumerate(GCPercent))
+		if first_missing is not None:
+			self.dmissing_output.write("{}\t{}\t{}\t{}{}\n".format(str(key)+'_'+str(first_missing), 1, organism, group, coordinates(first_missing)))
+		else:
+			self.dshort_output.write("{}\t{}\t{}\t{}{}\n".format(str(key)+'_'+str(nwindows), 1, organism, group, coordinates(nwindows)))
+
+	def finish(self):
+		"""Report the percentages and summary statistics, close the output files and write the log and the manifest, which is returned."""
+		analysis, windowsize_commandline = self.analysis, self.windowsize
+		summarizing = time.time(), cpu_seconds()
+		print('\n======================================\n\nResults for the', windowsize_commandline, 'base pair windows:')
+		##  Count number of missing values as percentage and report to terminal:
+		dtotal_num = float(self.dgc_num+self.dmissing_num+self.dshort_num)
+		dgc_perc = float((self.dgc_num/dtotal_num)*100)
+		dmissing_perc = float((self.dmissing_num/dtotal_num)*100)
+		dshort_perc = float((self.dshort_num/dtotal_num)*100)
+		print('\nAs a percent of all contigs recovered,',dgc_perc,'percent could have their GC content analyzed.')
+		print('As a percent of all contigs recovered,',dmissing_perc,'percent could not have their GC content analyzed because there was too much ambiguous or missing data.')
+		print('As a percent of all contigs recovered,',dshort_perc,'percent could not have their GC content analyzed because the contig was not larger than or equal to',windowsize_commandline,'base pairs.')
+		if (dmissing_perc+dshort_perc) >= 10:
+			print(dmissing_perc+dshort_perc,'percent of contigs could not be used to calculate GC content.'	)
+			print('Warning! The amount of missing data exceeded 10 percent as measured by the percentage of contigs that could be used. Be sure this is okay for the interpretation of your results.')
+		else:
+			print(dmissing_perc+dshort_perc,'percent of contigs could not be used to calculate GC content.')
+
+		##  Summarize the results:
+		GCnum, GCmean, GCsd, GCrange_lower, GCrange_upper, GCmedian = summarize(self.stats)
+		print('\nSummary of results from isochore analysis by', analysis.windowkind, windowsize_commandline,'base pair windows:')
+		print('Mean GC content:',GCmean,'percent.')
+		print('Standard deviation of GC content:',GCsd, 'percent.')
+		print('GC content ranges from',GCrange_lower,'percent to',GCrange_upper,'percent.')
+		print('Median GC content:',GCmedian,'percent.')
+		print('Overall, there were',GCnum,'contigs analyzed.')
+		print('GC content percentiles (5th, 25th, 75th, 95th):', ', '.join(str(self.stats.percentile(q)) for q in (5, 25, 75, 95)), 'percent.')
+
+		##  Close output: tsv of dgc, dmissing, dshort, and the binary windows and contigs
+		print('\nWriting output files to', self.outfolder_path)
+		files = []
+		if self.tsv:
+			self.dgc_output.close()
+			print('Successfully created', self.dgc_)
+			self.dmissing_output.close()
+			print('Successfully created', self.dmissing_)
+			self.dshort_output.close()
+			print('Successfully created', self.dshort_)
+			files = [('gc_content', self.dgc_), ('missing', self.dmissing_), ('short', self.dshort_)]
+		if self.columns:
+			self.columns.close()
+			print('Successfully created', self.windows_)
+			print('Successfully created', self.contigs_)
+			files = files+[('windows', self.windows_), ('contigs', self.contigs_)]
+		print('Now writing a log file to:', self.log_)
+
+		now, then, elapsedtime = analysis.now, analysis.then, analysis.elapsedtime
+		stages = OrderedDict((stage, analysis.timers.seconds.get(stage, [0.0, 0.0])) for stage in STAGES)
+		stages['summarize'] = [time.time()-summarizing[0], cpu_seconds()-summarizing[1]]
+		wall = sum(stage_wall for stage_wall, stage_cpu in stages.values())
+		peak_rss, peak_child_rss = peak_memory()
+		##The log is written to a temporary file and renamed into place after the statistics and the manifest, so a run only has a log once it is complete: the summarizer uses the newest run with a log, and reads its step from the manifest.
+		logpath = os.path.join(self.outfolder_path, self.log_)
+		with open(logpath+'.tmp', 'w') as l:
+			print('Script started at:', now, '\nThe file analyzed was:', analysis.combined, '\nThe file was a valid fasta file format.', '\n'+analysis.memory_check, '\nWindow size provided or assumed:', windowsize_commandline, '(i.e.,', windowsize_commandline//1000, 'kb).\n',analysis.headernum, 'fasta headers (i.e., contigs) were detected.\n','As a percent of all contigs recovered,' ,dgc_perc, 'percent could have their GC content analyzed.\n', 'As a percent of all contigs recovered,', dmissing_perc, 'percent could not have their GC content analyzed because there was too much ambiguous or missing data.', '\nAs a percent of all contigs recovered,' ,dshort_perc, 'percent could not have their GC content analyzed because the contig was not larger than or equal to', windowsize_commandline, 'base pairs.\n', file=l)
+			if (dmissing_perc+dshort_perc) >= 10:
+				print(dmissing_perc+dshort_perc, 'percent of contigs could not be used to calculate GC content.\n', 'Warning! The amount of missing data exceeded 10 percent as measured by the percentage of contigs that could be used. Be sure this is okay for the interpretation of your results.\n', file=l)
+			else:
+				print(float(dmissing_perc+dshort_perc), 'percent of contigs could not be used to calculate GC content.\n', file=l)
+			print('Summary of results from isochore analysis by', analysis.windowkind, windowsize_commandline, 'base pair windows:\n', 'Mean GC content:', GCmean, 'percent.\n', 'Standard deviation of GC content:', GCsd, 'percent.\n', 'GC content ranges from', GCrange_lower, 'percent to', GCrange_upper, 'percent.\n', 'Median GC content:', GCmedian, 'percent.\n', 'Overall, there were', GCnum, 'contigs analyzed.\n', 'Script finished at:', then,'\n', elapsedtime, 'seconds elapsed running this script (i.e.,', round(elapsedtime/60, 2), 'minutes).', file=l)
+			print('\nSeconds spent in each stage (wall-clock, CPU including worker processes):', file=l)
+			for stage, (stage_wall, stage_cpu) in stages.items():
+				print(' ', stage+':', round(stage_wall, 4), 'wall,', round(stage_cpu, 4), 'CPU', file=l)
+			print('Throughput:', 'NA' if analysis.bases is None else int(analysis.bases/max(wall, 1e-9)), 'bases per second and', int(analysis.windows/max(wall, 1e-9)), 'windows (of every window size) per second over', round(wall, 4), 'seconds of wall-clock time.', file=l)
+			print('Peak memory (resident set size):', peak_rss//1024**2, 'Mb in the main process and', peak_child_rss//1024**2, 'Mb in the largest child (worker) process.', file=l)
+		self.stats.save(os.path.join(self.outfolder_path, self.stats_))
+		print('Successfully created', self.stats_)
+
+		##  Write the same results with typed fields to the manifest, which the summarizer reads instead of the log:
+		manifest = OrderedDict([('script', analysis.script), ('organism', analysis.organism), ('group', analysis.group),
+			('input_file', analysis.combined), ('input_bytes', analysis.filesize), ('input_sha256', analysis.checksum),
+			('window_size', windowsize_commandline), ('step', analysis.step), ('contigs', analysis.headernum),
+			('windows_analyzed', GCnum), ('windows_missing', self.dmissing_num), ('windows_short', self.dshort_num),
+			('recovered_percent', dgc_perc), ('missing_percent', dmissing_perc), ('short_percent', dshort_perc), ('ignored_percent', dmissing_perc+dshort_perc),
+			('mean_gc', GCmean), ('sd_gc', float(GCsd)), ('range_low_gc', GCrange_lower), ('range_high_gc', GCrange_upper), ('median_gc', GCmedian),
+			('started', now.isoformat()), ('finished', then.isoformat()), ('elapsed_seconds', elapsedtime), ('wall_seconds', (then-now).total_seconds()),
+			('stages', OrderedDict((stage, OrderedDict([('wall_seconds', stage_wall), ('cpu_seconds', stage_cpu)])) for stage, (stage_wall, stage_cpu) in stages.items())),
+			('bases', analysis.bases), ('bases_per_second', None if analysis.bases is None else analysis.bases/max(wall, 1e-9)), ('windows_per_second', analysis.windows/max(wall, 1e-9)),
+			('peak_rss_bytes', peak_rss), ('peak_child_rss_bytes', peak_child_rss), ('profile', analysis.profile_path),
+			('domains', analysis.domains_path), ('domains_found', analysis.ndomains if analysis.domains_path else None),
+			('metrics', analysis.metrics), ('metric_columns', analysis.metric_columns),
+			('files', OrderedDict(files+[('log', self.log_), ('stats', self.stats_)]))])
+		with open(os.path.join(self.outfolder_path, self.manifest_), 'w') as handle:
+			json.dump(manifest, handle, indent=2)
+			handle.write('\n')
+		print('Successfully created', self.manifest_)
+		os.rename(logpath+'.tmp', logpath)
+		print('Successfully created', self.log_)
+		return manifest
+
+class Analysis(object):
+	"""One analysis of an input file at one or more window sizes: the settings, how the file is read, and the results shared by every window size."""
+	def __init__(self, inputfile, organism='', group='', windowsizes=(5000,), step=None, memory_budget=None, stream=False, jobs=1, cache_dir=None, cache_size=isochore_cache.CACHE_SIZE, outputdir=None, script=SCRIPT, profile=False, output_format='tsv',
+		segment=None, min_domain=isochore_segment.MIN_DOMAIN, domain_pvalue=isochore_segment.PVALUE, metrics=None):
+		self.inputfile, self.organism, self.group = inputfile, str(organism), str(group)
+		self.windowsizes, self.step = sorted(set(int(size) for size in windowsizes)), step
+		self.memory_budget = isochore_cache.parse_size(memory_budget) if isinstance(memory_budget, str) else memory_budget
+		self.stream, self.jobs, self.cache_dir = stream, jobs, cache_dir
+		self.cache_size = isochore_cache.parse_size(cache_size) if isinstance(cache_size, str) else cache_size
+		self.outputdir, self.script, self.profile, self.output_format = outputdir or os.getcwd(), script, profile, output_format
+		self.segment, self.min_domain, self.domain_pvalue = segment, min_domain, domain_pvalue
+		self.domains_path, self.ndomains = None, 0
+		self.metrics = metrics	##names of isochore_metrics.METRICS (a list or a comma-separated string), checked by check
+		self.headernum, self.checksum, self.cached, self.counted, self.counter = 0, None, None, None, None	##counter is the RegionCounter of the file while it is counted through its index
+		self.bases, self.windows, self.profile_path, self.timers = 0, 0, None, StageTimers()	##bases read (None when the counts come from the cache), windows analyzed at every window size, the saved profile and the stage timers
+
+	def check(self):
+		"""Check the window sizes and the step, and work out the block size every window is counted in."""
+		for windowsize in self.windowsizes:
+			if windowsize < 1:
+				raise ValueError('the window size you provided was less than 1 base.')
+			print('Window size provided or assumed:', windowsize, '(i.e.,',windowsize//1000,'kb).')
+		if self.step is not None:
+			if self.step < 1:
+				raise ValueError('the step you provided was less than 1 base.')
+			print('Windows overlap, starting every', self.step, 'base pairs.')
+		if not self.windowsizes:
+			raise ValueError('no window size was provided.')
+		if self.output_format not in FORMATS:
+			raise ValueError('the output format must be one of '+', '.join(FORMATS)+'.')
+		if self.segment is not None:
+			if self.segment < 1 or self.min_domain < 1 or not 0 < self.domain_pvalue < 1:
+				raise ValueError('the segmentation unit and the shortest domain must be at least 1 base, and the p-value between 0 and 1.')
+			print('Contigs will be segmented into GC domains of at least', self.min_domain, 'base pairs in units of', self.segment, 'base pairs.')
+		self.metrics = isochore_metrics.parse_metrics(self.metrics if isinstance(self.metrics, str) else ','.join(self.metrics or []))
+		self.metric_counts, self.metric_types = isochore_metrics.needed_counts(self.metrics), isochore_metrics.column_types(self.metrics)
+		self.metric_columns = [name for name, kind in self.metric_types]
+		if self.metrics:
+			print('Every analyzed window will also get the metrics:', ', '.join(self.metric_columns)+'.')
+		self.windowkind = 'non-overlapping' if self.step is None else 'overlapping (step '+str(self.step)+')'
+		self.blocksize = functools.reduce(isochore_counts.gcd, self.windowsizes+([self.step] if self.step else [])+([self.segment] if self.segment else []))
+
+	def plan(self):
+		"""Check the memory budget and decide how to read the file (streamed in chunks, or through a memory map in regions) and how many passes to count it in."""
+		print('Checking that you have enough memory to analyze this file.')
+		self.combined = os.path.abspath(self.inputfile)
+		self.filesize = os.path.getsize(self.combined)
+		physicalmem = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') ##this only works on Linux systems, not on OSX
+		memory_budget = physicalmem if self.memory_budget is None else self.memory_budget
+		print('Physical memory =', physicalmem//(1024**2), 'Mb.')
+		print('Memory budget =', memory_budget//(1024**2), 'Mb.')
+		print('File size =', self.filesize//(1024**2), 'Mb.')
+		if self.jobs < 1:
+			raise ValueError('the number of jobs must be at least 1.')
+		self.compressed = isochore_fasta.is_compressed(self.combined)
+		self.streaming = self.stream or (self.compressed and not self.packed)	##a store is always read through its memory map; stream only keeps the contigs in file order
+		self.longest, self.genome_bases = self.contig_lengths()
+		##The counts of the longest contig have to fit next to the sequence being counted. Window sizes with a small greatest common divisor (1000 and 1001 are counted base by base) are counted one window size at a time instead, each in blocks of its own:
+		self.passes = [(self.blocksize, self.windowsizes)]
+		self.count_bytes = count_memory(self.longest, self.blocksize, self.windowsizes, self.step, len(self.metric_counts))
+		if self.count_bytes+8*self.jobs*max(self.blocksize, 65536) > memory_budget and len(self.windowsizes) > 1:
+			self.passes = [(functools.reduce(isochore_counts.gcd, [windowsize]+([self.step] if self.step else [])+([self.segment] if self.segment else [])), [windowsize]) for windowsize in self.windowsizes]
+			self.count_bytes = max(count_memory(self.longest, blocksize, windowsizes, self.step, len(self.metric_counts)) for blocksize, windowsizes in self.passes)
+		largest = max(blocksize for blocksize, windowsizes in self.passes)
+		if self.count_bytes+8*self.jobs*max(largest, 65536) > memory_budget:
+			raise ValueError('the memory budget is too small for the window sizes. Counting the longest contig ('+str(self.longest)+' bases) needs about '+str(self.count_bytes)+' bytes, so provide a budget of at least '+str(self.count_bytes+8*self.jobs*max(largest, 65536))+' bytes.')
+		##Counts saved to the cache are kept for the whole file until the end of the run, so they are only saved when they fit as well:
+		cache_bytes = 16*(self.genome_bases//self.blocksize+1) if self.cache_dir and not self.metrics and len(self.passes) == 1 else 0
+		self.cache_fits = self.count_bytes+cache_bytes+8*self.jobs*max(largest, 65536) <= memory_budget
+		##Each chunk or region being counted, and the block codes made from it, hold up to one chunk or region of sequence per process, so they are kept well inside what the counts leave of the budget.
+		self.chunksize = min(max((memory_budget-self.count_bytes-(cache_bytes if self.cache_fits else 0))//(8*self.jobs), 65536), 64*1024**2)
+		self.regionsize = max(self.chunksize//self.blocksize, 1)*self.blocksize
+		if self.packed:
+			self.memory_check = 'Passed memory budget check: contigs were read from a packed genome store through a memory map in regions of up to '+str(self.regionsize)+' bases.'
+			print('The computer should have enough memory to continue. Contigs will be read from the packed genome store in regions of up to', self.regionsize, 'bases.')
+		elif self.streaming:
+			self.memory_check = 'Streamed input in '+str(self.chunksize)+' byte chunks within a memory budget of '+str(memory_budget)+' bytes.'
+			print('The file will be streamed in', self.chunksize, 'byte chunks to stay within the memory budget.')
+		else:
+			self.memory_check = 'Passed memory budget check: contigs were read through a memory map in regions of up to '+str(self.regionsize)+' bases.'
+			print('The computer should have enough memory to continue. Contigs will be read through a memory map in regions of up to', self.regionsize, 'bases.')
+		if self.compressed:
+			print('The file is compressed, so it will be decompressed as it is streamed. Contigs will be analyzed in file order by this process only.')
+		elif self.unindexed:
+			self.memory_check = self.memory_check.rstrip('.')+' because the file could not be indexed: '+self.unindexed
+		elif self.jobs > 1:
+			self.memory_check = self.memory_check.rstrip('.')+', counted by '+str(self.jobs)+' worker processes.'
+			print('Contigs will be counted by', self.jobs, 'worker processes.')
+		if len(self.passes) > 1:
+			self.memory_check = self.memory_check.rstrip('.')+', one window size per pass to keep the counts of the longest contig within the budget.'
+			print('The counts of the longest contig at a block size of', self.blocksize, 'bases would not fit within the memory budget, so the file will be counted once for every window size.')
+
+	def contig_lengths(self):
+		"""Return the length of the longest contig and of the whole file, from the index when the file is read through one, and otherwise bounded by the size of the file (four times the size of a compressed file). A FASTA file that cannot be indexed is streamed instead."""
+		self.index, self.unindexed = None, None
+		if self.streaming and (self.jobs == 1 or self.compressed) and not self.packed:
+			bases = self.filesize*(4 if self.compressed else 1)
+			return bases, bases
+		print('Reading the index of', self.combined)
+		if self.packed:
+			reader = isochore_pack.PackedGenome(self.combined)
+			self.index = reader.index
+			reader.close()
+		else:
+			try:
+				self.index = isochore_fasta.load_index(self.combined)
+			except ValueError as error:
+				##Valid FASTA files whose lines differ in length cannot be indexed, but can be streamed:
+				print(error, 'The file will be streamed instead, in file order and by this process only.')
+				self.streaming, self.unindexed = True, str(error)
+				return self.filesize, self.filesize
+		lengths = [record.length for record in self.index]
+		return max(lengths or [0]), sum(lengths)
+
+	def look_up_cache(self):
+		"""Look up the counts of the file in the cache, and decide whether to save them there."""
+		if not self.cache_dir:
+			return
+		if self.metrics:
+			print('The cache only holds GC and AT counts, so it is not used with metrics.')
+			return
+		if len(self.passes) > 1:
+			print('The file is counted in several passes, so the cache is not used.')
+			return
+		order = 'file' if self.streaming else 'sorted'
+		self.checksum = isochore_fasta.file_checksum(self.combined)
+		self.cached = isochore_cache.find(self.cache_dir, self.checksum, order, self.blocksize)
+		if self.cached:
+			self.memory_check = self.memory_check.rstrip('.')+'; the counts were read from the cache.'
+			print('The counts of this file were found in the cache:', self.cached)
+		elif isochore_cache.entry_bytes(self.filesize*(4 if self.compressed else 2 if self.packed else 1)//self.blocksize) > self.cache_size:
+			print('The counts of this file would not fit in the cache, so they will not be cached.')
+		elif not self.cache_fits:
+			print('The counts of this file would not fit within the memory budget, so they will not be cached.')
+		else:
+			self.counted = []	##(key, cumulative GC counts, cumulative AT counts) of every contig, saved to the cache at the end
+
+	def contigs(self):
+		"""Yield (key, cumulative GC counts, cumulative AT counts, cumulative metric counts or None) for every contig, from the cache, by streaming the file or through its index, and set headernum."""
+		if self.cached:
+			##Every window size is a multiple of the block size of the cache entry, so the windows are derived from its counts:
+			self.headernum, self.blocksize, contigs = isochore_cache.load(self.cached)
+			self.bases = None
+			for key, cum_gc, cum_at in contigs:
+				yield key, cum_gc, cum_at, None
+		elif self.index is None:
+			with isochore_fasta.open_fasta(self.inputfile) as inputdata:
+				for recordno, key, cum_gc, cum_at, length, cum_extra in stream_cumulative_counts(_TimedFile(inputdata, self.timers), self.chunksize, self.blocksize, self.metric_counts):
+					self.headernum, self.bases = recordno, self.bases+length
+					yield key, cum_gc, cum_at, cum_extra
+		else:
+			##Look up the contigs in the index, then order them as the streamed analysis would (file order) or by name, keeping the last of any duplicated names:
+			self.counter = RegionCounter(self.combined, self.index, self.packed, self.blocksize, self.metric_counts)
+			try:
+				index = self.counter.index
+				self.headernum = len(index)
+				keys = [self.counter.reader.header(record).replace('>', '').strip().replace(' ', '_') for record in index]
+				if self.streaming:
+					seen = set()
+					for i, key in enumerate(keys):
+						if key in seen:
+							keys[i] = key+'_duplicate'
+						seen.add(keys[i])
+					contigs = list(zip(keys, index))
+				else:
+					contigs = sorted(dict(zip(keys, index)).items())
+				counts = indexed_cumulative_counts(self.counter, [record for key, record in contigs], self.jobs, self.regionsize)
+				for (key, record), (cum_gc, cum_at, cum_extra) in zip(contigs, counts):
+					self.bases = self.bases+record.length
+					yield key, cum_gc, cum_at, cum_extra
+			finally:
+				self.counter.close()
+				self.counter = None
+
+	def run(self):
+		"""Analyze every contig, counting it once and deriving every window size from its cumulative block counts, and write the output of every window size. Returns the manifests."""
+		self.starttime = cpu_clock()
+		self.timesinceepoch = int(time.time())
+		self.now = datetime.datetime.now()
+		print('\n======================================\n\nThe current time is:', self.now)
+		timers = self.timers
+		with timers.stage('check'):
+			self.check()
+			self.packed = check_input(self.inputfile)
+			self.plan()
+		with timers.stage('cache'):
+			self.look_up_cache()
+
+		##  Setup variables:
+		print('Setting up variables, initializing counters, and creating output files.')
+		runs = [WindowRun(self, windowsize) for windowsize in self.windowsizes]
+		for windowsize in self.windowsizes:
+			print('\nBeginning GC content analysis using a', self.windowkind, 'window of', windowsize, 'base pairs (i.e.,', windowsize//1000, 'kb or', windowsize//1000000, 'Mb).')
+		domains = None
+		if self.segment:
+			self.domains_path = os.path.join(self.outputdir, 'domains_'+self.organism+'_'+str(self.timesinceepoch)+'.bed')
+			domains = open(self.domains_path, 'w')
+		profiler = cProfile.Profile() if self.profile else None
+		if profiler:
+			profiler.enable()
+		for passno, (blocksize, windowsizes) in enumerate(self.passes):
+			if len(self.passes) > 1:
+				print('Counting pass', passno+1, 'of', str(len(self.passes))+':', 'window size', windowsizes[0], 'in blocks of', blocksize, 'base pairs.')
+				self.blocksize, self.regionsize, self.bases = blocksize, max(self.chunksize//blocksize, 1)*blocksize, 0
+			passruns = [run for run in runs if run.windowsize in windowsizes]
+			contigs = self.contigs()
+			while True:
+				with timers.stage('count'):
+					contig = next(contigs, None)
+				if contig is None:
+					break
+				with timers.stage('window'):
+					key, cum_gc, cum_at, cum_extra = contig
+					for run in passruns:
+						run.add_contig(key, cum_gc, cum_at, cum_extra)
+					if self.counted is not None:
+						self.counted.append((key, cum_gc, cum_at))
+				if domains and passno == 0:
+					with timers.stage('segment'):
+						found = isochore_segment.segment(cum_gc, cum_at, self.segment, self.blocksize, self.min_domain, self.domain_pvalue)
+						domains.writelines(isochore_segment.domain_lines(key, found, cum_gc, cum_at, self.blocksize))
+						self.ndomains = self.ndomains+len(found)
+		if profiler:
+			profiler.disable()
+			self.profile_path = os.path.join(self.outputdir, 'profile_'+self.organism+'_'+str(self.timesinceepoch)+'.prof')
+			profiler.dump_stats(self.profile_path)
+			print('\nProfile of the counting loop saved to', self.profile_path, '(functions with the most cumulative time first):')
+			pstats.Stats(profiler, stream=sys.stdout).sort_stats('cumulative').print_stats(20)
+		self.windows = sum(run.dgc_num for run in runs)
+		if domains:
+			domains.close()
+			print('Wrote', self.ndomains, 'GC domains to', self.domains_path)
+		if self.counted is not None:
+			with timers.stage('cache'):
+				try:
+					print('Saved the counts of this file to the cache:', isochore_cache.save(self.cache_dir, self.checksum, 'file' if self.streaming else 'sorted', self.blocksize, self.headernum, self.counted, self.cache_size))
+				except (IOError, OSError) as error:
+					print('Could not save the counts of this file to the cache:', error)
+			self.counted = None
+		print(self.headernum,'fasta headers (i.e., contigs) were detected.')
+
+		##  Record the endtime time:
+		self.then = datetime.datetime.now()
+		print('The current time is:', self.then)
+		self.elapsedtime = cpu_clock() - self.starttime
+		print(self.elapsedtime, "seconds elapsed running this script (i.e., ", self.elapsedtime/60, "minutes).")
+
+		##  Checksum the input, so every run can be traced back to the exact file analyzed:
+		if self.checksum is None:
+			with timers.stage('checksum'):
+				self.checksum = isochore_fasta.file_checksum(self.combined)
+		print('SHA-256 checksum of the input file:', self.checksum)
+		print('Seconds spent in each stage (wall-clock, CPU including worker processes):', ', '.join(stage+' '+str(round(timers.seconds[stage][0], 3))+' ('+str(round(timers.seconds[stage][1], 3))+' CPU)' for stage in STAGES if stage in timers.seconds))
+		print('Peak memory (resident set size):', peak_memory()[0]//1024**2, 'Mb.')
+
+		##  Summarize the results and write the output and log files of every window size:
+		return [run.finish() for run in runs]
+
+def analyze(inputfile, organism='', group='', windowsizes=(5000,), **options):
+	"""Analyze the GC content of a FASTA file (or packed genome store) at every window size, write the run folders and return their manifests. The options are those of Analysis."""
+	return Analysis(inputfile, organism, group, windowsizes, **options).run()
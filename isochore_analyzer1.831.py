@@ -8,241 +8,65 @@
 
 
 ##  Usage:
-##    >>> isochore_analyzer.py filename.fasta [organism] [group] [5000]
+##    >>> isochore_analyzer.py filename.fasta [organism] [group] [5000] [--windows 1000,3000,5000] [--memory-budget 4G] [--stream] [--jobs 8] [--step 1000] [--cache-dir folder] [--cache-size 20G] [--profile] [--format tsv|binary|both] [--segment 1000] [--min-domain 300000] [--domain-pvalue 0.05] [--metrics skew,cpg,ambiguous]
 ##  Reads input file 'filename.fasta' and uses the second value (if provided) as the non-overlapping window size to analyze (default is 5000). The third value is interpreted as a string and can be the species name of the genome being studied. This helps keep output separate.
-##  Output are three files in a folder created in the working directory called output_ followed by the system time at the start of the analysis, to prevent overwriting old output:
+##  --windows analyzes several window sizes in one pass over the file and replaces the single window size. Each window size gets its own output folder and log, exactly as if the script had been run once per size.
+##  The input is read through a samtools-style index (filename.fasta.fai, built by isochore_fasta.py on the first run and reused afterwards) and a memory map, so contigs are never loaded as a whole. Contigs are analyzed in order of their names.
+##  --memory-budget caps the memory used to hold sequence data and the counts of a contig (e.g. 512M, 4G; defaults to the physical memory of the computer). Contigs are counted in regions small enough to stay within what the counts of the longest contig leave of the budget. Window sizes whose greatest common divisor is small (1000 and 1001 are counted base by base) can make those counts larger than the budget; the file is then counted once for every window size, and the analysis stops if even that does not fit.
+##  --stream reads the input once from start to end in bounded chunks instead of indexing it. Contigs are then analyzed in file order rather than sorted by name.
+##  A packed genome store made by isochore_pack.py (filename.fasta.isopack, 4 bits per base) can be given instead of the FASTA file. It is memory-mapped and needs no index, is about half the size of the FASTA file, and gives the same results.
+##  Interleaved (multi-line) records are read directly, so running deinterleave.py first is optional. A file whose lines differ in length within a record cannot be indexed, so it is streamed instead, in file order and by one process, and the log says so. Files compressed with gzip or bgzip (e.g. GenBank .fna.gz downloads) are decompressed as they are streamed, without an uncompressed copy on disk; they are always streamed by one process.
+##  --jobs spreads the counting over several worker processes. The main process only looks up where each contig lies in the index; each worker memory-maps the file and counts its own regions of contigs, split on block boundaries, and returns the block counts. Results are merged in the same order as a serial run, so the output is identical.
+##  --step analyzes overlapping (sliding) windows that start every step base pairs instead of non-overlapping windows, e.g. 100000 base pair windows with --step 10000. Every window is the difference of two running counts of the contig, so the cost grows with the length of the genome and not with the ratio of window size to step. The analysis of a contig still ends at its first missing-data window, and every line of the three output files gets two more columns: the start (0-based) and end (exclusive) of the window in the contig.
+##  --cache-dir keeps the block counts of every contig in a cache folder under the SHA-256 checksum of the input file, the contig order and the block size (see isochore_cache.py). A later run of the same file, under any name, at window sizes (and step) that are multiples of a cached block size derives its windows from the cache without reading the file again, so repeat runs and runs that add new window sizes reuse earlier work. The missing-data threshold is applied afterwards, so cached counts serve any threshold. The cache is kept within --cache-size by evicting the least recently used entries.
+##  The log and the manifest also record how long each stage of the run took (checking the input, the cache, reading, counting, windowing, updating the statistics, writing the output files, segmenting, checksumming and summarizing; wall-clock and CPU seconds, including the worker processes of --jobs), the bases and windows analyzed per second, and the peak memory of the run. The stage timings are printed once the input has been counted.
+##  --profile runs the counting loop under cProfile, saves the statistics to profile_organism_timesinceepoch.prof in the working directory (for pstats or snakeviz) and prints the 20 functions with the most cumulative time. The worker processes of --jobs are not profiled, so profile with one job to see the counting itself.
+##  --format binary writes the windows of every run as one columnar NumPy file (windows_timesinceepoch.npy: contig number, window index, GC percentage, missing bases and which TSV file the row belongs to) with its contig table (contigs_timesinceepoch.json) instead of the three TSV files, in batches and without formatting a line per window; readers memory-map it with numpy.load. --format both writes both, and the default (tsv) only the TSV files. The TSV files of a binary run can be exported later with isochore_windows.py, which describes the format.
+##  --segment splits every contig into GC domains (isochores) by binary segmentation of units of that many bases, from the same counts as the windows, and writes them to domains_organism_timesinceepoch.bed in the working directory: one line per domain with the contig, start, end, GC percentage and missing fraction. --min-domain is the shortest domain in bases (default 300000) and --domain-pvalue the significance of a cut (default 0.05, corrected for the cut points tried). See isochore_segment.py for the method.
+##  --metrics adds more per-window columns to the end of every line of gc_content_timesinceepoch.tsv (and to the binary output), computed in the same pass as the GC content: a comma-separated list of bases (A, C, G and T counts), dinucleotides (the 16 dinucleotide counts), skew (GC and AT skew), cpg (CpG count and observed/expected ratio) and ambiguous (fraction of the window that is not A, C, G or T), or all. Only the counts the chosen metrics need are made, and without --metrics the analysis counts nothing more than before. The cache is not used with --metrics. See isochore_metrics.py for the definitions and how to add a metric.
+##  Output are three files, a manifest and a statistics file in a folder created in the working directory called output_ followed by the system time at the start of the analysis, to prevent overwriting old output:
 ##    gc_content_timesinceepoch.tsv << this is the main output as a list of lines where each line has a contig and number of the segment (by window size), a tab character, and the GC percentage out of 100
 ##    unused_contigs_missing_data_timesinceepoch.tsv << These were unused data as a result of having too many ambiguous or missing sequence. Each line has a contig and number of the segment (by window size), a tab character, and the number of times that exact key was discarded for this reason.
 ##    unused_short_contigs_content_timesinceepoch.tsv << These were unused data as a result of the contig size being smaller than the provided window size (defaults to 5000). Each line has a contig and number of the segment (by window size), a tab character, and the number of times that exact key was discarded for this reason.
+##    manifest_timesinceepoch.json << the results of the log as typed JSON fields (window size, number of contigs, percentages, summary statistics, timings and the SHA-256 checksum of the input file), read by isochore_summarizer instead of the log text.
+##    stats_timesinceepoch.json << the summary statistics of the GC percentages (count, mean, variance, range and a histogram for the median and percentiles), which isochore_summarizer merges across runs. See isochore_stats.py.
+##  Each window is written to these files as soon as it has been analyzed, so the results do not have to be held in memory.
+##  Bases are counted with the lookup-table kernel in isochore_counts.py, which must be kept in the same folder as this script. Each contig is counted once in blocks of the greatest common divisor of the window sizes, and every window size is derived from the cumulative block counts.
+##  This script only reads the command line; the analysis itself is done by isochore_analysis.py, which can also be imported to analyze genomes from Python (see isochore_analysis.analyze). NumPy and the analysis are only imported once the command line has been read.
 
 ##  Setup environment:
 from  __future__ import print_function
-import sys, re, os, time, datetime, errno, math, numpy
-from collections import OrderedDict
-scriptfile, inputfile, path = sys.argv[0], sys.argv[1], os.getcwd()
-try:
-	organism = str(sys.argv[2])
-except IndexError:
-	organism = ''
-try:
-	group = str(sys.argv[3])
-except IndexError:
-	group = ''
-try:
-	windowsize_commandline = int(sys.argv[4])
-except IndexError:
-	windowsize_commandline = 5000
-
-##  Record the start time:
-starttime = time.clock()
-timesinceepoch = int(time.time())
-now = datetime.datetime.now()
-print('\n======================================\n\nThe current time is:', now)
-
-##Set up a log file
-path_starttime= path+'/'+str(timesinceepoch)
-outfolder='Run1.831_GC_output_'+str(organism)+'_'+str(windowsize_commandline)+'_'+str(timesinceepoch)
-outfolder_path=path+'/'+outfolder
-try:
-	os.makedirs(outfolder)
-except OSError as exc:  # Python >2.5
-	if exc.errno == errno.EEXIST and os.path.isdir(path):
-		pass
-	else:
-		raise
-##Check that a valid window size was provided
-if windowsize_commandline < 1:
-	sys.exit('Error: the window size you provided was less than 1 base.')
-print('Window size provided or assumed:', windowsize_commandline, '(i.e.,',windowsize_commandline/1000,'kb).')
-
-##  Check that input is in fasta format:
-inputdata = open(inputfile, 'r')
-for line in inputdata:
-	if line.startswith('#'):
-		continue
-	else:
-		if line.startswith('>'):
-			print('Looks like you supplied a fasta-formatted file.')
-			break
-		else:
-			sys.exit('Error: could not verify that the input file was a fasta-formatted file. Check the input data.')
-
-##  Check that file is not too large for the computer to handle:
-print('Checking that you have enough physical memory to analyze this file.')
-combined = path+'/'+inputfile
-filesize = os.path.getsize(combined)
-physicalmem = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') ##this only works on Linux systems, not on OSX
-print('Physical memory =', physicalmem/(1024**2), 'Mb.')
-print('File size =', filesize/(1024**2), 'Mb.')
-if filesize>physicalmem:
-	sys.exit('Error: file size exceeded physical memory.')
-else:
-	print('The computer should have enough memory to continue.')
-
-##  Setup variables:
-print('Setting up variables, initializing dictionaries, and creating output files.')
-fragment_length, missingno, GCno, ATno, Ano, Tno, Wno, Gno, Cno, Sno, GCPercent, endtime, headernum, dtotal, GCmean, GCsd, GCrange_lower, GCrange_upper, GCmedian, GCnum, contiglength, contignum_round, headerposition, headerprogress, totaltime = 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0
-
-dgc, dmissing, dshort, ddata, dgc_temp = {}, {}, {}, {}, {}
-sd_list = []
-
-##  Create output files and folder:
-dgc_ = 'gc_content_'+str(organism)+'_'+str(windowsize_commandline)+'_'+str(timesinceepoch)+'.tsv'
-dmissing_ = 'unused_contigs_missing_data_'+str(organism)+'_'+str(windowsize_commandline)+'_'+str(timesinceepoch)+'.tsv'
-dshort_ = 'unused_short_contigs_content_'+str(organism)+'_'+str(windowsize_commandline)+'_'+str(timesinceepoch)+'.tsv'
-dgc_output = open(os.path.join(outfolder_path, dgc_), 'w')
-dmissing_output = open(os.path.join(outfolder_path, dmissing_), 'w')
-dshort_output = open(os.path.join(outfolder_path, dshort_), 'w')
-log_ = 'log_'+str(organism)+'_'+str(windowsize_commandline)+'_'+str(timesinceepoch)+'.txt'
-log_output = open(os.path.join(outfolder_path, log_), 'a')
-
-##Initialize an input data dictionary [ddata]:
-inputdata.seek(0)
-i_inputdata = iter(inputdata)
-for line in i_inputdata:
-	if line.startswith('>'):
-		headernum = headernum+1
-		header= line.replace(">","")
-		header2= header.strip()
-		header3= header2.replace(" ","_")
-##		Insert code here later to deal with interleaved fasta files
-		ddata[header3] = next(i_inputdata).strip()
-print(headernum,'fasta headers (i.e., contigs) were detected.')
-
-##  Populate three dictionaries with the ddata dictionary and window size equal to windowsize
-print('\nBeginning GC content analysis using a non-overlapping window of', windowsize_commandline, 'base pairs (i.e.,', windowsize_commandline/1000, 'kb or', windowsize_commandline/1000000, 'Mb).')
-for key in sorted(ddata.iterkeys()):	##in python 3.X use dgc_temp.keys()
-	dgc_temp = {}
-	contig_temp=ddata[key]
-	start = 0
-	end = windowsize_commandline-1
-	contiglength= len(contig_temp)
-	if contiglength >= windowsize_commandline == False:
-		if not key in dshort.keys():
-			dshort[key] = 1
-		else:
-			dshort[key] = dshort[key]+1
-	contignum_round=int(round((contiglength/windowsize_commandline)))
-	for i in range(0,contignum_round+1):
-		key_name=str(key)+'_'+str(i)
-		dgc_temp[key_name] = ''
-	for key in sorted(dgc_temp.iterkeys()):	##in python 3.X use dgc_temp.keys()
-		contig_temp2 = contig_temp[start:end+1]
-		dgc_temp[key] = contig_temp2
-		start = start+windowsize_commandline
-		if ((len(contig_temp)-start)>windowsize_commandline)==True:
-			end = end+windowsize_commandline
-		else:
-			end = (len(contig_temp)-1)
-	for key in sorted(dgc_temp.iterkeys()): ##in python 3.X use dgc_temp.keys()
-		contig_temp3=dgc_temp[key]
-		fragment_length=len(contig_temp3)
-		fragment_length_float=float(len(contig_temp3))
-		if not fragment_length == windowsize_commandline:
-			if not key in dshort.keys():
-				dshort[key] = 1
-				break
-			else:
-				dshort[key] = dshort[key]+1
-				break
-		hyphenno = len(re.findall('\-', contig_temp3, re.IGNORECASE))
-		questionmarkno = len(re.findall('\?', contig_temp3, re.IGNORECASE))
-		Ano = len(re.findall('A', contig_temp3, re.IGNORECASE))
-		Cno = len(re.findall('C', contig_temp3, re.IGNORECASE))
-		Tno = len(re.findall('T', contig_temp3, re.IGNORECASE))
-		Gno = len(re.findall('G', contig_temp3, re.IGNORECASE))
-		Wno = len(re.findall('W', contig_temp3, re.IGNORECASE))
-		Sno = len(re.findall('S', contig_temp3, re.IGNORECASE))
-		ATno = Ano+Tno+Wno
-		GCno = Gno+Cno+Sno
-		if (fragment_length_float-(ATno+GCno))/fragment_length_float >= 0.2:
-			if not key in dmissing.keys():
-				dmissing[key] = 1
-				break
-			else:
-				dmissing[key] = dmissing[key]+1
-				break
-		else:
-			GCPercent = float(GCno/float((ATno+GCno)))*100
-			if not key in dgc.keys():
-				dgc[key] = GCPercent
-			else:
-				keyd=key+'_duplicate'
-				dgc[keyd] = GCPercent
-
-##  Count number of missing values as percentage and report to terminal:
-dgc_num = float(len(dgc.keys()))
-dmissing_num = float(len(dmissing.keys()))
-dshort_num = float(len(dshort.keys()))
-dtotal_num = float(dgc_num+dmissing_num+dshort_num)
-dgc_perc = float((dgc_num/dtotal_num)*100)
-dmissing_perc = float((dmissing_num/dtotal_num)*100)
-dshort_perc = float((dshort_num/dtotal_num)*100)
-print('\nAs a percent of all contigs recovered,',dgc_perc,'percent could have their GC content analyzed.')
-print('As a percent of all contigs recovered,',dmissing_perc,'percent could not have their GC content analyzed because there was too much ambiguous or missing data.')
-print('As a percent of all contigs recovered,',dshort_perc,'percent could not have their GC content analyzed because the contig was not larger than or equal to',windowsize_commandline,'base pairs.')
-if (dmissing_perc+dshort_perc) >= 10:
-	print(dmissing_perc+dshort_perc,'percent of contigs could not be used to calculate GC content.'	)
-	print('Warning! The amount of missing data exceeded 10 percent as measured by the percentage of contigs that could be used. Be sure this is okay for the interpretation of your results.')
-else:
-	print(dmissing_perc+dshort_perc,'percent of contigs could not be used to calculate GC content.')
-
-##  Summarize the results:
-GCnum = len(dgc.keys())
-GCsort = sorted(dgc.values())
-if GCnum > 0.0:
-	GCmean = float(sum(GCsort)/GCnum)
-	GCsd = numpy.std(GCsort) #you can replace the numpy call with your own standard deviation equation
-	GCrange_lower = GCsort[0]
-	GCrange_upper = GCsort[GCnum-1]
-	if not GCnum % 2:
-		GCmedian= float((GCsort[GCnum/2]+GCsort[(GCnum/2)-1])/2.0)
-	GCmedian= float(GCsort[GCnum/2])
+import sys, os, argparse
+parser = argparse.ArgumentParser(description='Analyze the GC content of a fasta-formatted file in non-overlapping windows.')
+parser.add_argument('inputfile', help='fasta-formatted file to analyze')
+parser.add_argument('organism', nargs='?', default='', help='organism name, used to keep output separate')
+parser.add_argument('group', nargs='?', default='', help='group name written to every output line')
+parser.add_argument('windowsize', nargs='?', type=int, default=5000, help='non-overlapping window size in base pairs (default 5000)')
+parser.add_argument('--windows', default=None, help='comma-separated window sizes to analyze in one pass, e.g. 1000,3000,5000,20000,80000,320000')
+parser.add_argument('--memory-budget', default=None, help='maximum memory for sequence data and counts, e.g. 512M or 4G (default: physical memory)')
+parser.add_argument('--stream', action='store_true', help='stream the input in bounded chunks even if it fits within the memory budget')
+parser.add_argument('--step', type=int, default=None, help='analyze overlapping windows starting every STEP base pairs (default: non-overlapping windows)')
+parser.add_argument('--jobs', type=int, default=1, help='number of worker processes used to count contigs (default 1)')
+parser.add_argument('--cache-dir', default=None, help='folder of the content-addressed cache of contig counts (default: no cache)')
+parser.add_argument('--cache-size', default='20G', help='size limit of the cache folder, e.g. 512M or 20G (default 20G)')
+parser.add_argument('--format', default='tsv', choices=['tsv', 'binary', 'both'], help='write the windows as the three TSV files, as a columnar binary file (see isochore_windows.py) or both (default tsv)')
+parser.add_argument('--segment', type=int, default=None, help='segment every contig into GC domains in units of SEGMENT base pairs (default: no segmentation)')
+parser.add_argument('--min-domain', type=int, default=300000, help='shortest GC domain in base pairs (default 300000)')
+parser.add_argument('--domain-pvalue', type=float, default=0.05, help='significance of a cut between two GC domains (default 0.05)')
+parser.add_argument('--metrics', default=None, help='comma-separated per-window metrics added as columns: bases, dinucleotides, skew, cpg, ambiguous or all (default: GC content only)')
+parser.add_argument('--profile', action='store_true', help='profile the counting loop with cProfile and save the statistics to the working directory')
+args = parser.parse_args()
+if args.windows:
+	windowsizes = sorted(set(int(size) for size in args.windows.split(',') if size.strip()))
 else:
-	GCmean, GCsd, GCrange_lower, GCrange_upper, GCmedian = 0, 0, 0, 0, 0
-print('\nSummary of results from isochore analysis by non-overlapping',windowsize_commandline,'base pair windows:')
-print('Mean GC content:',GCmean,'percent.')
-print('Standard deviation of GC content:',GCsd, 'percent.')
-print('GC content ranges from',GCrange_lower,'percent to',GCrange_upper,'percent.')
-print('Median GC content:',GCmedian,'percent.')
-print('Overall, there were',GCnum,'contigs analyzed.')
+	windowsizes = [args.windowsize]
 
-##  Populate output: tsv of dgc, dmissing, dshort
-print('\nWriting output files to', outfolder_path)
-with dgc_output as d:
-	for key, value in dgc.items():
-		d.write("{}\t{}\t{}\t{}\n".format(key, value, organism, group))
-print('Successfully created', dgc_)
-with dmissing_output as m:
-	for key, value in dmissing.items():
-		m.write("{}\t{}\t{}\t{}\n".format(key, value, organism, group))
-print('Successfully created', dmissing_)
-with dshort_output as s:
-	for key, value in dshort.items():
-		s.write("{}\t{}\t{}\t{}\n".format(key, value, organism, group))
-print('Successfully created', dshort_)
-
-##  Record the endtime time:
-then = datetime.datetime.now()
-print('The current time is:', then)
-endtime = time.clock()
-elapsedtime = endtime - starttime
-print(elapsedtime, "seconds elapsed running this script (i.e., ", elapsedtime/60, "minutes).")
-print('Now writing a log file to:', log_)
-
-with log_output as l:
-	print('Script started at:', now, '\nThe file analyzed was:', combined, '\nThe file was a valid fasta file format.', '\nPassed physical memory check.', '\nWindow size provided or assumed:', windowsize_commandline, '(i.e.,', windowsize_commandline/1000, 'kb).\n',headernum, 'fasta headers (i.e., contigs) were detected.\n','As a percent of all contigs recovered,' ,dgc_perc, 'percent could have their GC content analyzed.\n', 'As a percent of all contigs recovered,', dmissing_perc, 'percent could not have their GC content analyzed because there was too much ambiguous or missing data.', '\nAs a percent of all contigs recovered,' ,dshort_perc, 'percent could not have their GC content analyzed because the contig was not larger than or equal to', windowsize_commandline, 'base pairs.\n', file=l)
-	if (dmissing_perc+dshort_perc) >= 10:
-		print(dmissing_perc+dshort_perc, 'percent of contigs could not be used to calculate GC content.\n', 'Warning! The amount of missing data exceeded 10 percent as measured by the percentage of contigs that could be used. Be sure this is okay for the interpretation of your results.\n', file=l)
-	else:
-		print(float(dmissing_perc+dshort_perc), 'percent of contigs could not be used to calculate GC content.\n', file=l)
-	print('Summary of results from isochore analysis by non-overlapping', windowsize_commandline, 'base pair windows:\n', 'Mean GC content:', GCmean, 'percent.\n', 'Standard deviation of GC content:', GCsd, 'percent.\n', 'GC content ranges from', GCrange_lower, 'percent to', GCrange_upper, 'percent.\n', 'Median GC content:', GCmedian, 'percent.\n', 'Overall, there were', GCnum, 'contigs analyzed.\n', 'Script finished at:', then,'\n', elapsedtime, 'seconds elapsed running this script (i.e.,', round(elapsedtime/60, 2), 'minutes).', file=l)
-print('Successfully created', log_)
-
-
-##  Close all files.
-dgc_output.close()
-dmissing_output.close()
-dshort_output.close()
-log_output.close()
+##  Analyze the file and write the output of every window size:
+import isochore_analysis
+try:
+	isochore_analysis.analyze(args.inputfile, args.organism, args.group, windowsizes, step=args.step, memory_budget=args.memory_budget, stream=args.stream,
+		jobs=args.jobs, cache_dir=args.cache_dir, cache_size=args.cache_size, profile=args.profile, output_format=args.format,
+		segment=args.segment, min_domain=args.min_domain, domain_pvalue=args.domain_pvalue, metrics=args.metrics, script=os.path.basename(sys.argv[0]))
+except ValueError as error:
+	sys.exit('Error: '+str(error))
 sys.exit('All finished!')
@@ -0,0 +1,191 @@
+#!/usr/bin/python
+
+##  Batch driver for isochore_analyzer1.831.py and isochore_summarizer_0.56.py.
+##  Usage:
+##    >>> python isochore_batch.py genomes.tsv /data/fish [--windows 1000,3000,5000,20000,80000,320000] [--jobs 4] [--memory-budget 16G] [--analyzer-jobs 1] [--step 1000] [--cache-dir folder] [--cache-size 20G] [--format tsv|binary|both] [--segment 1000] [--min-domain 300000] [--domain-pvalue 0.05] [--metrics skew,cpg] [--no-summary]
+##  genomes.tsv lists one genome per line, separated by tabs: the path of the FASTA file (or packed genome store), the organism name and the group name (optional). Blank lines, lines starting with '#' and a header line starting with 'path' are skipped, and relative paths are read from the folder of the list. Organism names must be unique, since the summarizer keys its rows by them.
+##  Every genome is analyzed at all of its pending window sizes by one analysis (isochore_analysis.analyze, as the analyzer script does with --windows), so each genome is read once. Each analysis runs in a process forked from this one, which has already imported NumPy and the analysis, so no genome pays for starting an interpreter, and a genome that fails or runs out of memory cannot take the batch down with it. The run folders are written to the output folder (/data/fish), which is then summarized with the summarizer (at the same --step); its output files are written there too.
+##  A window size of a genome is complete when the output folder has a run folder of the organism at that window size with a manifest (manifest_*.json) of the same --step and a log (log_*.txt, the last file the analyzer writes). Complete window sizes are skipped, so rerunning the same command after a crash or an interruption only analyzes what is missing, and adding genomes to the list only analyzes the new ones.
+##  Genomes are analyzed by up to --jobs processes at once, largest files first. Each run is given a share of --memory-budget (default: physical memory) that covers its sequence data and counts plus JOB_MEMORY for the interpreter, and a genome is only started when its share fits within what the running analyses leave; a genome whose share is larger than the whole budget runs on its own within the budget.
+##  Everything an analysis prints is written to batch_logs/<organism>_<time since epoch>.txt in the output folder.
+##  With --segment, every analysis also writes the GC domains of its genome to domains_<organism>_<time since epoch>.bed in the output folder (see isochore_segment.py). Genomes whose window sizes are all complete are not analyzed again, so they only get domains if they were segmented before.
+##  --metrics adds the per-window metric columns of isochore_metrics.py to every analysis. As with --segment, complete window sizes are not analyzed again, so runs made without the metrics keep their columns.
+
+##  Setup environment:
+from  __future__ import print_function
+import sys, os, re, json, time, argparse, functools, subprocess, multiprocessing
+import isochore_counts, isochore_fasta, isochore_pack, isochore_cache, isochore_analysis, isochore_metrics
+
+WINDOWS = '1000,3000,5000,20000,80000,320000'	##the standard window sizes of the summarizer
+JOB_MEMORY = 128*1024**2	##memory of an analysis besides its sequence data and counts: the interpreter, numpy and the statistics of each window size
+CHUNK_BASES = 64*1024**2	##largest region the analyzer counts at a time
+POLL = 0.2	##seconds between checks of the running analyses
+RUN_FOLDER = re.compile('^Run.*?_GC_output_(.+)_(\\d+)_(\\d+)$')	##organism, window size and time since epoch of a run folder, as in the summarizer
+here = os.path.dirname(os.path.abspath(__file__))
+SUMMARIZER = os.path.join(here, 'isochore_summarizer_0.56.py')
+
+##  Functions:
+def read_genomes(listfile):
+	"""Return the (path, organism, group) of every genome of a tab-separated list, with paths made absolute."""
+	folder, genomes = os.path.dirname(os.path.abspath(listfile)), []
+	with open(listfile, 'r') as handle:
+		for number, line in enumerate(handle, 1):
+			fields = [field.strip() for field in line.rstrip('\r\n').split('\t')]
+			if not fields[0] or fields[0].startswith('#') or (not genomes and fields[0].lower() == 'path'):
+				continue
+			if len(fields) < 2 or not fields[1]:
+				raise ValueError('Line '+str(number)+' of '+listfile+' has no organism name.')
+			genomes.append((os.path.join(folder, fields[0]), fields[1], fields[2] if len(fields) > 2 else ''))
+	organisms = [organism for path, organism, group in genomes]
+	duplicated = sorted(set(organism for organism in organisms if organisms.count(organism) > 1))
+	if duplicated:
+		raise ValueError('Organism names must be unique, but '+', '.join(duplicated)+' appear more than once in '+listfile+'.')
+	missing = [path for path, organism, group in genomes if not os.path.isfile(path)]
+	if missing:
+		raise ValueError('These genomes do not exist: '+', '.join(missing))
+	return genomes
+
+def completed_runs(outputfolder, step):
+	"""Return the set of (organism, window size) that have a finished run folder (with a manifest of the given step and a log) in the output folder."""
+	completed = set()
+	for name in os.listdir(outputfolder):
+		match = RUN_FOLDER.match(name)
+		if not match:
+			continue
+		organism, window, epoch = match.group(1), int(match.group(2)), match.group(3)
+		run = organism+'_'+str(window)+'_'+epoch
+		try:
+			with open(os.path.join(outputfolder, name, 'manifest_'+run+'.json'), 'r') as handle:
+				if json.load(handle).get('step') == step and os.path.exists(os.path.join(outputfolder, name, 'log_'+run+'.txt')):
+					completed.add((organism, window))
+		except (IOError, OSError, ValueError):
+			continue	##no manifest, or one cut short: the run did not finish
+	return completed
+
+def job_memory(path, windows, step, analyzer_jobs, metric_counts=0):
+	"""Return the memory budget of the analysis of a genome at the given window sizes (its sequence data and counts), and the memory the whole run is expected to take."""
+	bases = os.path.getsize(path)
+	if isochore_fasta.is_compressed(path):
+		bases, analyzer_jobs = bases*4, 1	##compressed files are streamed by one process
+	elif isochore_pack.is_packed(path):
+		bases = bases*2
+	blocksize = functools.reduce(isochore_counts.gcd, windows+([step] if step else []))
+	sequence = 8*analyzer_jobs*max(min(bases, CHUNK_BASES), blocksize, 65536)	##as the analyzer sizes its regions from its budget
+	counts = isochore_analysis.count_memory(bases, blocksize, windows, step, metric_counts)+16*(bases//blocksize+1)	##counts of a contig as long as the genome, and of the whole genome when they are cached
+	return sequence+counts, JOB_MEMORY+sequence+counts
+
+def analyze_genome(genome, windows, budget, args, outputfolder, logfile):
+	"""Analyze one genome at the given window sizes in this process, writing everything it prints to logfile."""
+	path, organism, group = genome
+	with open(logfile, 'w') as handle:
+		os.dup2(handle.fileno(), sys.stdout.fileno())
+		os.dup2(handle.fileno(), sys.stderr.fileno())
+	try:
+		isochore_analysis.analyze(path, organism, group, windows, step=args.step, memory_budget=budget, jobs=args.analyzer_jobs,
+			cache_dir=args.cache_dir and os.path.abspath(args.cache_dir), cache_size=args.cache_size, outputdir=outputfolder, output_format=args.format,
+			segment=args.segment, min_domain=args.min_domain, domain_pvalue=args.domain_pvalue, metrics=args.metrics)
+	except ValueError as error:
+		sys.exit('Error: '+str(error))
+
+##  Run the batch from the command line:
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Analyze a list of genomes at several window sizes as isochore_analyzer1.831.py does, skipping completed runs, and summarize them.')
+	parser.add_argument('genomes', help='tab-separated list of genomes: path, organism and group')
+	parser.add_argument('outputfolder', help='folder for the run folders and the summary, e.g. /data/fish')
+	parser.add_argument('--windows', default=WINDOWS, help='comma-separated window sizes (default {})'.format(WINDOWS))
+	parser.add_argument('--step', type=int, default=None, help='analyze overlapping windows starting every STEP base pairs (default: non-overlapping windows)')
+	parser.add_argument('--jobs', type=int, default=multiprocessing.cpu_count(), help='most genomes analyzed at once (default: number of CPUs)')
+	parser.add_argument('--memory-budget', default=None, help='memory shared by the running analyses, e.g. 16G (default: physical memory)')
+	parser.add_argument('--analyzer-jobs', type=int, default=1, help='worker processes of each analysis (default 1)')
+	parser.add_argument('--cache-dir', default=None, help='cache folder of contig counts passed to the analyzer (default: no cache)')
+	parser.add_argument('--cache-size', default='20G', help='size limit of the cache folder (default 20G)')
+	parser.add_argument('--format', default='tsv', choices=['tsv', 'binary', 'both'], help='window output of the analyses: TSV files, columnar binary files or both (default tsv)')
+	parser.add_argument('--segment', type=int, default=None, help='segment every genome into GC domains in units of SEGMENT base pairs, written to domains_<organism>_<time>.bed (default: no segmentation)')
+	parser.add_argument('--min-domain', type=int, default=300000, help='shortest GC domain in base pairs (default 300000)')
+	parser.add_argument('--domain-pvalue', type=float, default=0.05, help='significance of a cut between two GC domains (default 0.05)')
+	parser.add_argument('--metrics', default=None, help='comma-separated per-window metrics added as columns (see isochore_metrics.py), or all (default: GC content only)')
+	parser.add_argument('--no-summary', action='store_true', help='do not run the summarizer at the end')
+	args = parser.parse_args()
+	if args.jobs < 1 or args.analyzer_jobs < 1:
+		sys.exit('Error: the number of jobs must be at least 1.')
+	try:
+		windows = sorted(set(int(size) for size in args.windows.split(',') if size.strip()))
+		genomes = read_genomes(args.genomes)
+		metric_counts = len(isochore_metrics.needed_counts(isochore_metrics.parse_metrics(args.metrics or '')))
+	except ValueError as error:
+		sys.exit('Error: '+str(error))
+	if not windows or windows[0] < 1 or (args.step is not None and args.step < 1):
+		sys.exit('Error: the window sizes and the step must be at least 1 base.')
+	outputfolder = os.path.abspath(args.outputfolder)
+	if not os.path.isdir(outputfolder):
+		os.makedirs(outputfolder)
+	logfolder = os.path.join(outputfolder, 'batch_logs')
+	if not os.path.isdir(logfolder):
+		os.makedirs(logfolder)
+	if args.memory_budget is None:
+		memory_budget = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')	##this only works on Linux systems, not on OSX
+	else:
+		memory_budget = isochore_cache.parse_size(args.memory_budget)
+
+	##Find the window sizes every genome still needs, and the memory of its run:
+	started = time.time()
+	completed = completed_runs(outputfolder, args.step)
+	pending = []
+	for genome in genomes:
+		needed = [window for window in windows if (genome[1], window) not in completed]
+		if needed:
+			budget, memory = job_memory(genome[0], needed+([args.segment] if args.segment else []), args.step, args.analyzer_jobs, metric_counts)
+			if memory > memory_budget:
+				budget, memory = max(memory_budget-JOB_MEMORY, 1), memory_budget	##too large to share the budget, so it runs on its own
+			pending.append((memory, budget, genome, needed))
+	pending.sort(key=lambda job: -job[0])	##largest first, so the longest runs do not start last
+	print(len(genomes), 'genomes at', len(windows), 'window sizes:', len(genomes)*len(windows)-sum(len(job[3]) for job in pending), 'runs are complete and', sum(len(job[3]) for job in pending), 'runs of', len(pending), 'genomes will be analyzed.')
+	print('Up to', args.jobs, 'genomes will be analyzed at once within a memory budget of', memory_budget//1024**2, 'Mb.')
+
+	##Start every genome whose memory fits within what the running analyses leave, and wait for runs to finish:
+	running, failed, total = [], [], len(pending)
+	try:
+		while pending or running:
+			used = sum(job[0] for job, process, logfile, since in running)
+			for job in list(pending):
+				if len(running) >= args.jobs:
+					break
+				if running and used+job[0] > memory_budget:
+					continue
+				memory, budget, genome, needed = job
+				logfile = os.path.join(logfolder, genome[1]+'_'+str(int(time.time()))+'.txt')
+				sys.stdout.flush()
+				process = multiprocessing.Process(target=analyze_genome, args=(genome, needed, budget, args, outputfolder, logfile))
+				process.start()
+				running.append((job, process, logfile, time.time()))
+				pending.remove(job)
+				used = used+memory
+				print('['+str(total-len(pending))+'/'+str(total)+'] Started', genome[1], 'at', ','.join(str(window) for window in needed), 'base pairs with', budget//1024**2, 'Mb of memory; output in', logfile)
+			sys.stdout.flush()
+			time.sleep(POLL)
+			for entry in [entry for entry in running if not entry[1].is_alive()]:
+				(memory, budget, genome, needed), process, logfile, since = entry
+				process.join()
+				running.remove(entry)
+				done = completed_runs(outputfolder, args.step)
+				missing = [window for window in needed if (genome[1], window) not in done]
+				if missing:
+					failed.append((genome[1], logfile))
+					print('Failed', genome[1], 'at', ','.join(str(window) for window in missing), 'base pairs after', round(time.time()-since, 2), 'seconds; see', logfile)
+				else:
+					print('Finished', genome[1], 'in', round(time.time()-since, 2), 'seconds.')
+	except KeyboardInterrupt:
+		sys.exit('Interrupted. Run the same command again to analyze the genomes that were not finished.')
+	finally:
+		for job, process, logfile, since in running:
+			process.terminate()	##interrupted: the unfinished runs have no manifest and are analyzed again next time
+			process.join()
+	print(total-len(failed), 'genomes were analyzed in', round(time.time()-started, 2), 'seconds.')
+
+	##Summarize every run in the output folder:
+	if not args.no_summary:
+		print('Summarizing', outputfolder)
+		sys.stdout.flush()
+		subprocess.call([sys.executable, SUMMARIZER, outputfolder]+(['--step', str(args.step)] if args.step else []), cwd=outputfolder)
+	if failed:
+		sys.exit('Error: '+str(len(failed))+' genomes could not be analyzed: '+', '.join(organism+' (see '+logfile+')' for organism, logfile in failed))
@@ -0,0 +1,335 @@
+#!/usr/bin/python
+
+##  Reproducible benchmarks of the isochore scripts on synthetic genomes.
+##  Usage:
+##    >>> python isochore_benchmark.py [--output benchmark.json] [--workdir folder] [--seed 1] [--size 50M] [--contig-mean 2M] [--contig-sigma 1.5] [--gc-mean 41] [--gc-sd 4] [--domain-mean 300000] [--ambiguous-rate 2] [--ambiguous-mean 1000] [--line-width 80] [--samples 500] [--repeat 3] [--analyzer-jobs 1] [--python python3] [--label name] [--compare baseline.json] [--tolerance 0.1]
+##    >>> python isochore_benchmark.py --generate genome.fa [--seed 1] [--size 50M] [...]
+##  Writes a synthetic genome to the work folder (default: a new temporary folder, deleted at the end unless --keep) and times:
+##    deinterleave << deinterleave.py on the interleaved genome
+##    analyzer << isochore_analyzer1.831.py at the six standard window sizes in one pass (--windows), building the index of the genome as a first run does
+##    analyzer_stream << the same with --stream
+##    summarizer_cold << isochore_summarizer_0.56.py over --samples fake samples at the six window sizes (3000 run folders by default), with no summarizer cache
+##    summarizer_warm << the same again, with every run in the summarizer cache
+##    summarizer_logs << the same fake runs without manifests, so every log is parsed as for runs of older versions (--no-cache)
+##  Every benchmark runs --repeat times in a new process of --python (default: this interpreter). Each repeat records the wall-clock seconds, CPU seconds and peak resident set size of the process and its workers (measured by a small launcher process, whose own memory of about 10 Mb is the smallest peak that can be reported); the fastest repeat is reported, with the bases per second of the genome or the run folders per second. The analyzer benchmarks also record the stage timings of the manifest of their first window size.
+##  The genome is generated with numpy.random.RandomState(seed), so the same options always write the same file (its SHA-256 checksum is recorded) on any computer and branch:
+##    contigs << lengths drawn from a log-normal distribution with mean --contig-mean and shape --contig-sigma until the genome has --size bases; the last contig is cut to fit
+##    GC heterogeneity << every contig is a series of domains (isochores) with exponentially distributed lengths of mean --domain-mean, and the GC content of each domain is drawn from a normal distribution of mean --gc-mean and standard deviation --gc-sd percent
+##    ambiguous bases << runs of N, on average --ambiguous-rate per million bases, with geometrically distributed lengths of mean --ambiguous-mean
+##    interleaving << sequence lines of --line-width bases, or one line per contig with --line-width 0
+##  The fake runs of the summarizer are copies of the log, manifest and statistics files of the analyzer runs under new sample names; their TSV files are not copied, since the summarizer does not read them.
+##  Results are written as JSON to --output (default benchmark_<label>_<time since epoch>.json in the working directory), with the options, the genome, the Python and NumPy versions, the CPU count and the git revision of this folder. --compare prints the change of every benchmark from an earlier results file and exits with an error if any is more than --tolerance (default 0.1, i.e. 10 percent) slower or larger in memory.
+
+##  Setup environment:
+from  __future__ import print_function
+import sys, os, re, json, math, time, shutil, platform, tempfile, argparse, subprocess, multiprocessing, numpy
+import isochore_fasta
+from collections import OrderedDict
+
+WINDOWS = '1000,3000,5000,20000,80000,320000'	##the standard window sizes of the summarizer
+CHUNK_BASES = 4*1024**2	##bases generated at a time
+BASES = numpy.frombuffer(b'TACG', dtype=numpy.uint8)	##AT bases for codes 0 and 1, GC bases for codes 2 and 3
+here = os.path.dirname(os.path.abspath(__file__))
+DEINTERLEAVE = os.path.join(here, 'deinterleave.py')
+ANALYZER = os.path.join(here, 'isochore_analyzer1.831.py')
+SUMMARIZER = os.path.join(here, 'isochore_summarizer_0.56.py')
+RUN_FOLDER = re.compile('^Run.*?_GC_output_(.+)_(\\d+)_(\\d+)$')	##organism, window size and time since epoch of a run folder, as in the summarizer
+LAUNCHER = """import sys, time, json, resource, subprocess
+started = time.time()
+code = subprocess.call(sys.argv[2:])
+wall = time.time()-started
+usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+with open(sys.argv[1], 'w') as handle:
+	json.dump([code, wall, usage.ru_utime+usage.ru_stime, usage.ru_maxrss*1024], handle)
+"""	##runs a command and saves its exit code, wall-clock seconds, CPU seconds and peak memory (ru_maxrss is in kilobytes on Linux)
+
+##  Functions:
+def parse_size(text):
+	"""Convert a size such as '500K', '50M' or '1000000' to a number of bases (powers of 1000, as genome sizes are given)."""
+	units = {'K': 10**3, 'M': 10**6, 'G': 10**9}
+	text = text.strip().upper().rstrip('B')
+	if text and text[-1] in units:
+		return int(float(text[:-1]) * units[text[-1]])
+	return int(text)
+
+def contig_lengths(rng, size, mean, sigma):
+	"""Draw log-normal contig lengths of the given mean until they add up to size bases, cutting the last one to fit."""
+	lengths, total = [], 0
+	while total < size:
+		length = max(1, int(rng.lognormal(math.log(mean)-sigma*sigma/2.0, sigma))) if sigma > 0 else int(mean)
+		length = min(length, size-total)
+		lengths.append(length)
+		total = total+length
+	return lengths
+
+def contig_layout(rng, length, gc_mean, gc_sd, domain_mean, ambiguous_rate, ambiguous_mean):
+	"""Draw the domains of one contig (their end positions and GC fractions) and its runs of ambiguous bases as (start, end)."""
+	ends = []
+	while not ends or ends[-1] < length:
+		ends.append((ends[-1] if ends else 0)+max(1, int(rng.exponential(domain_mean))))
+	ends[-1] = length
+	gc = numpy.clip(rng.normal(gc_mean, gc_sd, len(ends)), 0, 100)/100.0
+	runs = []
+	for i in range(rng.poisson(ambiguous_rate*length/1e6)):
+		start = int(rng.randint(0, length))
+		runs.append((start, min(length, start+int(rng.geometric(1.0/max(ambiguous_mean, 1))))))
+	return numpy.array(ends, dtype=numpy.int64), gc, runs
+
+def contig_bases(rng, start, end, ends, gc, runs):
+	"""Generate bases start to end of a contig as a uint8 array, each base GC with the probability of its domain."""
+	first, last = numpy.searchsorted(ends, [start, end-1], side='right')
+	segments = numpy.minimum(ends[first:last+1], end)-numpy.maximum(numpy.concatenate([[0], ends])[first:last+1], start)
+	p = numpy.repeat(gc[first:last+1], segments)
+	u = rng.random_sample(end-start)
+	is_gc = u < p
+	half = numpy.where(is_gc, u < p/2, u < (1+p)/2)	##the same draw picks between the two bases of the class
+	bases = BASES[is_gc*2+half]
+	for run_start, run_end in runs:
+		if run_start < end and run_end > start:
+			bases[max(run_start, start)-start:min(run_end, end)-start] = ord('N')
+	return bases
+
+def write_lines(handle, bases, width):
+	"""Write bases as lines of width bases (the last one may be shorter), or as they are when width is 0."""
+	if not width:
+		handle.write(bases.tobytes())
+		return
+	full = len(bases)//width
+	lines = numpy.empty((full, width+1), dtype=numpy.uint8)
+	lines[:, :width] = bases[:full*width].reshape(full, width)
+	lines[:, width] = ord('\n')
+	handle.write(lines.tobytes())
+	if len(bases) > full*width:
+		handle.write(bases[full*width:].tobytes()+b'\n')
+
+def synthetic_genome(path, size, seed=1, contig_mean=2000000, contig_sigma=1.5, gc_mean=41.0, gc_sd=4.0, domain_mean=300000, ambiguous_rate=2.0, ambiguous_mean=1000, line_width=80):
+	"""Write a synthetic FASTA genome of size bases, drawn from numpy.random.RandomState(seed). Returns the number of contigs."""
+	rng = numpy.random.RandomState(seed)
+	lengths = contig_lengths(rng, size, contig_mean, contig_sigma)
+	chunk = CHUNK_BASES//line_width*line_width if line_width else CHUNK_BASES	##chunks start new lines
+	with open(path, 'wb') as handle:
+		for number, length in enumerate(lengths, 1):
+			handle.write(('>synthetic_'+str(number)+' length='+str(length)+' seed='+str(seed)+'\n').encode('ascii'))
+			ends, gc, runs = contig_layout(rng, length, gc_mean, gc_sd, domain_mean, ambiguous_rate, ambiguous_mean)
+			for start in range(0, length, chunk):
+				write_lines(handle, contig_bases(rng, start, min(start+chunk, length), ends, gc, runs), line_width)
+			if not line_width:
+				handle.write(b'\n')
+	return len(lengths)
+
+def run_command(command, logfile, cwd):
+	"""Run a command with its output written to logfile. Returns its exit code and the wall-clock seconds, CPU seconds and peak resident set size (in bytes) of its process and the workers it waited for.
+	The command is started by LAUNCHER in a new interpreter, because Linux carries the peak memory of a process over to the programs its children run, so a command started from this process would report at least the memory of the genome generator."""
+	usagefile = logfile+'.usage.json'
+	with open(logfile, 'w') as handle:
+		subprocess.call([sys.executable, '-c', LAUNCHER, usagefile]+command, stdout=handle, stderr=subprocess.STDOUT, cwd=cwd)
+	with open(usagefile, 'r') as handle:
+		code, wall, cpu, rss = json.load(handle)
+	os.remove(usagefile)
+	return code, OrderedDict([('wall_seconds', wall), ('cpu_seconds', cpu), ('peak_rss_bytes', rss)])
+
+def benchmark(name, command, cwd, args, before=None, check=None):
+	"""Run a benchmark --repeat times, calling before() ahead of every repeat and check() after it to make sure the command did its work. Returns its results, with the fastest repeat."""
+	repeats = []
+	for repeat in range(args.repeat):
+		if before:
+			before()
+		logfile = os.path.join(args.workdir, 'log_'+name+'_'+str(repeat+1)+'.txt')
+		code, result = run_command(command, logfile, cwd)
+		if check and not check():
+			sys.exit('Error: benchmark '+name+' failed (exit code '+str(code)+'); see '+logfile)
+		result['exit_code'] = code
+		repeats.append(result)
+		print(' ', name, 'repeat', repeat+1, 'of', args.repeat, 'took', round(result['wall_seconds'], 3), 'seconds and', result['peak_rss_bytes']//1024**2, 'Mb.')
+		sys.stdout.flush()
+	best = min(repeats, key=lambda result: result['wall_seconds'])
+	return OrderedDict([('name', name), ('command', [os.path.basename(part) for part in command]), ('wall_seconds', best['wall_seconds']), ('cpu_seconds', best['cpu_seconds']),
+		('median_wall_seconds', float(numpy.median([result['wall_seconds'] for result in repeats]))), ('peak_rss_bytes', max(result['peak_rss_bytes'] for result in repeats)), ('repeats', repeats)])
+
+def run_folders(folder):
+	"""Return the names of the run folders in a folder."""
+	return sorted(name for name in os.listdir(folder) if RUN_FOLDER.match(name))
+
+def fake_runs(templates, folder, samples, manifests=True):
+	"""Copy the log, manifest and statistics files of the template run folders to run folders of samples fake samples. Returns the number of run folders written."""
+	written = 0
+	for template in templates:
+		organism, window, epoch = RUN_FOLDER.match(os.path.basename(template)).groups()
+		name = organism+'_'+window+'_'+epoch
+		with open(os.path.join(template, 'log_'+name+'.txt'), 'r') as handle:
+			log = handle.read()
+		with open(os.path.join(template, 'manifest_'+name+'.json'), 'r') as handle:
+			manifest = json.load(handle, object_pairs_hook=OrderedDict)
+		with open(os.path.join(template, 'stats_'+name+'.json'), 'r') as handle:
+			stats = handle.read()
+		for sample in range(samples):
+			organism = 'sample'+str(sample+1)
+			name = organism+'_'+window+'_'+epoch
+			outfolder = os.path.join(folder, 'Run1.831_GC_output_'+name)
+			os.makedirs(outfolder)
+			with open(os.path.join(outfolder, 'log_'+name+'.txt'), 'w') as handle:
+				handle.write(log)
+			with open(os.path.join(outfolder, 'stats_'+name+'.json'), 'w') as handle:
+				handle.write(stats)
+			if manifests:
+				manifest['organism'] = organism
+				with open(os.path.join(outfolder, 'manifest_'+name+'.json'), 'w') as handle:
+					json.dump(manifest, handle, indent=2)
+			written = written+1
+	return written
+
+def remove(path):
+	"""Delete a file or folder if it exists."""
+	if os.path.isdir(path):
+		shutil.rmtree(path)
+	elif os.path.exists(path):
+		os.remove(path)
+
+def git_revision():
+	"""Return the git revision of this folder (with -dirty for uncommitted changes), or None outside a git repository."""
+	try:
+		with open(os.devnull, 'w') as devnull:
+			return subprocess.check_output(['git', 'describe', '--always', '--dirty'], cwd=here, stderr=devnull).decode('utf-8').strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def compare(results, baseline, tolerance):
+	"""Print the change of every benchmark from a baseline results file and return the names of those more than tolerance slower or larger in memory."""
+	before = OrderedDict((result['name'], result) for result in baseline['benchmarks'])
+	regressions = []
+	print('\nChange from', baseline.get('label'), '('+str(baseline.get('revision'))+'):')
+	for result in results['benchmarks']:
+		if result['name'] not in before:
+			print(' ', result['name']+': not in the baseline')
+			continue
+		wall = result['wall_seconds']/max(before[result['name']]['wall_seconds'], 1e-9)
+		memory = result['peak_rss_bytes']/float(max(before[result['name']]['peak_rss_bytes'], 1))
+		regressed = wall > 1+tolerance or memory > 1+tolerance
+		print(' ', result['name']+':', round(wall, 3), 'times the wall-clock time and', round(memory, 3), 'times the peak memory'+(' << REGRESSION' if regressed else ''))
+		if regressed:
+			regressions.append(result['name'])
+	if results['genome'].get('sha256') != baseline.get('genome', {}).get('sha256'):
+		print('Warning: the baseline was measured on a different genome, so the benchmarks are not comparable.')
+	return regressions
+
+##  Run the benchmarks from the command line:
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Time the isochore scripts on a synthetic genome and record the results as JSON.')
+	parser.add_argument('--output', default=None, help='results file (default: benchmark_<label>_<time since epoch>.json in the working directory)')
+	parser.add_argument('--workdir', default=None, help='folder for the genome and the runs (default: a temporary folder)')
+	parser.add_argument('--keep', action='store_true', help='keep the work folder')
+	parser.add_argument('--generate', default=None, help='only write the synthetic genome to this file')
+	parser.add_argument('--seed', type=int, default=1, help='seed of the genome (default 1)')
+	parser.add_argument('--size', default='50M', help='bases of the genome, e.g. 500K or 50M (default 50M)')
+	parser.add_argument('--contig-mean', default='2M', help='mean contig length (default 2M)')
+	parser.add_argument('--contig-sigma', type=float, default=1.5, help='shape of the log-normal contig lengths; 0 makes every contig --contig-mean long (default 1.5)')
+	parser.add_argument('--gc-mean', type=float, default=41.0, help='mean GC percent of the domains (default 41)')
+	parser.add_argument('--gc-sd', type=float, default=4.0, help='standard deviation of the GC percent of the domains (default 4)')
+	parser.add_argument('--domain-mean', default='300K', help='mean length of the GC domains (default 300K)')
+	parser.add_argument('--ambiguous-rate', type=float, default=2.0, help='runs of N per million bases (default 2)')
+	parser.add_argument('--ambiguous-mean', type=int, default=1000, help='mean length of the runs of N (default 1000)')
+	parser.add_argument('--line-width', type=int, default=80, help='bases per sequence line; 0 writes each contig on one line (default 80)')
+	parser.add_argument('--samples', type=int, default=500, help='fake samples summarized, each at the six window sizes (default 500)')
+	parser.add_argument('--repeat', type=int, default=3, help='repeats of every benchmark (default 3)')
+	parser.add_argument('--analyzer-jobs', type=int, default=1, help='--jobs of the analyzer (default 1)')
+	parser.add_argument('--python', default=sys.executable, help='interpreter that runs the scripts (default: this one)')
+	parser.add_argument('--label', default=None, help='name of this set of results, e.g. a branch name (default: the git revision)')
+	parser.add_argument('--compare', default=None, help='earlier results file to compare with')
+	parser.add_argument('--tolerance', type=float, default=0.1, help='slowdown or memory growth reported as a regression by --compare (default 0.1)')
+	args = parser.parse_args()
+	options = OrderedDict([('seed', args.seed), ('size', parse_size(args.size)), ('contig_mean', parse_size(args.contig_mean)), ('contig_sigma', args.contig_sigma),
+		('gc_mean', args.gc_mean), ('gc_sd', args.gc_sd), ('domain_mean', parse_size(args.domain_mean)), ('ambiguous_rate', args.ambiguous_rate),
+		('ambiguous_mean', args.ambiguous_mean), ('line_width', args.line_width)])
+	if options['size'] < 1 or options['contig_mean'] < 1 or options['domain_mean'] < 1 or args.line_width < 0 or args.repeat < 1 or args.samples < 1:
+		sys.exit('Error: the size, lengths, samples and repeats must be at least 1, and the line width at least 0.')
+	if args.generate:
+		started = time.time()
+		contigs = synthetic_genome(args.generate, **options)
+		print('Wrote', contigs, 'contigs and', options['size'], 'bases to', args.generate, 'in', round(time.time()-started, 2), 'seconds.')
+		sys.exit(0)
+	revision = git_revision()
+	label = args.label or revision or 'benchmark'
+	timesinceepoch = int(time.time())
+	output = os.path.abspath(args.output or 'benchmark_'+re.sub('[^A-Za-z0-9_.-]', '_', label)+'_'+str(timesinceepoch)+'.json')
+	temporary = args.workdir is None
+	args.workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix='isochore_benchmark_'))
+	if not os.path.isdir(args.workdir):
+		os.makedirs(args.workdir)
+	python = [args.python]
+	try:
+		##Generate the genome:
+		genome = os.path.join(args.workdir, 'synthetic_'+str(args.seed)+'.fa')
+		print('Writing a synthetic genome of', options['size'], 'bases to', genome)
+		started = time.time()
+		contigs = synthetic_genome(genome, **options)
+		versions = subprocess.check_output(python+['-c', 'import sys, numpy; print(sys.version.split()[0]+" "+numpy.__version__)']).decode('utf-8').split()
+		results = OrderedDict([('label', label), ('revision', revision), ('started', time.strftime('%Y-%m-%dT%H:%M:%S')), ('python', args.python),
+			('python_version', versions[0]), ('numpy_version', versions[1]),
+			('platform', platform.platform()), ('cpus', multiprocessing.cpu_count()), ('options', options), ('repeat', args.repeat), ('analyzer_jobs', args.analyzer_jobs),
+			('genome', OrderedDict([('path', genome), ('bytes', os.path.getsize(genome)), ('bases', options['size']), ('contigs', contigs),
+				('sha256', isochore_fasta.file_checksum(genome)), ('generate_seconds', time.time()-started)])), ('benchmarks', [])])
+		print('Wrote', contigs, 'contigs in', round(results['genome']['generate_seconds'], 2), 'seconds.')
+		benchmarks = results['benchmarks']
+
+		##deinterleave.py:
+		print('Timing deinterleave.py:')
+		result = benchmark('deinterleave', python+[DEINTERLEAVE, genome], args.workdir, args, before=lambda: remove(genome+'2'), check=lambda: os.path.exists(genome+'2'))
+		result['bases_per_second'] = options['size']/result['wall_seconds']
+		benchmarks.append(result)
+		remove(genome+'2')
+
+		##The analyzer at the six window sizes, building the index every time as a first run does:
+		for name, extra in (('analyzer', []), ('analyzer_stream', ['--stream'])):
+			print('Timing isochore_analyzer1.831.py'+(' '+' '.join(extra) if extra else '')+':')
+			runfolder = os.path.join(args.workdir, name)
+			def before():
+				remove(runfolder)
+				os.makedirs(runfolder)
+				remove(isochore_fasta.index_path(genome))
+			def check():
+				return len([folder for folder in run_folders(runfolder) if os.listdir(os.path.join(runfolder, folder))]) == len(WINDOWS.split(','))
+			result = benchmark(name, python+[ANALYZER, genome, 'synthetic', 'benchmark', '--windows', WINDOWS, '--jobs', str(args.analyzer_jobs)]+extra, runfolder, args, before, check)
+			result['bases_per_second'] = options['size']/result['wall_seconds']
+			first = sorted(run_folders(runfolder), key=lambda name: int(RUN_FOLDER.match(name).group(2)))[0]
+			with open(os.path.join(runfolder, first, 'manifest_'+first.split('_GC_output_')[1]+'.json'), 'r') as handle:
+				manifest = json.load(handle, object_pairs_hook=OrderedDict)
+			result['stages'] = manifest.get('stages')	##of the last repeat
+			benchmarks.append(result)
+		templates = [os.path.join(runfolder, name) for name in run_folders(runfolder)]
+
+		##The summarizer over fake runs, with and without its cache and manifests:
+		summaries = os.path.join(args.workdir, 'summaries')
+		os.makedirs(summaries)
+		for name, manifests in (('summarizer', True), ('summarizer_logs', False)):
+			fakes = os.path.join(args.workdir, 'fake_runs' if manifests else 'fake_logs')
+			print('Writing', args.samples*len(templates), 'fake run folders'+('' if manifests else ' without manifests'), 'to', fakes)
+			remove(fakes)
+			os.makedirs(fakes)
+			nruns = fake_runs(templates, fakes, args.samples, manifests)
+			cases = [('summarizer_cold', [], lambda: remove(os.path.join(fakes, '.isochore_summarizer_cache.json'))), ('summarizer_warm', [], None)] if manifests else [(name, ['--no-cache'], None)]
+			for case, extra, before in cases:
+				print('Timing isochore_summarizer_0.56.py ('+case+'):')
+				result = benchmark(case, python+[SUMMARIZER, fakes]+extra, summaries, args, before)
+				result['run_folders'] = nruns
+				result['runs_per_second'] = nruns/result['wall_seconds']
+				benchmarks.append(result)
+	finally:
+		if temporary and not args.keep:
+			remove(args.workdir)
+		elif args.keep or not temporary:
+			print('The genome and the runs are in', args.workdir)
+
+	##Record the results, and compare them with a baseline:
+	with open(output, 'w') as handle:
+		json.dump(results, handle, indent=2)
+		handle.write('\n')
+	print('\nResults of', label+':')
+	for result in results['benchmarks']:
+		rate = ' ('+str(int(result['bases_per_second']))+' bases per second)' if 'bases_per_second' in result else ' ('+str(int(result['runs_per_second']))+' run folders per second)'
+		print(' ', result['name']+':', round(result['wall_seconds'], 3), 'seconds,', round(result['cpu_seconds'], 3), 'CPU seconds,', result['peak_rss_bytes']//1024**2, 'Mb'+rate)
+	print('Results written to', output)
+	if args.compare:
+		with open(args.compare, 'r') as handle:
+			regressions = compare(results, json.load(handle), args.tolerance)
+		if regressions:
+			sys.exit('Error: '+', '.join(regressions)+' regressed by more than '+str(int(args.tolerance*100))+' percent.')
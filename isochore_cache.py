@@ -0,0 +1,111 @@
+#!/usr/bin/python
+
+##  Content-addressed cache of contig counts for isochore_analyzer1.831.py.
+##  Usage:
+##    >>> python isochore_analyzer1.831.py filename.fasta organism group 5000 --cache-dir /scratch/isochore_cache [--cache-size 20G]
+##    >>> python isochore_cache.py /scratch/isochore_cache [--cache-size 20G]
+##  An entry holds the cumulative GC and AT block counts of every contig of one input file, in the order the analyzer visits them, and is named after:
+##    the SHA-256 checksum of the input file << the same file under another name or path is found again, and a changed file never is
+##    the contig order << 'file' for streamed runs, 'sorted' for runs through the index
+##    the block size << the greatest common divisor of the window sizes (and step) of the run that saved it
+##    the counting rules << a digest of the lookup table of isochore_counts.py, so entries from other base classes are never used
+##  Any window size (or step) that is a multiple of the block size of an entry is derived from it without reading the input again, so a later run reuses the counts of an earlier run at new window sizes whenever they share the block size. The missing-data threshold is applied to the counts afterwards, so entries serve every threshold.
+##  The cache is kept within --cache-size bytes by evicting the least recently used entries; using an entry updates its modification time. Running this module on a cache folder only evicts.
+
+##  Setup environment:
+from  __future__ import print_function
+import os, re, hashlib, argparse, numpy
+import isochore_counts, isochore_fasta
+
+CACHE_SIZE = 20*1024**3	##default size limit of a cache folder in bytes
+RULES = hashlib.sha1(isochore_counts.CLASS_TABLE.tobytes()).hexdigest()[:12]
+ENTRY = re.compile('^([0-9a-f]{64})_(file|sorted)_(\\d+)_([0-9a-f]+)\\.npz$')	##checksum, order, block size and rules of an entry
+
+def parse_size(text):
+	"""Convert a size such as '512M', '20G' or '1048576' to a number of bytes."""
+	units = {'K': 1024, 'M': 1024**2, 'G': 1024**3, 'T': 1024**4}
+	text = text.strip().upper().rstrip('B')
+	if text and text[-1] in units:
+		return int(float(text[:-1]) * units[text[-1]])
+	return int(text)
+
+def entry_name(checksum, order, blocksize):
+	"""File name of the cache entry of an input file, contig order and block size."""
+	return '_'.join([checksum, order, str(blocksize), RULES])+'.npz'
+
+def entry_bytes(nblocks):
+	"""Approximate size in bytes of an entry holding nblocks blocks, to decide whether a run is worth caching."""
+	return nblocks*2*4
+
+def find(cachedir, checksum, order, blocksize):
+	"""Return the path of the entry of the input file and contig order with the largest block size that divides blocksize, or None."""
+	best = None
+	if not os.path.isdir(cachedir):
+		return None
+	for name in os.listdir(cachedir):
+		match = ENTRY.match(name)
+		if match and match.group(1) == checksum and match.group(2) == order and match.group(4) == RULES:
+			size = int(match.group(3))
+			if blocksize % size == 0 and (best is None or size > best[0]):
+				best = (size, os.path.join(cachedir, name))
+	return best and best[1]
+
+def load(path):
+	"""Return the number of headers, the block size and a list of (key, cumulative GC counts, cumulative AT counts) of every contig of an entry, marking it as recently used."""
+	with numpy.load(path) as data:
+		keys = [isochore_fasta._text(key) for key in data['keys'].tolist()]
+		offsets = data['offsets']
+		gc, at = data['gc'].astype(numpy.int64), data['at'].astype(numpy.int64)
+		headernum, blocksize = int(data['headernum']), int(data['blocksize'])
+	try:
+		os.utime(path, None)
+	except OSError:
+		pass
+	return headernum, blocksize, [(key, gc[offsets[i]:offsets[i+1]], at[offsets[i]:offsets[i+1]]) for i, key in enumerate(keys)]
+
+def save(cachedir, checksum, order, blocksize, headernum, contigs, maxbytes=CACHE_SIZE):
+	"""Save the (key, cumulative GC counts, cumulative AT counts) of every contig as an entry, then evict entries to stay within maxbytes. Returns the path of the entry."""
+	if not os.path.isdir(cachedir):
+		os.makedirs(cachedir)
+	path = os.path.join(cachedir, entry_name(checksum, order, blocksize))
+	offsets = numpy.cumsum([0]+[len(cum_gc) for key, cum_gc, cum_at in contigs]).astype(numpy.int64)
+	empty = numpy.zeros(0, dtype=numpy.int64)
+	gc = numpy.concatenate([cum_gc for key, cum_gc, cum_at in contigs] or [empty])
+	at = numpy.concatenate([cum_at for key, cum_gc, cum_at in contigs] or [empty])
+	dtype = numpy.uint32 if max(gc.max() if gc.size else 0, at.max() if at.size else 0) < 2**32 else numpy.int64
+	temporary = path+'.'+str(os.getpid())+'.tmp'
+	with open(temporary, 'wb') as handle:
+		numpy.savez(handle, keys=numpy.array([key for key, cum_gc, cum_at in contigs], dtype=str), offsets=offsets, gc=gc.astype(dtype), at=at.astype(dtype),
+			headernum=numpy.int64(headernum), blocksize=numpy.int64(blocksize))
+	os.rename(temporary, path)	##readers never see a partly written entry
+	evict(cachedir, maxbytes, keep=path)
+	return path
+
+def evict(cachedir, maxbytes=CACHE_SIZE, keep=None):
+	"""Delete the least recently used entries until the entries of cachedir take at most maxbytes, never deleting keep. Returns the number of entries deleted."""
+	entries = []
+	for name in os.listdir(cachedir):
+		if ENTRY.match(name):
+			path = os.path.join(cachedir, name)
+			info = os.stat(path)
+			entries.append((info.st_mtime, info.st_size, path))
+	total, deleted = sum(size for mtime, size, path in entries), 0
+	for mtime, size, path in sorted(entries):
+		if total <= maxbytes:
+			break
+		if path == keep:
+			continue
+		try:
+			os.remove(path)
+		except OSError:
+			continue
+		total, deleted = total-size, deleted+1
+	return deleted
+
+##  Evict entries of a cache folder from the command line:
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Evict the least recently used entries of an isochore analyzer cache.')
+	parser.add_argument('cachedir', help='cache folder')
+	parser.add_argument('--cache-size', default=str(CACHE_SIZE), help='size limit, e.g. 512M or 20G (default 20G)')
+	args = parser.parse_args()
+	print('Evicted', evict(args.cachedir, parse_size(args.cache_size)), 'entries from', args.cachedir)
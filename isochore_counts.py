@@ -0,0 +1,86 @@
+#!/usr/bin/python
+
+##  Base-counting kernel for the isochore scripts.
+##  Every base of a contig is mapped to a class with a 256-entry lookup table, and whole contigs are counted at once by reshaping the classes into windows:
+##    AT << A, T and W (weak) in either case
+##    GC << G, C and S (strong) in either case
+##    ambiguous or missing << everything else, e.g. N, -, ? and the other IUPAC codes
+##  Several window sizes are derived from one pass by counting blocks of their greatest common divisor and differencing the cumulative block counts. Overlapping (sliding) windows are derived the same way, with the step included in the greatest common divisor. cumulative and window_sums work on a count per block or on a column per count (as isochore_metrics counts its bases), so every count is windowed the same way.
+##  A window is missing data when at least MISSING_THRESHOLD of its bases are ambiguous or missing, and its GC percentage is GC/(AT+GC)*100 otherwise.
+
+##  Setup environment:
+from  __future__ import print_function
+import numpy
+
+AMBIGUOUS, AT, GC = 0, 1, 2
+MISSING_THRESHOLD = 0.2
+CLASS_TABLE = numpy.zeros(256, dtype=numpy.uint8)
+for base in 'ATWatw':
+	CLASS_TABLE[ord(base)] = AT
+for base in 'GCSgcs':
+	CLASS_TABLE[ord(base)] = GC
+
+def as_bytes(seq):
+	"""Return seq as bytes, encoding text sequences as ASCII."""
+	if isinstance(seq, bytes):
+		return seq
+	return seq.encode('ascii')
+
+def class_codes(seq):
+	"""Map every base of seq, given as text, bytes or a uint8 array, to AMBIGUOUS, AT or GC."""
+	if isinstance(seq, numpy.ndarray):
+		return CLASS_TABLE[seq]
+	return CLASS_TABLE[numpy.frombuffer(as_bytes(seq), dtype=numpy.uint8)]
+
+def window_counts(seq, windowsize):
+	"""Count the GC and AT bases of every complete window of seq.
+	Returns two int64 arrays with one entry per complete window. Bases after the last complete window are ignored."""
+	codes = class_codes(seq)
+	nwindows = len(codes)//windowsize
+	codes = codes[:nwindows*windowsize].reshape(nwindows, windowsize)
+	gc = (codes == GC).sum(axis=1, dtype=numpy.int64)
+	at = (codes == AT).sum(axis=1, dtype=numpy.int64)
+	return gc, at
+
+def classify_windows(gc, at, windowsize):
+	"""Return the GC percentage of the windows preceding the first missing-data window, and the index of that window (None if there is none)."""
+	valid = gc+at
+	missing = (windowsize-valid)/float(windowsize) >= MISSING_THRESHOLD
+	first_missing = None
+	if missing.any():
+		first_missing = int(missing.argmax())
+		gc, valid = gc[:first_missing], valid[:first_missing]
+	return (gc/valid.astype(numpy.float64))*100, first_missing
+
+def gcd(a, b):
+	"""Greatest common divisor of two window sizes."""
+	while b:
+		a, b = b, a % b
+	return a
+
+def cumulative(blocks):
+	"""Turn per-block counts, with a row per block (one count per block, or a column per count), into cumulative counts with a leading row of zeros, so that cum[j]-cum[i] counts blocks i to j-1."""
+	blocks = numpy.asarray(blocks)
+	cum = numpy.zeros((len(blocks)+1,)+blocks.shape[1:], dtype=numpy.int64)
+	numpy.cumsum(blocks, axis=0, out=cum[1:])
+	return cum
+
+def window_sums(cum, blocks_per_window, blocks_per_step=None):
+	"""Return the counts of every complete window spanning blocks_per_window blocks from cumulative counts (a row per block boundary), starting every blocks_per_step blocks (every blocks_per_window without a step).
+	Each window is the difference of two cumulative counts, so overlapping windows cost O(windows) however much they overlap."""
+	if blocks_per_step:
+		starts = numpy.arange(0, len(cum)-blocks_per_window, blocks_per_step)
+		return cum[starts+blocks_per_window]-cum[starts]
+	return numpy.diff(cum[::blocks_per_window], axis=0)
+
+def cumulative_counts(gc, at):
+	"""Turn per-block GC and AT counts into cumulative counts with a leading zero."""
+	return cumulative(gc), cumulative(at)
+
+def windows_from_cumulative(cum_gc, cum_at, blocks_per_window):
+	"""Return the GC and AT counts of every complete window spanning blocks_per_window blocks, in O(windows)."""
+	return window_sums(cum_gc, blocks_per_window), window_sums(cum_at, blocks_per_window)
+
+def sliding_windows_from_cumulative(cum_gc, cum_at, blocks_per_window, blocks_per_step):
+	"""Return the GC and AT counts of every complete window spanning blocks_per_window blocks, starting every blocks_per_step blocks."""
+	return window_sums(cum_gc, blocks_per_window, blocks_per_step), window_sums(cum_at, blocks_per_window, blocks_per_step)
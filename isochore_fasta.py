@@ -0,0 +1,182 @@
+#!/usr/bin/python
+
+##  Indexed, memory-mapped access to FASTA files for the isochore scripts.
+##  Usage:
+##    >>> python isochore_fasta.py filename.fasta [filename2.fasta ...]
+##  Writes a samtools-compatible index next to each file (filename.fasta.fai). Each line of the index has five tab-separated columns:
+##    name << the first word of the header
+##    length << number of bases in the contig
+##    offset << byte offset of the first base
+##    linebases << bases per sequence line
+##    linewidth << bytes per sequence line, including the line ending
+##  Interleaved records must use the same line length throughout (except for their last line), as samtools requires. Deinterleaved files have one line per record and always qualify.
+##  open_fasta reads plain, gzip and bgzip files alike, decompressing on the fly. Compressed files cannot be memory-mapped or indexed and are read from start to end instead.
+##  FastaMmap memory-maps an indexed file and returns contigs or regions as NumPy arrays. Regions within one line, and therefore any region of a deinterleaved file, are zero-copy views of the file.
+
+##  Setup environment:
+from  __future__ import print_function
+import sys, os, mmap, gzip, hashlib, collections, numpy
+
+FaiRecord = collections.namedtuple('FaiRecord', ['name', 'length', 'offset', 'linebases', 'linewidth'])
+HASHSIZE = 8*1024**2	##bytes read at a time when computing a checksum
+SCANSIZE = 64*1024**2	##bytes checked at a time when counting line breaks, so building an index needs little memory
+WHITESPACE = b' \t\r\n'
+GZIP_MAGIC = b'\x1f\x8b'	##first bytes of gzip and bgzip files
+
+def _text(raw):
+	"""Header bytes as the native string type."""
+	return raw if isinstance(raw, str) else raw.decode('ascii', 'replace')
+
+def is_compressed(path):
+	"""True if path is a gzip or bgzip file."""
+	with open(path, 'rb') as handle:
+		return handle.read(2) == GZIP_MAGIC
+
+def open_fasta(path):
+	"""Open a FASTA file for reading bytes, decompressing gzip and bgzip (multi-member gzip) files as they are read."""
+	if is_compressed(path):
+		return gzip.open(path, 'rb')
+	return open(path, 'rb')
+
+def file_checksum(path):
+	"""SHA-256 of the bytes of a file (compressed or not), as a hexadecimal string."""
+	digest = hashlib.sha256()
+	with open(path, 'rb') as handle:
+		for block in iter(lambda: handle.read(HASHSIZE), b''):
+			digest.update(block)
+	return digest.hexdigest()
+
+def index_path(path):
+	"""Path of the index of a FASTA file."""
+	return path+'.fai'
+
+def _record(data, mm, name, seqstart, seqend):
+	"""Work out the line layout of one record from its sequence bytes, mm[seqstart:seqend]."""
+	end = seqend
+	while end > seqstart and mm[end-1:end] in WHITESPACE:
+		end = end-1
+	newline = mm.find(b'\n', seqstart, end)
+	if newline < 0:
+		ending = 2 if mm[end:end+2] == b'\r\n' else 1
+		return FaiRecord(name, end-seqstart, seqstart, end-seqstart, end-seqstart+ending)
+	linewidth = newline-seqstart+1
+	linebases = linewidth-1-(mm[newline-1:newline] == b'\r')
+	nfull = (end-seqstart)//linewidth
+	lastline = (end-seqstart)-nfull*linewidth
+	newlines = 0
+	for scan in range(seqstart, end, SCANSIZE):
+		newlines = newlines+int(numpy.count_nonzero(data[scan:min(scan+SCANSIZE, end)] == 10))
+	expected = data[seqstart+linewidth-1:seqstart+nfull*linewidth:linewidth]
+	if linebases < 1 or lastline > linebases or newlines != nfull or not (expected == 10).all():
+		raise ValueError('Record '+name+' has sequence lines of different lengths and cannot be indexed. Run deinterleave.py on the file first.')
+	return FaiRecord(name, nfull*linebases+lastline, seqstart, linebases, linewidth)
+
+def build_index(path):
+	"""Scan a FASTA file and return a FaiRecord for every record, in file order."""
+	records = []
+	if os.path.getsize(path) == 0:
+		return records
+	if is_compressed(path):
+		raise ValueError('File '+path+' is compressed and cannot be indexed or memory-mapped.')
+	failure = None
+	with open(path, 'rb') as handle:
+		mm = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+		data = numpy.frombuffer(mm, dtype=numpy.uint8)
+		try:
+			if mm[0:1] == b'>':
+				headerstart = 0
+			else:
+				headerstart = mm.find(b'\n>')
+				headerstart = headerstart+1 if headerstart >= 0 else -1
+			while headerstart >= 0:
+				headerend = mm.find(b'\n', headerstart)
+				if headerend < 0:
+					headerend = len(mm)
+				nextheader = mm.find(b'\n>', headerend)
+				seqend = len(mm) if nextheader < 0 else nextheader+1
+				header = _text(mm[headerstart+1:headerend]).strip()
+				records.append(_record(data, mm, (header.split() or [''])[0], min(headerend+1, len(mm)), seqend))
+				headerstart = seqend if nextheader >= 0 else -1
+		except ValueError as error:
+			failure = str(error)	##raised again once the map is closed, since its traceback holds views of the map
+		finally:
+			del data
+			try:
+				mm.close()
+			except BufferError:
+				pass	##the traceback of another error still holds views of the map, which is closed when they are freed
+	if failure:
+		raise ValueError(failure)
+	return records
+
+def write_index(path, records):
+	"""Write records to the samtools-style index of a FASTA file."""
+	with open(index_path(path), 'w') as handle:
+		for record in records:
+			handle.write('\t'.join(str(field) for field in record)+'\n')
+
+def read_index(path):
+	"""Read the samtools-style index of a FASTA file."""
+	with open(index_path(path), 'r') as handle:
+		return [FaiRecord(fields[0], int(fields[1]), int(fields[2]), int(fields[3]), int(fields[4])) for fields in (line.rstrip('\n').split('\t') for line in handle) if len(fields) >= 5]
+
+def load_index(path):
+	"""Return the index of a FASTA file, reusing the .fai file when it is newer than the FASTA file and building (and saving, if possible) a new one otherwise."""
+	fai = index_path(path)
+	if os.path.exists(fai) and os.path.getmtime(fai) >= os.path.getmtime(path):
+		return read_index(path)
+	records = build_index(path)
+	try:
+		write_index(path, records)
+	except (IOError, OSError):
+		print('Could not save the index to', fai+'; it will be rebuilt next time.')
+	return records
+
+class FastaMmap(object):
+	"""Memory-mapped FASTA file with zero-copy access to its contigs through a samtools-style index."""
+	def __init__(self, path, index=None):
+		self.path = path
+		self.index = load_index(path) if index is None else index
+		self.handle = open(path, 'rb')
+		self.mm, self.data = None, numpy.zeros(0, dtype=numpy.uint8)
+		if os.path.getsize(path) > 0:
+			self.mm = mmap.mmap(self.handle.fileno(), 0, access=mmap.ACCESS_READ)
+			self.data = numpy.frombuffer(self.mm, dtype=numpy.uint8)
+
+	def header(self, record):
+		"""Return the full header line of a record, without the leading '>'."""
+		end = record.offset
+		if self.mm[end-1:end] == b'\n':
+			end = end-1
+		start = self.mm.rfind(b'\n', 0, end)+1
+		return _text(self.mm[start:end])[1:].strip()
+
+	def region(self, record, start=0, end=None):
+		"""Return bases start to end (0-based, end exclusive) of a record as a uint8 array.
+		The array is a view of the file when the region lies within one line, and a copy of just the bases otherwise."""
+		if end is None or end > record.length:
+			end = record.length
+		if start >= end:
+			return self.data[0:0]
+		firstline, lastline = start//record.linebases, (end-1)//record.linebases
+		if firstline == lastline:
+			offset = record.offset+firstline*record.linewidth+start-firstline*record.linebases
+			return self.data[offset:offset+end-start]
+		full = self.data[record.offset+firstline*record.linewidth:]
+		full = numpy.lib.stride_tricks.as_strided(full, shape=(lastline-firstline, record.linebases), strides=(record.linewidth, 1))
+		tail = record.offset+lastline*record.linewidth
+		return numpy.concatenate([full.ravel()[start-firstline*record.linebases:], self.data[tail:tail+end-lastline*record.linebases]])
+
+	def close(self):
+		"""Release the memory map and the file."""
+		self.data = None
+		if self.mm is not None:
+			self.mm.close()
+		self.handle.close()
+
+##  Build the index of every file given on the command line:
+if __name__ == '__main__':
+	for inputfile in sys.argv[1:]:
+		records = build_index(inputfile)
+		write_index(inputfile, records)
+		print('Indexed', len(records), 'records of', inputfile, 'in', index_path(inputfile))
@@ -0,0 +1,171 @@
+#!/usr/bin/python
+
+##  Prefix-sum GC index for fast GC queries of arbitrary regions.
+##  Usage:
+##    >>> python isochore_gcindex.py build filename.fasta [--stride 1000]
+##    >>> python isochore_gcindex.py query filename.fasta contig:start-end [contig2:start-end ...] [--bed regions.bed]
+##  build counts every contig once and saves its cumulative GC and AT counts, sampled every --stride bases, to filename.fasta.gc.npz. Ambiguous or missing bases are the remainder.
+##  query answers each region in constant time: whole strides come from the saved counts, and only the at most 2*stride bases at the two ends are read from the memory-mapped FASTA. The index is built (or rebuilt, if the FASTA file is newer) when a query needs it.
+##  Regions on the command line use samtools coordinates (1-based, inclusive, e.g. chr1:1001-2000; a bare contig name means the whole contig); regions in a BED file use BED coordinates (0-based, end exclusive). Contigs are named by the first word of their header, as in the .fai index.
+##  Every region is written as one tab-separated line to standard output (or to --output):
+##    contig << contig name
+##    start << 0-based start of the region
+##    end << end of the region, exclusive
+##    gc_percent << GC/(AT+GC)*100, or NA if the region has no unambiguous bases
+##    missing_fraction << fraction of the region that is ambiguous or missing
+##  The index needs an uncompressed FASTA file that can be indexed (see isochore_fasta.py); deinterleave.py converts other files.
+##  From Python, GcIndex(filename).query(contig, start, end) returns the GC percentage and missing fraction of a 0-based, end-exclusive region.
+
+##  Setup environment:
+from  __future__ import print_function
+import sys, os, argparse, numpy
+import isochore_counts, isochore_fasta
+
+STRIDE = 1000
+CHUNKSIZE = 64*1024**2	##bases counted at a time when building an index
+
+def gcindex_path(path):
+	"""Path of the prefix-sum GC index of a FASTA file."""
+	return path+'.gc.npz'
+
+def _cumulative(reader, record, stride):
+	"""Cumulative GC and AT counts of a record, one entry per stride with a leading zero."""
+	chunksize = max(CHUNKSIZE//stride, 1)*stride
+	nstrides = record.length//stride
+	gc, at = [], []
+	for start in range(0, nstrides*stride, chunksize):
+		counts = isochore_counts.window_counts(reader.region(record, start, min(start+chunksize, nstrides*stride)), stride)
+		gc.append(counts[0])
+		at.append(counts[1])
+	empty = numpy.zeros(0, dtype=numpy.int64)
+	return isochore_counts.cumulative_counts(numpy.concatenate(gc or [empty]), numpy.concatenate(at or [empty]))
+
+def build_gcindex(path, stride=STRIDE):
+	"""Count every contig of a FASTA file and save its cumulative counts, sampled every stride bases, next to the file."""
+	if stride < 1:
+		raise ValueError('The stride must be a positive number of bases.')
+	reader = isochore_fasta.FastaMmap(path)
+	try:
+		cum_gc, cum_at = [], []
+		for record in reader.index:
+			counts = _cumulative(reader, record, stride)
+			cum_gc.append(counts[0])
+			cum_at.append(counts[1])
+	finally:
+		reader.close()
+	offsets = numpy.cumsum([0]+[len(counts) for counts in cum_gc]).astype(numpy.int64)
+	lengths = numpy.array([record.length for record in reader.index], dtype=numpy.int64)
+	dtype = numpy.uint32 if lengths.size == 0 or lengths.max() < 2**32 else numpy.int64	##halves the index size of all but the largest contigs
+	empty = numpy.zeros(0, dtype=dtype)
+	with open(gcindex_path(path), 'wb') as handle:
+		numpy.savez(handle, stride=numpy.int64(stride), names=numpy.array([record.name for record in reader.index], dtype=str), lengths=lengths, offsets=offsets,
+			gc=numpy.concatenate(cum_gc).astype(dtype) if cum_gc else empty, at=numpy.concatenate(cum_at).astype(dtype) if cum_at else empty)
+
+class GcIndex(object):
+	"""Prefix-sum GC index of a FASTA file, answering GC queries of any region in constant time."""
+	def __init__(self, path, stride=STRIDE):
+		self.path = path
+		saved = gcindex_path(path)
+		if not os.path.exists(saved) or os.path.getmtime(saved) < os.path.getmtime(path):
+			build_gcindex(path, stride)
+		with numpy.load(saved) as data:
+			self.stride = int(data['stride'])
+			self.names = [isochore_fasta._text(name) for name in data['names'].tolist()]
+			self.lengths, self.offsets = data['lengths'], data['offsets']
+			self.gc, self.at = data['gc'].astype(numpy.int64), data['at'].astype(numpy.int64)
+		self.contigs = dict((name, number) for number, name in enumerate(self.names))
+		self.reader = isochore_fasta.FastaMmap(path)
+		self.records = dict((record.name, record) for record in self.reader.index)
+
+	def _direct(self, record, start, end):
+		"""GC and AT counts of a short region, counted from the FASTA file."""
+		if start >= end:
+			return 0, 0
+		codes = isochore_counts.class_codes(self.reader.region(record, start, end))
+		counts = numpy.bincount(codes, minlength=3)
+		return int(counts[isochore_counts.GC]), int(counts[isochore_counts.AT])
+
+	def bounds(self, contig, start=0, end=None):
+		"""Clip a 0-based, end-exclusive region to the contig, where end=None means the end of the contig."""
+		if contig not in self.contigs:
+			raise KeyError('Contig '+contig+' is not in '+self.path+'.')
+		length = int(self.lengths[self.contigs[contig]])
+		end = length if end is None else min(end, length)
+		return min(max(start, 0), end), end
+
+	def counts(self, contig, start=0, end=None):
+		"""Return the GC, AT and ambiguous base counts of bases start to end (0-based, end exclusive) of a contig."""
+		start, end = self.bounds(contig, start, end)
+		number = self.contigs[contig]
+		if start >= end:
+			return 0, 0, 0
+		record = self.records[contig]
+		first, last = -(-start//self.stride), end//self.stride
+		if first >= last:
+			gc, at = self._direct(record, start, end)
+		else:
+			offset = int(self.offsets[number])
+			head, tail = self._direct(record, start, first*self.stride), self._direct(record, last*self.stride, end)
+			gc = int(self.gc[offset+last]-self.gc[offset+first])+head[0]+tail[0]
+			at = int(self.at[offset+last]-self.at[offset+first])+head[1]+tail[1]
+		return gc, at, end-start-gc-at
+
+	def query(self, contig, start=0, end=None):
+		"""Return the GC percentage (None without unambiguous bases) and the missing fraction of bases start to end (0-based, end exclusive) of a contig."""
+		gc, at, ambiguous = self.counts(contig, start, end)
+		gc_percent = gc/float(gc+at)*100 if gc+at else None
+		return gc_percent, ambiguous/float(gc+at+ambiguous) if gc+at+ambiguous else 0.0
+
+	def close(self):
+		"""Release the memory-mapped FASTA file."""
+		self.reader.close()
+
+def parse_region(text):
+	"""Convert a samtools region (contig, contig:start or contig:start-end, 1-based and inclusive) to a 0-based, end-exclusive (contig, start, end) tuple."""
+	contig, colon, span = text.rpartition(':')
+	if not colon:
+		return text, 0, None
+	try:
+		first, dash, last = span.replace(',', '').partition('-')
+		return contig, int(first)-1, int(last) if dash and last else None
+	except ValueError:
+		return text, 0, None
+
+def read_bed(path):
+	"""Yield (contig, start, end) tuples from the first three columns of a BED file, skipping header lines."""
+	with open(path, 'r') as handle:
+		for line in handle:
+			fields = line.split()
+			if len(fields) < 3 or fields[0] in ('track', 'browser') or fields[0].startswith('#'):
+				continue
+			yield fields[0], int(fields[1]), int(fields[2])
+
+##  Build an index or answer queries from the command line:
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Build a prefix-sum GC index of a FASTA file and query the GC content of regions.')
+	parser.add_argument('command', choices=['build', 'query'], help='build the index, or query regions')
+	parser.add_argument('inputfile', help='uncompressed fasta-formatted file')
+	parser.add_argument('regions', nargs='*', help='regions to query as contig:start-end (1-based, inclusive)')
+	parser.add_argument('--stride', type=int, default=STRIDE, help='bases between saved cumulative counts (default {})'.format(STRIDE))
+	parser.add_argument('--bed', default=None, help='BED file of regions to query')
+	parser.add_argument('--output', default=None, help='file to write the query results to (default: standard output)')
+	args = parser.parse_args()
+	try:
+		if args.command == 'build':
+			build_gcindex(args.inputfile, args.stride)
+			print('Indexed the GC content of', args.inputfile, 'every', args.stride, 'bases in', gcindex_path(args.inputfile))
+			sys.exit(0)
+		gcindex = GcIndex(args.inputfile, args.stride)
+		regions = [parse_region(region) for region in args.regions]
+		if args.bed:
+			regions = regions+list(read_bed(args.bed))
+		output = open(args.output, 'w') if args.output else sys.stdout
+		for contig, start, end in regions:
+			start, end = gcindex.bounds(contig, start, end)
+			gc_percent, missing = gcindex.query(contig, start, end)
+			output.write('{}\t{}\t{}\t{}\t{}\n'.format(contig, start, end, 'NA' if gc_percent is None else gc_percent, missing))
+		if args.output:
+			output.close()
+		gcindex.close()
+	except (KeyError, ValueError) as error:
+		sys.exit(str(error).strip("'"))
@@ -0,0 +1,126 @@
+#!/usr/bin/python
+
+##  Optional per-window sequence metrics for isochore_analyzer1.831.py, computed in the same pass as the GC content.
+##  Usage:
+##    >>> python isochore_analyzer1.831.py filename.fasta organism group 5000 --metrics skew,cpg,ambiguous
+##  Every metric adds columns to the end of each line of gc_content_*.tsv (after the window coordinates of --step), and to the binary output of --format binary, in the order of METRICS:
+##    bases << A, C, G, T: the count of each base in the window (case-insensitive)
+##    dinucleotides << AA, AC, ..., TT: the count of each of the 16 dinucleotides, counted in the window of their second base
+##    skew << gc_skew = (G-C)/(G+C) and at_skew = (A-T)/(A+T)
+##    cpg << CpG, the count of CG dinucleotides, and CpG_oe = CpG*(A+C+G+T)/(C*G), the observed/expected CpG ratio over the unambiguous bases of the window
+##    ambiguous << ambiguous_fraction, the fraction of the window that is not A, C, G or T (so the IUPAC codes S and W, which the GC content counts, are ambiguous here)
+##  Ratios without a denominator are NA. The metrics are only computed for the windows that have their GC content analyzed, and the lines of the two unused TSV files are unchanged.
+##  Each metric lists the counts it needs (single bases, or dinucleotides as two letters), and only those are counted: every contig is counted in the same blocks as the GC content, one vectorized comparison per count, and the windows of every window size (and step) are differences of the cumulative block counts. Without --metrics nothing more is counted. A new metric is a function of the window counts added to METRICS with the counts it needs.
+
+##  Setup environment:
+from  __future__ import print_function
+import numpy
+import isochore_counts
+from collections import OrderedDict
+
+BASES = 'ACGT'
+PAIRS = [first+second for first in BASES for second in BASES]
+NONE = len(BASES)	##code of every other character, and of the base before the start of a contig
+BASE_CODES = numpy.full(256, NONE, dtype=numpy.uint8)
+for code, base in enumerate(BASES):
+	BASE_CODES[ord(base)] = code
+	BASE_CODES[ord(base.lower())] = code
+
+def base_codes(seq):
+	"""Map every base of seq, given as text, bytes or a uint8 array, to its index in BASES, or NONE."""
+	if isinstance(seq, numpy.ndarray):
+		return BASE_CODES[seq]
+	return BASE_CODES[numpy.frombuffer(isochore_counts.as_bytes(seq), dtype=numpy.uint8)]
+
+def block_counts(seq, blocksize, columns, previous=b''):
+	"""Count the given bases and dinucleotides in every complete block of blocksize bases of seq (text, bytes or a uint8 array).
+	previous is the base before seq (empty at the start of a contig), so a dinucleotide is counted in the block of its second base wherever the contig was split. Returns an int64 array with a row per block and a column per count."""
+	codes = base_codes(seq)
+	nblocks = len(codes)//blocksize
+	codes = codes[:nblocks*blocksize]
+	counts = numpy.zeros((nblocks, len(columns)), dtype=numpy.int64)
+	blocks = codes.reshape(nblocks, blocksize)
+	if any(len(column) == 2 for column in columns):
+		before = base_codes(previous)
+		pairs = numpy.empty(len(codes), dtype=numpy.uint8)
+		pairs[0:1] = before[-1:]*(NONE+1) if len(before) else NONE*(NONE+1)
+		pairs[1:] = codes[:-1]*(NONE+1)
+		pairs = (pairs+codes).reshape(nblocks, blocksize)
+	for i, column in enumerate(columns):
+		if len(column) == 1:
+			counts[:, i] = (blocks == BASES.index(column)).sum(axis=1, dtype=numpy.int64)
+		else:
+			counts[:, i] = (pairs == BASES.index(column[0])*(NONE+1)+BASES.index(column[1])).sum(axis=1, dtype=numpy.int64)
+	return counts
+
+def _ratio(numerator, denominator):
+	"""numerator/denominator as floats, NaN where the denominator is 0."""
+	with numpy.errstate(divide='ignore', invalid='ignore'):
+		return numpy.where(denominator != 0, numerator/numpy.asarray(denominator, dtype=numpy.float64), numpy.nan)
+
+def bases(counts, windowsize):
+	"""Columns A, C, G and T: the count of each base in the window."""
+	return [(base, counts[base]) for base in BASES]
+
+def dinucleotides(counts, windowsize):
+	"""Columns AA to TT: the count of each dinucleotide whose second base is in the window."""
+	return [(pair, counts[pair]) for pair in PAIRS]
+
+def skew(counts, windowsize):
+	"""Columns gc_skew, (G-C)/(G+C), and at_skew, (A-T)/(A+T); NaN where the window has no G or C (no A or T)."""
+	return [('gc_skew', _ratio(counts['G']-counts['C'], counts['G']+counts['C'])), ('at_skew', _ratio(counts['A']-counts['T'], counts['A']+counts['T']))]
+
+def cpg(counts, windowsize):
+	"""Columns CpG, the count of CG, and CpG_oe, CpG*(A+C+G+T)/(C*G), which uses the unambiguous length of the window rather than its size; NaN where the window has no C or no G."""
+	unambiguous = counts['A']+counts['C']+counts['G']+counts['T']
+	return [('CpG', counts['CG']), ('CpG_oe', _ratio(counts['CG']*unambiguous, counts['C']*counts['G']))]
+
+def ambiguous(counts, windowsize):
+	"""Column ambiguous_fraction: the fraction of the window that is not A, C, G or T, never NaN as windowsize is never 0."""
+	return [('ambiguous_fraction', (windowsize-counts['A']-counts['C']-counts['G']-counts['T'])/float(windowsize))]
+
+METRICS = OrderedDict([
+	('bases', (list(BASES), bases)),
+	('dinucleotides', (PAIRS, dinucleotides)),
+	('skew', (list(BASES), skew)),
+	('cpg', (list(BASES)+['CG'], cpg)),
+	('ambiguous', (list(BASES), ambiguous)),
+])	##metric: (counts it needs, function of the window counts and window size returning its columns)
+
+def parse_metrics(text):
+	"""Return the metrics named in a comma-separated list ('all' for every metric), in the order of METRICS. Raises ValueError for unknown names."""
+	names = [name.strip() for name in text.split(',') if name.strip()]
+	if 'all' in names:
+		return list(METRICS)
+	unknown = [name for name in names if name not in METRICS]
+	if unknown:
+		raise ValueError('unknown metrics: '+', '.join(unknown)+'. Choose from '+', '.join(METRICS)+' or all.')
+	return [name for name in METRICS if name in names]
+
+def needed_counts(metrics):
+	"""Return the counts the metrics need, each once."""
+	columns = []
+	for metric in metrics:
+		columns.extend(column for column in METRICS[metric][0] if column not in columns)
+	return columns
+
+def column_types(metrics):
+	"""Return (name, NumPy type) of the output columns of the metrics, in order: '<i8' for counts and '<f8' for ratios."""
+	empty = numpy.zeros(0, dtype=numpy.int64)
+	counts = dict((column, empty) for column in needed_counts(metrics))
+	return [(name, values.dtype.newbyteorder('<').str) for metric in metrics for name, values in METRICS[metric][1](counts, 1)]
+
+def window_metrics(metrics, columns, counts, windowsize):
+	"""Return (name, values) of every output column of the metrics, from the counts of the windows (a row per window and a column per entry of columns)."""
+	counts = dict((column, counts[:, i]) for i, column in enumerate(columns))
+	return [column for metric in metrics for column in METRICS[metric][1](counts, windowsize)]
+
+def text_columns(values):
+	"""Format the values of each column for the TSV output: integers as they are, floats as Python writes them and NaN as NA."""
+	formatted = []
+	for name, column in values:
+		if column.dtype.kind == 'f':
+			formatted.append(['NA' if value != value else "{}".format(value) for value in column.tolist()])
+		else:
+			formatted.append([str(value) for value in column.tolist()])
+	return formatted
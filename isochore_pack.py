@@ -0,0 +1,168 @@
+#!/usr/bin/python
+
+##  Compact 4-bit packed genome store for the isochore scripts.
+##  Usage:
+##    >>> python isochore_pack.py filename.fasta [filename2.fna.gz ...]
+##  Packs every record of each FASTA file (plain, gzip or bgzip; interleaved or not) into filename.fasta.isopack, which isochore_analyzer1.831.py accepts in place of the FASTA file.
+##  Every base is stored in 4 bits, two bases per byte, as one of the 16 codes of ALPHABET. Case is folded, line breaks and other whitespace are dropped, and characters outside the alphabet (including the IUPAC code V) are stored as N, so every base keeps the class the analyzer counts it as (AT, GC or ambiguous).
+##  The file starts with a 24-byte header (MAGIC, then the byte offset and the length of the contig table as little-endian 64-bit integers), followed by the packed bases of every contig, each starting on a new byte, and ends with the contig table as JSON: one [full header line, number of bases, byte offset] per contig, in file order.
+##  PackedGenome memory-maps a store and returns regions of contigs as uint8 arrays of ASCII bases, unpacked with a 256-entry table of base pairs. Its window_counts counts windows of an even number of bases straight from the packed bytes with 256-entry tables of their GC and AT bases, reading half as many bytes as a FASTA file.
+
+##  Setup environment:
+from  __future__ import print_function
+import sys, os, mmap, json, struct, collections, numpy
+import isochore_counts, isochore_fasta
+
+MAGIC = b'ISOPACK1'
+HEADER = struct.Struct('<8sQQ')	##magic, offset of the contig table, length of the contig table
+ALPHABET = b'ACGTWSRYKMBDHN-?'	##the base of every 4-bit code
+CHUNKSIZE = 64*1024**2	##bytes of FASTA read at a time when packing
+SKIP = 255	##code of whitespace, which is dropped
+CODE_TABLE = numpy.full(256, ALPHABET.index(b'N'), dtype=numpy.uint8)
+for code, base in enumerate(bytearray(ALPHABET)):
+	CODE_TABLE[base] = code
+	CODE_TABLE[ord(chr(base).lower())] = code
+for base in bytearray(b' \t\r\n\x0b\x0c'):
+	CODE_TABLE[base] = SKIP
+PAIR_TABLE = numpy.array([[byte >> 4, byte & 15] for byte in range(256)], dtype=numpy.uint8)	##the two codes of every packed byte
+PAIR_TABLE = numpy.frombuffer(ALPHABET, dtype=numpy.uint8)[PAIR_TABLE]	##the two bases of every packed byte
+PAIR_CLASSES = isochore_counts.CLASS_TABLE[PAIR_TABLE]
+PAIR_GC = (PAIR_CLASSES == isochore_counts.GC).sum(axis=1).astype(numpy.uint8)	##GC bases in every packed byte
+PAIR_AT = (PAIR_CLASSES == isochore_counts.AT).sum(axis=1).astype(numpy.uint8)	##AT bases in every packed byte
+
+PackRecord = collections.namedtuple('PackRecord', ['name', 'length', 'offset', 'header'])
+
+def pack_path(path):
+	"""Path of the packed store of a FASTA file."""
+	if path.endswith('.gz'):
+		path = path[:-3]
+	return path+'.isopack'
+
+def is_packed(path):
+	"""True if path is a packed genome store."""
+	with open(path, 'rb') as handle:
+		return handle.read(len(MAGIC)) == MAGIC
+
+class _Packer(object):
+	"""Pack the bases of the contigs of one FASTA file into an open store, keeping the odd base of a piece until the next one."""
+	def __init__(self, outfile):
+		self.outfile, self.table = outfile, []
+		self.header, self.length, self.pending = None, 0, None
+
+	def start(self, header):
+		"""Finish the current contig and start a new one."""
+		self.finish()
+		self.header, self.length = header, 0
+		self.table.append([header, 0, self.outfile.tell()])
+
+	def add(self, text):
+		"""Pack a piece of sequence text of the current contig."""
+		if self.header is None or not text:
+			return
+		codes = CODE_TABLE[numpy.frombuffer(text, dtype=numpy.uint8)]
+		codes = codes[codes != SKIP]
+		if self.pending is not None:
+			codes = numpy.concatenate([self.pending, codes])
+		self.length = self.length+len(codes)-(0 if self.pending is None else 1)
+		even = len(codes)//2*2
+		self.pending = codes[even:] if even < len(codes) else None
+		self.outfile.write(((codes[0:even:2] << 4) | codes[1:even:2]).tobytes())
+
+	def finish(self):
+		"""Write the last odd base of the current contig and record its length."""
+		if self.header is None:
+			return
+		if self.pending is not None:
+			self.outfile.write(bytearray([int(self.pending[0]) << 4]))
+			self.pending = None
+		self.table[-1][1] = self.length
+		self.header = None
+
+def pack(path, outpath=None, chunksize=CHUNKSIZE):
+	"""Pack a FASTA file into a store. Returns the path of the store and the number of contigs."""
+	outpath = outpath or pack_path(path)
+	temporary = outpath+'.'+str(os.getpid())+'.tmp'
+	with isochore_fasta.open_fasta(path) as infile:
+		with open(temporary, 'wb') as outfile:
+			outfile.write(HEADER.pack(MAGIC, 0, 0))
+			packer, buf, at_line_start = _Packer(outfile), b'', True
+			while True:
+				chunk = infile.read(chunksize)
+				buf, pos = buf+chunk, 0
+				while pos < len(buf):
+					if at_line_start and buf[pos:pos+1] == b'>':
+						newline = buf.find(b'\n', pos)
+						if newline < 0 and chunk:
+							break	##the header line continues in the next chunk
+						newline = len(buf) if newline < 0 else newline
+						packer.start(isochore_fasta._text(buf[pos+1:newline]).strip())
+						pos = newline+1
+						continue
+					nextheader = buf.find(b'\n>', pos)
+					end = len(buf) if nextheader < 0 else nextheader+1
+					packer.add(buf[pos:end])
+					at_line_start, pos = buf[end-1:end] == b'\n', end
+				buf = buf[pos:]
+				if not chunk:
+					break
+			packer.finish()
+			table = json.dumps(packer.table).encode('utf-8')
+			tableoffset = outfile.tell()
+			outfile.write(table)
+			outfile.seek(0)
+			outfile.write(HEADER.pack(MAGIC, tableoffset, len(table)))
+	os.rename(temporary, outpath)
+	return outpath, len(packer.table)
+
+class PackedGenome(object):
+	"""Memory-mapped packed genome store, with the same header and region methods as isochore_fasta.FastaMmap."""
+	def __init__(self, path, index=None):
+		self.path = path
+		self.handle = open(path, 'rb')
+		self.mm = mmap.mmap(self.handle.fileno(), 0, access=mmap.ACCESS_READ)
+		magic, tableoffset, tablelength = HEADER.unpack(self.mm[0:HEADER.size])
+		if magic != MAGIC:
+			raise ValueError('File '+path+' is not a packed genome store.')
+		self.data = numpy.frombuffer(self.mm, dtype=numpy.uint8)
+		if index is None:
+			table = json.loads(self.mm[tableoffset:tableoffset+tablelength].decode('utf-8'))
+			index = [PackRecord((header.split() or [''])[0], length, offset, header) for header, length, offset in table]
+		self.index = index
+
+	def header(self, record):
+		"""Return the full header line of a contig, without the leading '>'."""
+		return record.header
+
+	def region(self, record, start=0, end=None):
+		"""Return bases start to end (0-based, end exclusive) of a contig as a uint8 array of ASCII bases."""
+		if end is None or end > record.length:
+			end = record.length
+		if start >= end:
+			return numpy.zeros(0, dtype=numpy.uint8)
+		packed = self.data[record.offset+start//2:record.offset+(end+1)//2]
+		return PAIR_TABLE[packed].ravel()[start % 2:start % 2+end-start]
+
+	def window_counts(self, record, start, end, windowsize):
+		"""Count the GC and AT bases of every complete window of bases start to end of a contig, as isochore_counts.window_counts counts a region.
+		When start and windowsize are even, whole packed bytes are counted with tables of their GC and AT bases, without unpacking them."""
+		if start % 2 or windowsize % 2:
+			return isochore_counts.window_counts(self.region(record, start, end), windowsize)
+		end = record.length if end is None else min(end, record.length)
+		nwindows = max(end-start, 0)//windowsize
+		first = record.offset+start//2
+		packed = self.data[first:first+nwindows*windowsize//2].reshape(nwindows, windowsize//2)
+		return PAIR_GC[packed].sum(axis=1, dtype=numpy.int64), PAIR_AT[packed].sum(axis=1, dtype=numpy.int64)
+
+	def close(self):
+		"""Release the memory map and the file."""
+		self.data = None
+		self.mm.close()
+		self.handle.close()
+
+##  Pack every file given on the command line:
+if __name__ == '__main__':
+	if len(sys.argv) < 2:
+		sys.exit('Usage: python isochore_pack.py filename.fasta [filename2.fasta ...]')
+	for inputfile in sys.argv[1:]:
+		outpath, ncontigs = pack(inputfile)
+		print('Packed', ncontigs, 'contigs of', inputfile, 'into', outpath, '('+str(os.path.getsize(outpath))+' bytes)')
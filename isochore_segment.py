@@ -0,0 +1,121 @@
+#!/usr/bin/python
+
+##  Segmentation of contigs into GC domains (isochores) from their cumulative GC and AT counts.
+##  Usage:
+##    >>> python isochore_analyzer1.831.py filename.fasta organism group 5000 --segment 1000 [--min-domain 300000] [--domain-pvalue 0.05]
+##    >>> python isochore_segment.py filename.fasta [--unit 1000] [--min-domain 300000] [--domain-pvalue 0.05] [--output domains.bed]
+##  A contig is cut into units of --unit (or --segment) bases, and units with at least isochore_counts.MISSING_THRESHOLD ambiguous or missing bases are left out of the tests. Domains are found by binary segmentation, as IsoFinder does:
+##    split << every cut point of a domain that leaves at least --min-domain bases on both sides is scored with Student's t statistic of the difference between the mean GC fractions of the units on its two sides, and the best cut point is kept
+##    significance << the cut is made when the t statistic exceeds the two-sided normal quantile of --domain-pvalue divided by the number of cut points tried (a Bonferroni correction, since the best of many cut points is tested). The normal quantile stands in for the t distribution, so domains are expected to span more than about 30 units.
+##    recursion << both halves are segmented the same way, until no cut is significant
+##  The means and variances of both sides of every cut point come from cumulative sums of the unit GC fractions and their squares, so each cut point is scored in O(1) and a domain of n units in O(n) NumPy operations; a genome is segmented in O(units) for every level of the recursion.
+##  Every domain is one tab-separated line of a BED-style file, as isochore_gcindex.py reports regions:
+##    contig << contig key, as in the analyzer's output (the header with spaces replaced by underscores) or, for this script, the first word of the header
+##    start << 0-based start of the domain
+##    end << end of the domain, exclusive. Domains cover whole units, so the last partial unit of a contig is in no domain.
+##    gc_percent << GC/(AT+GC)*100 of all bases of the domain, or NA without unambiguous bases
+##    missing_fraction << fraction of the domain that is ambiguous or missing
+##  The analyzer segments every contig as it counts it and writes domains_<organism>_<time since epoch>.bed next to the run folders. This script segments the contigs of a FASTA file from its prefix-sum GC index (see isochore_gcindex.py), building it with a stride of --unit bases if there is none.
+
+##  Setup environment:
+from  __future__ import print_function
+import sys, math, argparse, numpy
+import isochore_counts, isochore_gcindex
+
+UNIT = 1000	##bases per unit
+MIN_DOMAIN = 300000	##shortest domain in bases; isochores are defined as at least 300 kb long
+PVALUE = 0.05	##significance of a cut, before the correction for the cut points tried
+
+##  Functions:
+def normal_quantile(p):
+	"""Return z such that a standard normal variable exceeds z with probability p, by bisection of the complementary error function."""
+	low, high = 0.0, 40.0
+	for i in range(100):
+		middle = (low+high)/2
+		if 0.5*math.erfc(middle/math.sqrt(2)) > p:
+			low = middle
+		else:
+			high = middle
+	return high
+
+def unit_sums(cum_gc, cum_at, unit, blocksize):
+	"""Return the cumulative numbers of usable units, and the cumulative sums of their GC fractions and squared GC fractions, each with a leading zero, from the cumulative block counts of a contig."""
+	gc, at = isochore_counts.windows_from_cumulative(cum_gc, cum_at, unit//blocksize)
+	valid = gc+at
+	usable = (unit-valid)/float(unit) < isochore_counts.MISSING_THRESHOLD
+	fraction = numpy.where(usable, gc/numpy.maximum(valid, 1).astype(numpy.float64), 0.0)
+	sums = numpy.zeros((3, len(gc)+1))
+	numpy.cumsum(usable, out=sums[0, 1:])
+	numpy.cumsum(fraction, out=sums[1, 1:])
+	numpy.cumsum(fraction*fraction, out=sums[2, 1:])
+	return sums
+
+def best_cut(sums, start, end, min_units):
+	"""Return the cut point (in units) of units start to end with the largest t statistic, the statistic and the number of cut points tried."""
+	cuts = numpy.arange(start+min_units, end-min_units+1)
+	if not len(cuts):
+		return None, 0.0, 0
+	left = sums[:, cuts]-sums[:, start:start+1]
+	right = sums[:, end:end+1]-sums[:, cuts]
+	with numpy.errstate(divide='ignore', invalid='ignore'):
+		squares = left[2]-left[1]*left[1]/left[0]+right[2]-right[1]*right[1]/right[0]
+		variance = squares/(left[0]+right[0]-2)*(1/left[0]+1/right[0])
+		t = numpy.abs(left[1]/left[0]-right[1]/right[0])/numpy.sqrt(variance)
+	t[(left[0] < 2) | (right[0] < 2) | numpy.isnan(t)] = 0.0	##a side needs two usable units for a variance
+	best = int(t.argmax())
+	return int(cuts[best]), float(t[best]), len(cuts)
+
+def segment(cum_gc, cum_at, unit, blocksize, min_domain=MIN_DOMAIN, pvalue=PVALUE):
+	"""Return the domains of a contig as (start, end) in bases, found by binary segmentation of its units. Every complete unit of the contig is in exactly one domain."""
+	sums = unit_sums(cum_gc, cum_at, unit, blocksize)
+	nunits, min_units = sums.shape[1]-1, max(-(-min_domain//unit), 1)
+	if not nunits:
+		return []
+	domains, pending = [], [(0, nunits)]
+	while pending:
+		start, end = pending.pop()
+		cut, t, tried = best_cut(sums, start, end, min_units)
+		if cut is not None and t > normal_quantile(pvalue/(2.0*tried)):
+			pending.extend([(cut, end), (start, cut)])	##the left half is segmented first, so domains come out in order
+		else:
+			domains.append((start*unit, end*unit))
+	return domains
+
+def domain_lines(key, domains, cum_gc, cum_at, blocksize):
+	"""Return the BED-style lines of the domains of a contig, with their GC percentages and missing fractions from its cumulative block counts."""
+	lines = []
+	for start, end in domains:
+		gc = int(cum_gc[end//blocksize]-cum_gc[start//blocksize])
+		at = int(cum_at[end//blocksize]-cum_at[start//blocksize])
+		lines.append('{}\t{}\t{}\t{}\t{}\n'.format(key, start, end, gc/float(gc+at)*100 if gc+at else 'NA', (end-start-gc-at)/float(end-start)))
+	return lines
+
+##  Segment the contigs of a FASTA file from the command line:
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Segment the contigs of a FASTA file into GC domains (isochores) and write them as a BED-style file.')
+	parser.add_argument('inputfile', help='uncompressed fasta-formatted file')
+	parser.add_argument('--unit', type=int, default=UNIT, help='bases per unit tested (default {})'.format(UNIT))
+	parser.add_argument('--min-domain', type=int, default=MIN_DOMAIN, help='shortest domain in bases (default {})'.format(MIN_DOMAIN))
+	parser.add_argument('--domain-pvalue', type=float, default=PVALUE, help='significance of a cut before the correction for the cut points tried (default {})'.format(PVALUE))
+	parser.add_argument('--output', default=None, help='file to write the domains to (default: standard output)')
+	args = parser.parse_args()
+	if args.unit < 1 or args.min_domain < 1 or not 0 < args.domain_pvalue < 1:
+		sys.exit('Error: the unit and the shortest domain must be at least 1 base, and the p-value between 0 and 1.')
+	try:
+		gcindex = isochore_gcindex.GcIndex(args.inputfile, args.unit)
+	except ValueError as error:
+		sys.exit('Error: '+str(error))
+	if args.unit % gcindex.stride:
+		sys.exit('Error: the unit must be a multiple of the stride of the existing GC index ('+str(gcindex.stride)+' bases); rebuild it with isochore_gcindex.py build --stride.')
+	output = open(args.output, 'w') if args.output else sys.stdout
+	ndomains = 0
+	for number, name in enumerate(gcindex.names):
+		cum_gc = gcindex.gc[gcindex.offsets[number]:gcindex.offsets[number+1]]
+		cum_at = gcindex.at[gcindex.offsets[number]:gcindex.offsets[number+1]]
+		domains = segment(cum_gc, cum_at, args.unit, gcindex.stride, args.min_domain, args.domain_pvalue)
+		output.writelines(domain_lines(name, domains, cum_gc, cum_at, gcindex.stride))
+		ndomains = ndomains+len(domains)
+	if args.output:
+		output.close()
+		print('Wrote', ndomains, 'domains of', len(gcindex.names), 'contigs to', args.output)
+	gcindex.close()
@@ -0,0 +1,153 @@
+#!/usr/bin/python
+
+##  Streaming, mergeable summary statistics of window GC percentages for the isochore scripts.
+##  GcStats is updated with the GC percentages of each contig as they are analyzed, so the per-window values never have to be held or sorted:
+##    count, mean and standard deviation << Welford's online algorithm, in the batch form of Chan et al. so a whole batch of windows is added at once
+##    minimum and maximum << running extremes
+##    median and other percentiles << a histogram of BINS fixed bins from 0 to 100 percent that keeps the count, the sum, the lowest and the highest of the values in each bin. A value is the value of its bin when all the values of the bin are equal, and is otherwise estimated by the mean of its bin, rounded to 9 decimals (within 100/BINS percent), and percentiles interpolate between neighbouring values as numpy.percentile does (so the median of an even number of values is the mean of the middle two).
+##  update buffers the values of many contigs and adds them in batches of BUFFER values, binning them into the one histogram in place, so a contig costs no more than keeping its values. flush adds the buffered values; the methods that read the statistics call it, and count, mean, minimum and maximum are up to date once it has been called. Two GcStats can be merged exactly (merge_dict merges saved statistics without building a histogram for them), so the statistics of several runs or samples are the merged statistics of their runs. The analyzer saves them to stats_<organism>_<window size>_<time>.json in each run folder, and the summarizer pools them by window size.
+
+##  Setup environment:
+from  __future__ import print_function
+import json, math, numpy
+
+BINS = 100000	##histogram bins of 0.001 percent GC
+BUFFER = 65536	##values buffered by update before they are added to the statistics and the histogram
+
+def _with_range(entry):
+	"""Return a saved histogram entry as [bin, count, sum, lowest, highest], with the unknown range -inf to inf for entries saved without one."""
+	return entry if len(entry) == 5 else list(entry)+[-numpy.inf, numpy.inf]
+
+class GcStats(object):
+	"""Count, mean, variance, range and histogram of GC percentages, updated in batches and mergeable."""
+	def __init__(self, bins=BINS):
+		self.count, self.mean, self.m2 = 0, 0.0, 0.0
+		self.minimum, self.maximum = None, None
+		self.histogram = numpy.zeros(bins, dtype=numpy.int64)
+		self.sums = numpy.zeros(bins, dtype=numpy.float64)
+		self.lows, self.highs = numpy.full(bins, numpy.inf), numpy.full(bins, -numpy.inf)	##range of the values in each bin, unknown (-inf to inf) for bins loaded from statistics saved without it
+		self.pending, self.npending = [], 0	##values given to update and not yet added
+
+	def update(self, values):
+		"""Add a batch of GC percentages. They are buffered and added in batches of at least BUFFER values, so a contig with few windows costs an append."""
+		values = numpy.asarray(values, dtype=numpy.float64)
+		if values.size:
+			self.pending.append(values)
+			self.npending = self.npending+values.size
+			if self.npending >= BUFFER:
+				self.flush()
+
+	def flush(self):
+		"""Add the buffered values to the statistics and the histogram, in place. Everything that reads the statistics calls it first."""
+		if not self.pending:
+			return self
+		values = numpy.sort(numpy.concatenate(self.pending) if len(self.pending) > 1 else self.pending[0])	##sorted, so are their bins, and the range of each bin is at the ends of its run
+		self.pending, self.npending = [], 0
+		mean = float(values.mean())
+		self._combine(int(values.size), mean, float(((values-mean)**2).sum()), float(values.min()), float(values.max()))
+		bins = numpy.minimum((values*(len(self.histogram)/100.0)).astype(numpy.int64), len(self.histogram)-1)
+		self.histogram += numpy.bincount(bins, minlength=len(self.histogram))
+		self.sums += numpy.bincount(bins, weights=values, minlength=len(self.histogram))
+		starts = numpy.flatnonzero(numpy.diff(bins))+1
+		found, lows, highs = bins[numpy.append(0, starts)], values[numpy.append(0, starts)], values[numpy.append(starts-1, len(values)-1)]
+		self.lows[found] = numpy.minimum(self.lows[found], lows)
+		self.highs[found] = numpy.maximum(self.highs[found], highs)
+		return self
+
+	def _combine(self, count, mean, m2, minimum, maximum):
+		"""Add the count, mean, sum of squared deviations and range of other values, leaving the histogram to the caller."""
+		total = self.count+count
+		delta = mean-self.mean
+		self.mean = self.mean+delta*count/float(total)
+		self.m2 = self.m2+m2+delta*delta*self.count*count/float(total)
+		self.minimum = minimum if self.minimum is None else min(self.minimum, minimum)
+		self.maximum = maximum if self.maximum is None else max(self.maximum, maximum)
+		self.count = total
+
+	def merge(self, other):
+		"""Add the values summarized by another GcStats with the same number of bins, in place."""
+		self.flush()
+		other.flush()
+		if not other.count:
+			return self
+		if len(other.histogram) != len(self.histogram):
+			raise ValueError('Cannot merge statistics with '+str(len(other.histogram))+' and '+str(len(self.histogram))+' histogram bins.')
+		self._combine(other.count, other.mean, other.m2, other.minimum, other.maximum)
+		self.histogram += other.histogram
+		self.sums += other.sums
+		numpy.minimum(self.lows, other.lows, out=self.lows)
+		numpy.maximum(self.highs, other.highs, out=self.highs)
+		return self
+
+	def merge_dict(self, data):
+		"""Add statistics saved with to_dict, touching only their non-empty bins, so pooling many runs does not build a histogram for each."""
+		self.flush()
+		if not data['count']:
+			return self
+		if data['bins'] != len(self.histogram):
+			raise ValueError('Cannot merge statistics with '+str(data['bins'])+' and '+str(len(self.histogram))+' histogram bins.')
+		self._combine(data['count'], data['mean'], data['m2'], data['minimum'], data['maximum'])
+		if data['histogram']:
+			bins, counts, sums, lows, highs = zip(*(_with_range(entry) for entry in data['histogram']))
+			bins = numpy.array(bins, dtype=numpy.int64)
+			self.histogram[bins] += numpy.array(counts, dtype=numpy.int64)
+			self.sums[bins] += numpy.array(sums, dtype=numpy.float64)
+			self.lows[bins] = numpy.minimum(self.lows[bins], numpy.array(lows, dtype=numpy.float64))
+			self.highs[bins] = numpy.maximum(self.highs[bins], numpy.array(highs, dtype=numpy.float64))
+		return self
+
+	def sd(self):
+		"""Population standard deviation, as numpy.std computes it."""
+		self.flush()
+		return math.sqrt(self.m2/self.count) if self.count else 0.0
+
+	def _value(self, cumulative, rank):
+		"""Return the value of the given 0-based rank: the value of the bin that holds it if all its values are equal, and otherwise the mean of the bin, rounded to 9 decimals so that summing many copies of a value leaves no float noise."""
+		found = int(numpy.searchsorted(cumulative, rank+1, side='left'))
+		if self.lows[found] == self.highs[found]:
+			return float(self.lows[found])
+		return round(float(self.sums[found]/self.histogram[found]), 9)
+
+	def percentile(self, q):
+		"""Return the q-th percentile (0 to 100), interpolating linearly between the two values around it."""
+		self.flush()
+		if not self.count:
+			return 0.0
+		cumulative = numpy.cumsum(self.histogram)
+		position = (self.count-1)*q/100.0
+		lower = int(math.floor(position))
+		below, above = self._value(cumulative, lower), self._value(cumulative, min(lower+1, self.count-1))
+		return below+(position-lower)*(above-below)
+
+	def median(self):
+		"""The 50th percentile."""
+		return self.percentile(50)
+
+	def to_dict(self):
+		"""Return the statistics as a JSON-compatible dict, with the histogram stored as [bin, count, sum, lowest, highest] for its non-empty bins ([bin, count, sum] where the range is unknown)."""
+		self.flush()
+		nonzero = numpy.flatnonzero(self.histogram)
+		return {'count': self.count, 'mean': self.mean, 'm2': self.m2, 'minimum': self.minimum, 'maximum': self.maximum,
+			'bins': len(self.histogram), 'histogram': [[int(i), int(self.histogram[i]), float(self.sums[i])]+([float(self.lows[i]), float(self.highs[i])] if numpy.isfinite(self.lows[i]) else []) for i in nonzero]}
+
+	@classmethod
+	def from_dict(cls, data):
+		"""Rebuild statistics saved with to_dict."""
+		stats = cls(data['bins'])
+		stats.count, stats.mean, stats.m2 = data['count'], data['mean'], data['m2']
+		stats.minimum, stats.maximum = data['minimum'], data['maximum']
+		for entry in data['histogram']:
+			i, n, total, low, high = _with_range(entry)
+			stats.histogram[i], stats.sums[i], stats.lows[i], stats.highs[i] = n, total, low, high
+		return stats
+
+	def save(self, path):
+		"""Write the statistics to a JSON file."""
+		with open(path, 'w') as handle:
+			json.dump(self.to_dict(), handle)
+
+	@classmethod
+	def load(cls, path):
+		"""Read statistics written with save."""
+		with open(path, 'r') as handle:
+			return cls.from_dict(json.load(handle))
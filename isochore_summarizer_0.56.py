@@ -6,12 +6,16 @@
 ##  Version 0.56
 
 ##  Usage:
-##    >>> python isochore_summarizer.py [absolute path to folder containing output of isochore_analyzer.py]
-##  Iteratively reads the log files from the isochore_analyzer1.831.py script
-##  Script produces output for each of the following categories, separated by tabs. A header row with these variable names is created.
+##    >>> python isochore_summarizer.py [absolute path to folder containing output of isochore_analyzer.py] [--jobs 8] [--cache cachefile.json] [--no-cache] [--step 1000]
+##  Every run that was read is saved to a cache (.isochore_summarizer_cache.json in the input folder, or --cache) under the path of its log, with the modification time and size of its log, manifest and statistics files. Later summaries only read the runs that are new or whose files changed, using --jobs threads, so rerunning the script after adding a batch of genomes takes time in proportion to the new runs. The cache keeps the values of every run but not its statistics histogram: the pooled statistics are kept once per --step, under a checksum of the runs they pool, and the statistics files are only read again when a run was added, removed or changed. Runs of every step stay in the cache until their log is deleted, so summaries at different steps do not read each other's runs again. The cache is only rewritten when something changed. The output is the same with or without the cache; --no-cache reads every run and leaves the cache alone.
+##  Iteratively reads the run manifests (or, for older runs without one, the log files) from the isochore_analyzer1.831.py script
+##  The input folder is listed once, and every run folder (Run1.831_GC_output_<sample>_<window size>_<time since epoch>) is indexed by sample and window size. Every window size found on disk is summarized, and when a sample was run more than once at a window size, the newest run with a log file is used. Overlapping and non-overlapping windows are never summarized together: only runs made with the --step given (non-overlapping runs by default) are used, as recorded in their manifests; runs without a manifest are non-overlapping.
+##  Script produces output for each of the following categories, separated by tabs. A header row with these variable names is created. The ten columns ending in a window size are repeated for every window size found, from smallest to largest; with the standard six window sizes the columns are:
 ##  Sample	Class	fasta_number	fasta_recovered_percent_1000bp	fasta_ignored_missing_percent_1000bp	fasta_ignored_small_percent_1000bp	fasta_ignored_total_percent_1000bp	mean_1000bp	sd_1000bp	range_low_1000bp	range_high_1000bp	median_gc_1000bp	contigs_analyzed_1000bp	fasta_recovered_percent_3000bp	fasta_ignored_missing_percent_3000bp	fasta_ignored_small_percent_3000bp	fasta_ignored_total_percent_3000bp	mean_3000bp	sd_3000bp	range_low_3000bp	range_high_3000bp	median_gc_3000bp	contigs_analyzed_3000bp	fasta_recovered_percent_5000bp	fasta_ignored_missing_percent_5000bp	fasta_ignored_small_percent_5000bp	fasta_ignored_total_percent_5000bp	mean_5000bp	sd_5000bp	range_low_5000bp	range_high_5000bp	median_gc_5000bp	contigs_analyzed_5000bp	fasta_recovered_percent_20000bp	fasta_ignored_missing_percent_20000bp	fasta_ignored_small_percent_20000bp	fasta_ignored_total_percent_20000bp	mean_20000bp	sd_20000bp	range_low_20000bp	range_high_20000bp	median_gc_20000bp	contigs_analyzed_20000bp	fasta_recovered_percent_80000bp	fasta_ignored_missing_percent_80000bp	fasta_ignored_small_percent_80000bp	fasta_ignored_total_percent_80000bp	mean_80000bp	sd_80000bp	range_low_80000bp	range_high_80000bp	median_gc_80000bp	contigs_analyzed_80000bp	fasta_recovered_percent_320000bp	fasta_ignored_missing_percent_320000bp	fasta_ignored_small_percent_320000bp	fasta_ignored_total_percent_320000bp	mean_320000bp	sd_320000bp	range_low_320000bp	range_high_320000bp	median_gc_320000bp	contigs_analyzed_320000bp
 
 ##  Missing values will be recorded as NA; thus, values of 0.0 are real.
+##  A third file, isochore_pooled_stats_<Class>_<time>.tsv, pools the windows of all samples by window size. It merges the stats_*.json file of the newest run of every sample and window size (see isochore_stats.py, which must be kept in the same folder as this script), so no per-window data is read:
+##  Class	window_size	samples	windows_analyzed	mean_gc	sd_gc	range_low_gc	range_high_gc	percentile_5_gc	percentile_25_gc	median_gc	percentile_75_gc	percentile_95_gc
 ##  Output is placed in the current working directory.
 
 ##  Example file hierarchy:
@@ -60,17 +64,92 @@
 
 ##  Setup environment:
 from  __future__ import print_function
-from glob import glob
 from collections import OrderedDict
-import sys, re, os, time, datetime, errno, math, numpy
-inputpath_o, path = sys.argv[1], os.getcwd()
-d = {}
+import sys, re, os, time, datetime, json, hashlib, numpy, argparse, multiprocessing.pool
+import isochore_stats
+parser = argparse.ArgumentParser(description='Summarize the runs of isochore_analyzer1.831.py in a folder.')
+parser.add_argument('inputpath', help='absolute path to the folder containing the run folders')
+parser.add_argument('--jobs', type=int, default=8, help='number of threads reading runs that are not in the cache (default 8)')
+parser.add_argument('--cache', default=None, help='cache file of the runs read before (default: .isochore_summarizer_cache.json in the input folder)')
+parser.add_argument('--no-cache', action='store_true', help='read every run and neither use nor update the cache')
+parser.add_argument('--step', type=int, default=None, help='only summarize the runs of this --step of the analyzer (default: non-overlapping runs)')
+args = parser.parse_args()
+inputpath_o, path = args.inputpath, os.getcwd()
 inputpath = inputpath_o.rstrip('/')
 inputpath_split = inputpath.split('/')
 Class = inputpath_split[-1]
 
+RUN_FOLDER = re.compile('^Run.*?_GC_output_(.+)_(\\d+)_(\\d+)$')	##sample, window size and time since epoch of a run folder
+cpu_clock = getattr(time, 'process_time', None) or time.clock	##seconds of processor time; time.clock is gone from Python 3.8
+CACHE_NAME, CACHE_VERSION = '.isochore_summarizer_cache.json', 4	##default cache file in the input folder, and the version of its format
+COLUMNS = ['fasta_recovered_percent', 'fasta_ignored_missing_percent', 'fasta_ignored_small_percent', 'fasta_ignored_total_percent', 'mean', 'sd', 'range_low', 'range_high', 'median_gc', 'contigs_analyzed']	##columns of the regular output, repeated for every window size
+
+##  Functions:
+def list_folders(folder):
+	"""Return the names of the entries of a folder that are folders, listing it once. os.scandir (Python 3.5 and later) gets the entry types with the listing, without one stat call per entry."""
+	if hasattr(os, 'scandir'):
+		return [entry.name for entry in os.scandir(folder) if entry.is_dir()]
+	return [name for name in os.listdir(folder) if os.path.isdir(os.path.join(folder, name))]
+
+def file_signature(filepath):
+	"""Return [modification time, size] of a file, or None if there is no such file."""
+	try:
+		info = os.stat(filepath)
+	except OSError:
+		return None
+	return [info.st_mtime, info.st_size]
+
+def run_paths(folder, sample, window, epoch):
+	"""Return the paths of the log, manifest and statistics files of a run folder."""
+	name = sample+'_'+str(window)+'_'+str(epoch)
+	return [os.path.join(inputpath, folder, prefix+name+suffix) for prefix, suffix in (('log_', '.txt'), ('manifest_', '.json'), ('stats_', '.json'))]
+
+def parse_run(paths):
+	"""Read one run from its [log, manifest, statistics] paths, as its step and values."""
+	step, values = read_run(paths[0])
+	return {'step': step, 'values': list(values)}
+
+def load_cache(cachefile):
+	"""Return the runs saved in the cache by log path and the pooled statistics saved with them by step, or empty ones if there is no usable cache."""
+	try:
+		with open(cachefile, 'r') as f:
+			cache = json.load(f)
+	except (IOError, OSError, ValueError):
+		return {}, {}
+	if cache.get('version') != CACHE_VERSION:
+		return {}, {}
+	return cache.get('runs', {}), cache.get('pooled', {})
+
+def save_cache(cachefile, entries, pooled):
+	"""Save the runs by log path and the pooled statistics by step to the cache, replacing it at once so an interrupted write never leaves a broken cache."""
+	temporary = cachefile+'.'+str(os.getpid())+'.tmp'
+	try:
+		with open(temporary, 'w') as f:
+			json.dump({'version': CACHE_VERSION, 'runs': entries, 'pooled': pooled}, f)
+		os.rename(temporary, cachefile)
+	except (IOError, OSError):
+		print('Could not save the cache to', cachefile+'; every run will be read again next time.')
+
+def read_run(logfile):
+	"""Return the step of one run (None for non-overlapping windows), and its fasta number, the four percentages, the mean, SD, range, median and number of windows as strings.
+	They are read from the run's manifest (manifest_*.json, written next to the log by isochore_analyzer1.831.py) when there is one, and otherwise from the text of the log by line number, as older runs require; those are non-overlapping."""
+	folder, logname = os.path.split(logfile)
+	manifest_path = os.path.join(folder, re.sub('^log_', 'manifest_', re.sub('\.txt$', '.json', logname)))
+	if os.path.exists(manifest_path):
+		with open(manifest_path, 'r') as f:
+			run = json.load(f)
+		run['sd_gc'] = numpy.float64(run['sd_gc'])	##printed with the digits of the log, which writes the SD as numpy.std returns it
+		return run.get('step'), tuple(str(run[field]) for field in ('contigs', 'recovered_percent', 'missing_percent', 'short_percent', 'ignored_percent', 'mean_gc', 'sd_gc', 'range_low_gc', 'range_high_gc', 'median_gc', 'windows_analyzed'))
+	with open(logfile, 'r') as f:
+		content = [x.strip() for x in f.readlines()] #from http://stackoverflow.com/questions/3277503/how-to-read-a-file-line-by-line-into-a-list-with-python#comment41651423_3277516
+	if content[11].startswith("Warning"):  #Checks to see if there's a warning for having a lot of contigs not included which adds a line to the log file.
+		line6, line7, line8, line9, line11, line15, line16, line17, line18, line19 = content[5].split(), content[6].split(), content[7].split(), content[8].split(), content[10].split(), content[14].split(), content[15].split(), content[16].split(), content[17].split(), content[18].split()
+	else:
+		line6, line7, line8, line9, line11, line15, line16, line17, line18, line19 = content[5].split(), content[6].split(), content[7].split(), content[8].split(), content[10].split(), content[13].split(), content[14].split(), content[15].split(), content[16].split(), content[17].split()
+	return None, (line6[0], line7[7], line8[7], line9[7], line11[0], line15[3], line16[5], line17[4], line17[7], line18[3], line19[3])
+
 ##  Record the start time:
-starttime = time.clock()
+starttime = cpu_clock()
 timesinceepoch = int(time.time())
 now = datetime.datetime.now()
 print('\n======================================\n\nTime at the beginning of the script:', now)
@@ -78,211 +157,123 @@ print('\n======================================\n\nTime at the beginning of the
 if inputpath.startswith("./"):
 	sys.exit('Error: for stability, provide an absolute path to the data and not a relative path.')
 
-##Set up an output file and open it:
+##Index every run folder in one pass over the directory: Run<version>_GC_output_<sample>_<window size>_<time since epoch>
+runs = {}
+for entry in list_folders(inputpath):
+	match = RUN_FOLDER.match(entry)
+	if match:
+		sample, window, epoch = match.group(1), int(match.group(2)), int(match.group(3))
+		runs.setdefault(sample, {}).setdefault(window, []).append((epoch, entry))
+samples = sorted(runs)
+windows = sorted(set(window for sample in samples for window in runs[sample]))
+print('Found', sum(len(found) for sample in samples for found in runs[sample].values()), 'run folders of', len(samples), 'samples at window sizes:', ', '.join(str(window) for window in windows))
+
+#Choose the newest run of every sample and window size that has a log file and the step given (the step is read from its manifest, and runs without one are non-overlapping). Runs in the cache whose files have the same modification times and sizes are not read again; the others are read once by a pool of threads, in rounds until the newest run of the step is known for every sample and window size:
+cachefile = args.cache or os.path.join(inputpath, CACHE_NAME)
+cache, cached_pooled = ({}, {}) if args.no_cache else load_cache(cachefile)
+candidates = {}	##(sample, window size): (paths, signature) of every run with a log file, newest first
+for Sample in samples:
+	for window in runs[Sample]:
+		for epoch, folder in sorted(runs[Sample][window], reverse=True):
+			paths = run_paths(folder, Sample, window, epoch)
+			signature = [file_signature(filepath) for filepath in paths]
+			if signature[0] is not None:
+				candidates.setdefault((Sample, window), []).append((paths, signature))
+chosen, entries, stats_paths, nread, pending = {}, {}, {}, 0, sorted(candidates)
+while pending:
+	uncached, waiting = [], []
+	for key in pending:
+		for paths, signature in candidates[key]:
+			if paths[0] not in entries and paths[0] in cache and cache[paths[0]]['signature'] == signature:
+				entries[paths[0]] = cache[paths[0]]
+			if paths[0] not in entries:
+				uncached.append((paths, signature))
+				waiting.append(key)
+				break
+			if entries[paths[0]]['step'] == args.step:	##overlapping and non-overlapping windows are not summarized together
+				chosen[key] = paths[0]
+				if signature[2] is not None:
+					stats_paths[paths[0]] = paths[2]
+				break
+	if args.jobs > 1 and len(uncached) > 1:
+		pool = multiprocessing.pool.ThreadPool(min(args.jobs, len(uncached)))
+		parsed = pool.map(parse_run, [paths for paths, signature in uncached])
+		pool.close()
+		pool.join()
+	else:
+		parsed = [parse_run(paths) for paths, signature in uncached]
+	for (paths, signature), entry in zip(uncached, parsed):
+		entry['signature'] = signature
+		entries[paths[0]] = entry
+	nread, pending = nread+len(uncached), waiting
+print(len(entries)-nread, 'runs were found in the cache and', nread, 'runs were read.')
+windows = sorted(set(window for sample, window in chosen))
+print('Summarizing', 'non-overlapping runs' if args.step is None else 'overlapping runs of step '+str(args.step)+',', 'at window sizes:', ', '.join(str(window) for window in windows))
+
+##Set up the output files and open them, with one group of columns per window size found:
 outfile_path=path+'/'+'isochore_summary_'+Class+'_'+str(timesinceepoch)+'.tsv'
 outfile = open(outfile_path, 'a')
-outfile.write("Sample\tClass\tfasta_number\tfasta_recovered_percent_1000bp\tfasta_ignored_missing_percent_1000bp\tfasta_ignored_small_percent_1000bp\tfasta_ignored_total_percent_1000bp\tmean_1000bp\tsd_1000bp\trange_low_1000bp\trange_high_1000bp\tmedian_gc_1000bp\tcontigs_analyzed_1000bp\tfasta_recovered_percent_3000bp\tfasta_ignored_missing_percent_3000bp\tfasta_ignored_small_percent_3000bp\tfasta_ignored_total_percent_3000bp\tmean_3000bp\tsd_3000bp\trange_low_3000bp\trange_high_3000bp\tmedian_gc_3000bp\tcontigs_analyzed_3000bp\tfasta_recovered_percent_5000bp\tfasta_ignored_missing_percent_5000bp\tfasta_ignored_small_percent_5000bp\tfasta_ignored_total_percent_5000bp\tmean_5000bp\tsd_5000bp\trange_low_5000bp\trange_high_5000bp\tmedian_gc_5000bp\tcontigs_analyzed_5000bp\tfasta_recovered_percent_20000bp\tfasta_ignored_missing_percent_20000bp\tfasta_ignored_small_percent_20000bp\tfasta_ignored_total_percent_20000bp\tmean_20000bp\tsd_20000bp\trange_low_20000bp\trange_high_20000bp\tmedian_gc_20000bp\tcontigs_analyzed_20000bp\tfasta_recovered_percent_80000bp\tfasta_ignored_missing_percent_80000bp\tfasta_ignored_small_percent_80000bp\tfasta_ignored_total_percent_80000bp\tmean_80000bp\tsd_80000bp\trange_low_80000bp\trange_high_80000bp\tmedian_gc_80000bp\tcontigs_analyzed_80000bp\tfasta_recovered_percent_320000bp\tfasta_ignored_missing_percent_320000bp\tfasta_ignored_small_percent_320000bp\tfasta_ignored_total_percent_320000bp\tmean_320000bp\tsd_320000bp\trange_low_320000bp\trange_high_320000bp\tmedian_gc_320000bp\tcontigs_analyzed_320000bp\n")
+outfile.write('\t'.join(['Sample', 'Class', 'fasta_number']+[column+'_'+str(window)+'bp' for window in windows for column in COLUMNS])+'\n')
 outfile_ggplot_path=path+'/'+'isochore_summary_ggplot_'+Class+'_'+str(timesinceepoch)+'.tsv'
 outfile_ggplot = open(outfile_ggplot_path, 'a')
 outfile_ggplot.write("Sample\tClass\tfasta_number\twindow_size\tfasta_recovered_percent\tfasta_ignored_missing_percent\ttfasta_ignored_small_percent\tfasta_ignored_total_percent\tmean_gc\tsd_gc\trange_low_gc\trange_high_gc\tmedian_gc\tcontigs_analyzed\n")
 
-
-#Compile list of samples:
-os.chdir(inputpath)
-paths = [p.rstrip('/') for p in glob('*/')]  #Suggested here: http://stackoverflow.com/questions/800197/how-to-get-all-of-the-immediate-subdirectories-in-python#comment63926589_18278257
-for p in paths:
-	sub_string = str(p)
-	if sub_string.startswith('Run'):
-		sub_string_sample1 = re.sub('^.*Run1.831_GC_output_', '', sub_string) #Removes beginning of filename
-		sub_string_sample2 = re.sub('_\d*_\d*$', '', sub_string_sample1) #Removes timestamp and window size
-		if not sub_string_sample2 in d.keys():
-			d[sub_string_sample2] = 1
+#Iterate through every sample in the directory you provided and print the values of its runs on one line to the output file.
+for Sample in samples:
+	fasta_number, values = 'NA', OrderedDict()
+	for window in windows:
+		values[window] = ['NA']*len(COLUMNS)
+		if (Sample, window) in chosen:
+			run = entries[chosen[(Sample, window)]]['values']
+			fasta_number, values[window] = run[0], list(run[1:])
+			print('Wrote data for', Sample, 'at '+str(window)+'bp')
 		else:
-			d[sub_string_sample2] = d[sub_string_sample2]+1
-
-#Iterate through every sample in the directory you provided. Pulls out relevant info from the log file and prints it one one line to the output file.
-for key in d:
-	#Initialize these variables with default of "NA" for each value:
-	fasta_recovered_percent_1000bp, fasta_ignored_missing_percent_1000bp, fasta_ignored_small_percent_1000bp, fasta_ignored_total_percent_1000bp, mean_1000bp, sd_1000bp, range_low_1000bp, range_high_1000bp, median_gc_1000bp, contigs_analyzed_1000bp, fasta_recovered_percent_3000bp, fasta_ignored_missing_percent_3000bp, fasta_ignored_small_percent_3000bp, fasta_ignored_total_percent_3000bp, mean_3000bp, sd_3000bp, range_low_3000bp, range_high_3000bp, median_gc_3000bp, contigs_analyzed_3000bp, fasta_recovered_percent_5000bp, fasta_ignored_missing_percent_5000bp, fasta_ignored_small_percent_5000bp, fasta_ignored_total_percent_5000bp, mean_5000bp, sd_5000bp, range_low_5000bp, range_high_5000bp, median_gc_5000bp, contigs_analyzed_5000bp, fasta_recovered_percent_20000bp, fasta_ignored_missing_percent_20000bp, fasta_ignored_small_percent_20000bp, fasta_ignored_total_percent_20000bp, mean_20000bp, sd_20000bp, range_low_20000bp, range_high_20000bp, median_gc_20000bp, contigs_analyzed_20000bp, fasta_recovered_percent_80000bp, fasta_ignored_missing_percent_80000bp, fasta_ignored_small_percent_80000bp, fasta_ignored_total_percent_80000bp, mean_80000bp, sd_80000bp, range_low_80000bp, range_high_80000bp, median_gc_80000bp, contigs_analyzed_80000bp, fasta_recovered_percent_320000bp, fasta_ignored_missing_percent_320000bp, fasta_ignored_small_percent_320000bp, fasta_ignored_total_percent_320000bp, mean_320000bp, sd_320000bp, range_low_320000bp, range_high_320000bp, median_gc_320000bp, contigs_analyzed_320000bp = 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA', 'NA'
-	#Defaults these to "None" in case the analysis did not produce a log file output
-	file_1000bp, file_3000bp, file_5000bp, file_20000bp, file_80000bp, file_320000bp = None, None, None, None, None, None
-	#Iterative variable:
-	Sample = key
-	try:  ##Creates an empty list [] if it can't find anything.
-		file_1000bp = glob(inputpath+'/'+'Run1.831_GC_output_'+key+'_1000_*/log*')
-	except Exception:
-		pass
-	try:
-		file_3000bp = glob(inputpath+'/'+'Run1.831_GC_output_'+key+'_3000_*/log*')
-	except Exception:
-		pass
-	try:
-		file_5000bp = glob(inputpath+'/'+'Run1.831_GC_output_'+key+'_5000_*/log*')
-	except Exception:
-		pass
-	try:
-		file_20000bp = glob(inputpath+'/'+'Run1.831_GC_output_'+key+'_20000_*/log*')
-	except Exception:
-		pass
-	try:
-		file_80000bp = glob(inputpath+'/'+'Run1.831_GC_output_'+key+'_80000_*/log*')
-	except Exception:
-		pass
-	try:
-		file_320000bp = glob(inputpath+'/'+'Run1.831_GC_output_'+key+'_320000_*/log*')
-	except Exception:
-		pass
-	if len(file_1000bp)==0:  ##Checks to see that a file was found. If there was no log file found, the result of len(file_1000bp) will be 0 and this loop will be skipped.
-		print('No log file for', key, 'at 1000bp. Skipping...')
-		pass
-	else:
-		with open(file_1000bp[0], 'r') as f:
-			content = [x.strip() for x in f.readlines()] #from http://stackoverflow.com/questions/3277503/how-to-read-a-file-line-by-line-into-a-list-with-python#comment41651423_3277516
-			if content[11].startswith("Warning"):  #Checks to see if there's a warning for having a lot of contigs not included which adds a line to the log file.
-				line6, line7, line8, line9, line11, line15, line16, line17, line18, line19 = content[5].split(), content[6].split(), content[7].split(), content[8].split(), content[10].split(), content[14].split(), content[15].split(), content[16].split(), content[17].split(), content[18].split()
-			else:
-				line6, line7, line8, line9, line11, line15, line16, line17, line18, line19 = content[5].split(), content[6].split(), content[7].split(), content[8].split(), content[10].split(), content[13].split(), content[14].split(), content[15].split(), content[16].split(), content[17].split()
-			fasta_number = line6[0] #only need to define once, but in each call since a file may be missing
-			fasta_recovered_percent_1000bp = line7[7]
-			fasta_ignored_missing_percent_1000bp= line8[7]
-			fasta_ignored_small_percent_1000bp = line9[7]
-			fasta_ignored_total_percent_1000bp = line11[0]
-			mean_1000bp = line15[3]
-			sd_1000bp = line16[5]
-			range_low_1000bp = line17[4]
-			range_high_1000bp = line17[7]
-			median_gc_1000bp = line18[3]
-			contigs_analyzed_1000bp = line19[3]
-		f.close()
-		print('Wrote data for', key, 'at 1000bp')
-	if len(file_3000bp)==0:
-		print('No log file for', key, 'at 3000bp. Skipping...')
-		pass
-	else:
-		with open(file_3000bp[0], 'r') as f:
-			content = [x.strip() for x in f.readlines()] #from http://stackoverflow.com/questions/3277503/how-to-read-a-file-line-by-line-into-a-list-with-python#comment41651423_3277516
-			if content[11].startswith("Warning"):  #Checks to see if there's a warning for having a lot of contigs not included which adds a line to the log file.
-				line6, line7, line8, line9, line11, line15, line16, line17, line18, line19 = content[5].split(), content[6].split(), content[7].split(), content[8].split(), content[10].split(), content[14].split(), content[15].split(), content[16].split(), content[17].split(), content[18].split()
-			else:
-				line6, line7, line8, line9, line11, line15, line16, line17, line18, line19 = content[5].split(), content[6].split(), content[7].split(), content[8].split(), content[10].split(), content[13].split(), content[14].split(), content[15].split(), content[16].split(), content[17].split()
-			fasta_number = line6[0] #only need to define once, but in each call since a file may be missing
-			fasta_recovered_percent_3000bp = line7[7]
-			fasta_ignored_missing_percent_3000bp= line8[7]
-			fasta_ignored_small_percent_3000bp = line9[7]
-			fasta_ignored_total_percent_3000bp = line11[0]
-			mean_3000bp = line15[3]
-			sd_3000bp = line16[5]
-			range_low_3000bp = line17[4]
-			range_high_3000bp = line17[7]
-			median_gc_3000bp = line18[3]
-			contigs_analyzed_3000bp = line19[3]
-		f.close()
-		print('Wrote data for', key, 'at 3000bp')
-	if len(file_5000bp)==0:
-		print('No log file for', key, 'at 5000bp. Skipping...')
-		pass
-	else:
-		with open(file_5000bp[0], 'r') as f:
-			content = [x.strip() for x in f.readlines()] #from http://stackoverflow.com/questions/3277503/how-to-read-a-file-line-by-line-into-a-list-with-python#comment41651423_3277516
-			if content[11].startswith("Warning"):  #Checks to see if there's a warning for having a lot of contigs not included which adds a line to the log file.
-				line6, line7, line8, line9, line11, line15, line16, line17, line18, line19 = content[5].split(), content[6].split(), content[7].split(), content[8].split(), content[10].split(), content[14].split(), content[15].split(), content[16].split(), content[17].split(), content[18].split()
-			else:
-				line6, line7, line8, line9, line11, line15, line16, line17, line18, line19 = content[5].split(), content[6].split(), content[7].split(), content[8].split(), content[10].split(), content[13].split(), content[14].split(), content[15].split(), content[16].split(), content[17].split()
-			fasta_number = line6[0] #only need to define once, but in each call since a file may be missing
-			fasta_recovered_percent_5000bp = line7[7]
-			fasta_ignored_missing_percent_5000bp= line8[7]
-			fasta_ignored_small_percent_5000bp = line9[7]
-			fasta_ignored_total_percent_5000bp = line11[0]
-			mean_5000bp = line15[3]
-			sd_5000bp = line16[5]
-			range_low_5000bp = line17[4]
-			range_high_5000bp = line17[7]
-			median_gc_5000bp = line18[3]
-			contigs_analyzed_5000bp = line19[3]
-		f.close()
-		print('Wrote data for', key, 'at 5000bp')
-	if len(file_20000bp)==0:
-		print('No log file for', key, 'at 20000bp. Skipping...')
-		pass
-	else:
-		with open(file_20000bp[0], 'r') as f:
-			content = [x.strip() for x in f.readlines()] #from http://stackoverflow.com/questions/3277503/how-to-read-a-file-line-by-line-into-a-list-with-python#comment41651423_3277516
-			if content[11].startswith("Warning"):  #Checks to see if there's a warning for having a lot of contigs not included which adds a line to the log file.
-				line6, line7, line8, line9, line11, line15, line16, line17, line18, line19 = content[5].split(), content[6].split(), content[7].split(), content[8].split(), content[10].split(), content[14].split(), content[15].split(), content[16].split(), content[17].split(), content[18].split()
-			else:
-				line6, line7, line8, line9, line11, line15, line16, line17, line18, line19 = content[5].split(), content[6].split(), content[7].split(), content[8].split(), content[10].split(), content[13].split(), content[14].split(), content[15].split(), content[16].split(), content[17].split()
-			fasta_number = line6[0] #only need to define once, but in each call since a file may be missing
-			fasta_recovered_percent_20000bp = line7[7]
-			fasta_ignored_missing_percent_20000bp= line8[7]
-			fasta_ignored_small_percent_20000bp = line9[7]
-			fasta_ignored_total_percent_20000bp = line11[0]
-			mean_20000bp = line15[3]
-			sd_20000bp = line16[5]
-			range_low_20000bp = line17[4]
-			range_high_20000bp = line17[7]
-			median_gc_20000bp = line18[3]
-			contigs_analyzed_20000bp = line19[3]
-		f.close()
-		print('Wrote data for', key, 'at 20000bp')
-	if len(file_80000bp)==0:
-		print('No log file for', key, 'at 80000bp. Skipping...')
-		pass
-	else:
-		with open(file_80000bp[0], 'r') as f:
-			content = [x.strip() for x in f.readlines()] #from http://stackoverflow.com/questions/3277503/how-to-read-a-file-line-by-line-into-a-list-with-python#comment41651423_3277516
-			if content[11].startswith("Warning"):  #Checks to see if there's a warning for having a lot of contigs not included which adds a line to the log file.
-				line6, line7, line8, line9, line11, line15, line16, line17, line18, line19 = content[5].split(), content[6].split(), content[7].split(), content[8].split(), content[10].split(), content[14].split(), content[15].split(), content[16].split(), content[17].split(), content[18].split()
-			else:
-				line6, line7, line8, line9, line11, line15, line16, line17, line18, line19 = content[5].split(), content[6].split(), content[7].split(), content[8].split(), content[10].split(), content[13].split(), content[14].split(), content[15].split(), content[16].split(), content[17].split()
-			fasta_number = line6[0] #only need to define once, but in each call since a file may be missing
-			fasta_recovered_percent_80000bp = line7[7]
-			fasta_ignored_missing_percent_80000bp= line8[7]
-			fasta_ignored_small_percent_80000bp = line9[7]
-			fasta_ignored_total_percent_80000bp = line11[0]
-			mean_80000bp = line15[3]
-			sd_80000bp = line16[5]
-			range_low_80000bp = line17[4]
-			range_high_80000bp = line17[7]
-			median_gc_80000bp = line18[3]
-			contigs_analyzed_80000bp = line19[3]
-		f.close()
-		print('Wrote data for', key, 'at 80000bp')
-	if len(file_320000bp)==0:
-		print('No log file for', key, 'at 320000bp. Skipping...')
-		pass
-	else:
-		with open(file_320000bp[0], 'r') as f:
-			content = [x.strip() for x in f.readlines()] #from http://stackoverflow.com/questions/3277503/how-to-read-a-file-line-by-line-into-a-list-with-python#comment41651423_3277516
-			if content[11].startswith("Warning"):  #Checks to see if there's a warning for having a lot of contigs not included which adds a line to the log file.
-				line6, line7, line8, line9, line11, line15, line16, line17, line18, line19 = content[5].split(), content[6].split(), content[7].split(), content[8].split(), content[10].split(), content[14].split(), content[15].split(), content[16].split(), content[17].split(), content[18].split()
-			else:
-				line6, line7, line8, line9, line11, line15, line16, line17, line18, line19 = content[5].split(), content[6].split(), content[7].split(), content[8].split(), content[10].split(), content[13].split(), content[14].split(), content[15].split(), content[16].split(), content[17].split()
-			fasta_number = line6[0] #only need to define once, but in each call since a file may be missing
-			fasta_recovered_percent_320000bp = line7[7]
-			fasta_ignored_missing_percent_320000bp= line8[7]
-			fasta_ignored_small_percent_320000bp = line9[7]
-			fasta_ignored_total_percent_320000bp = line11[0]
-			mean_320000bp = line15[3]
-			sd_320000bp = line16[5]
-			range_low_320000bp = line17[4]
-			range_high_320000bp = line17[7]
-			median_gc_320000bp = line18[3]
-			contigs_analyzed_320000bp = line19[3]
-		f.close()
-		print('Wrote data for', key, 'at 320000bp')
+			print('No log file for', Sample, 'at '+str(window)+'bp. Skipping...')
 	#Outputs all of these variables to a new line in the output file:
-	outfile.write(Sample + '\t' + Class + '\t' + fasta_number + '\t' + fasta_recovered_percent_1000bp + '\t' + fasta_ignored_missing_percent_1000bp + '\t' + fasta_ignored_small_percent_1000bp + '\t' + fasta_ignored_total_percent_1000bp + '\t' + mean_1000bp + '\t' + sd_1000bp + '\t' + range_low_1000bp + '\t' + range_high_1000bp + '\t' + median_gc_1000bp + '\t' + contigs_analyzed_1000bp + '\t' + fasta_recovered_percent_3000bp + '\t' + fasta_ignored_missing_percent_3000bp + '\t' + fasta_ignored_small_percent_3000bp + '\t' + fasta_ignored_total_percent_3000bp + '\t' + mean_3000bp + '\t' + sd_3000bp + '\t' + range_low_3000bp + '\t' + range_high_3000bp + '\t' + median_gc_3000bp + '\t' + contigs_analyzed_3000bp + '\t' + fasta_recovered_percent_5000bp + '\t' + fasta_ignored_missing_percent_5000bp + '\t' + fasta_ignored_small_percent_5000bp + '\t' + fasta_ignored_total_percent_5000bp + '\t' + mean_5000bp + '\t' + sd_5000bp + '\t' + range_low_5000bp + '\t' + range_high_5000bp + '\t' + median_gc_5000bp + '\t' + contigs_analyzed_5000bp + '\t' + fasta_recovered_percent_20000bp + '\t' + fasta_ignored_missing_percent_20000bp + '\t' + fasta_ignored_small_percent_20000bp + '\t' + fasta_ignored_total_percent_20000bp + '\t' + mean_20000bp + '\t' + sd_20000bp + '\t' + range_low_20000bp + '\t' + range_high_20000bp + '\t' + median_gc_20000bp + '\t' + contigs_analyzed_20000bp + '\t' + fasta_recovered_percent_80000bp + '\t' + fasta_ignored_missing_percent_80000bp + '\t' + fasta_ignored_small_percent_80000bp + '\t' + fasta_ignored_total_percent_80000bp + '\t' + mean_80000bp + '\t' + sd_80000bp + '\t' + range_low_80000bp + '\t' + range_high_80000bp + '\t' + median_gc_80000bp + '\t' + contigs_analyzed_80000bp + '\t' + fasta_recovered_percent_320000bp + '\t' + fasta_ignored_missing_percent_320000bp + '\t' + fasta_ignored_small_percent_320000bp + '\t' + fasta_ignored_total_percent_320000bp + '\t' + mean_320000bp + '\t' + sd_320000bp + '\t' + range_low_320000bp + '\t' + range_high_320000bp + '\t' + median_gc_320000bp + '\t' + contigs_analyzed_320000bp + '\n')
+	outfile.write('\t'.join([Sample, Class, fasta_number]+[value for window in windows for value in values[window]])+'\n')
 	#Outputs the same information in a format better for feeding into the ggplot2 package in R:
-	outfile_ggplot.write(Sample + '\t' + Class + '\t' + fasta_number + '\t' + '1000' + '\t' + fasta_recovered_percent_1000bp + '\t' + fasta_ignored_missing_percent_1000bp + '\t' + fasta_ignored_small_percent_1000bp + '\t' + fasta_ignored_total_percent_1000bp + '\t' + mean_1000bp + '\t' + sd_1000bp + '\t' + range_low_1000bp + '\t' + range_high_1000bp + '\t' + median_gc_1000bp + '\t' + contigs_analyzed_1000bp + '\n' + Sample + '\t' + Class + '\t' + fasta_number + '\t' + '3000' + '\t' + fasta_recovered_percent_3000bp + '\t' + fasta_ignored_missing_percent_3000bp + '\t' + fasta_ignored_small_percent_3000bp + '\t' + fasta_ignored_total_percent_3000bp + '\t' + mean_3000bp + '\t' + sd_3000bp + '\t' + range_low_3000bp + '\t' + range_high_3000bp + '\t' + median_gc_3000bp + '\t' + contigs_analyzed_3000bp + '\n' + Sample + '\t' + Class + '\t' + fasta_number + '\t' + '5000' + '\t' + fasta_recovered_percent_5000bp + '\t' + fasta_ignored_missing_percent_5000bp + '\t' + fasta_ignored_small_percent_5000bp + '\t' + fasta_ignored_total_percent_5000bp + '\t' + mean_5000bp + '\t' + sd_5000bp + '\t' + range_low_5000bp + '\t' + range_high_5000bp + '\t' + median_gc_5000bp + '\t' + contigs_analyzed_5000bp + '\n' + Sample + '\t' + Class + '\t' + fasta_number + '\t' + '20000' + '\t' + fasta_recovered_percent_20000bp + '\t' + fasta_ignored_missing_percent_20000bp + '\t' + fasta_ignored_small_percent_20000bp + '\t' + fasta_ignored_total_percent_20000bp + '\t' + mean_20000bp + '\t' + sd_20000bp + '\t' + range_low_20000bp + '\t' + range_high_20000bp + '\t' + median_gc_20000bp + '\t' + contigs_analyzed_20000bp + '\n' + Sample + '\t' + Class + '\t' + fasta_number + '\t' + '80000' + '\t' + fasta_recovered_percent_80000bp + '\t' + fasta_ignored_missing_percent_80000bp + '\t' + fasta_ignored_small_percent_80000bp + '\t' + fasta_ignored_total_percent_80000bp + '\t' + mean_80000bp + '\t' + sd_80000bp + '\t' + range_low_80000bp + '\t' + range_high_80000bp + '\t' + median_gc_80000bp + '\t' + contigs_analyzed_80000bp + '\n' + Sample + '\t' + Class + '\t' + fasta_number + '\t' + '320000' + '\t' + fasta_recovered_percent_320000bp + '\t' + fasta_ignored_missing_percent_320000bp + '\t' + fasta_ignored_small_percent_320000bp + '\t' + fasta_ignored_total_percent_320000bp + '\t' + mean_320000bp + '\t' + sd_320000bp + '\t' + range_low_320000bp + '\t' + range_high_320000bp + '\t' + median_gc_320000bp + '\t' + contigs_analyzed_320000bp + '\n')
-	
+	outfile_ggplot.write(''.join('\t'.join([Sample, Class, fasta_number, str(window)]+values[window])+'\n' for window in windows))
+
 outfile.close()
 outfile_ggplot.close()
 print('Regular output:', outfile_path)
 print('ggplot2 output:', outfile_ggplot_path)
 
+#Pool the summary statistics of every sample by window size, merging the statistics of the runs summarized above, unless the cache has them pooled for the same runs (at this step; every step is pooled and cached on its own):
+pooled_key = hashlib.sha256(json.dumps(sorted([logfile, entries[logfile]['signature']] for logfile in chosen.values())).encode('utf-8')).hexdigest()
+pooled, stepkey = OrderedDict(), str(args.step)
+if cached_pooled.get(stepkey, {}).get('key') == pooled_key:
+	for window, samples_pooled, data in cached_pooled[stepkey]['windows']:
+		pooled[window] = [samples_pooled, isochore_stats.GcStats.from_dict(data)]
+else:
+	for (sample, window), logfile in sorted(chosen.items(), key=lambda item: item[0][1]):
+		if logfile in stats_paths:
+			samples_pooled, stats = pooled.setdefault(window, [0, isochore_stats.GcStats()])
+			with open(stats_paths[logfile], 'r') as f:
+				stats.merge_dict(json.load(f))
+			pooled[window][0] = samples_pooled+1
+	cached_pooled[stepkey] = {'key': pooled_key, 'windows': [[window, samples_pooled, stats.to_dict()] for window, (samples_pooled, stats) in pooled.items()]}
+	nread = nread+1	##the cache has to be saved with the new pooled statistics
+if not args.no_cache:
+	##Keep the cached runs that were not needed here (those of other steps, and older runs) unless their log is gone, and only rewrite the cache when a run was read or removed, or the pooled statistics changed:
+	kept = dict((logfile, entry) for logfile, entry in cache.items() if logfile not in entries and os.path.exists(logfile))
+	if nread or len(kept)+len(entries) != len(cache):
+		kept.update(entries)
+		save_cache(cachefile, kept, cached_pooled)
+outfile_pooled_path=path+'/'+'isochore_pooled_stats_'+Class+'_'+str(timesinceepoch)+'.tsv'
+with open(outfile_pooled_path, 'w') as outfile_pooled:
+	outfile_pooled.write("Class\twindow_size\tsamples\twindows_analyzed\tmean_gc\tsd_gc\trange_low_gc\trange_high_gc\tpercentile_5_gc\tpercentile_25_gc\tmedian_gc\tpercentile_75_gc\tpercentile_95_gc\n")
+	for window, (samples_pooled, stats) in pooled.items():
+		if not stats.count:
+			outfile_pooled.write('\t'.join([Class, str(window), str(samples_pooled), '0']+['NA']*9)+'\n')
+			continue
+		values = [stats.mean, stats.sd(), stats.minimum, stats.maximum]+[stats.percentile(q) for q in (5, 25, 50, 75, 95)]
+		outfile_pooled.write('\t'.join([Class, str(window), str(samples_pooled), str(stats.count)]+[str(value) for value in values])+'\n')
+print('Pooled statistics output:', outfile_pooled_path)
+
 ##  Record the endtime time:
 then = datetime.datetime.now()
 print('Time at the end of the script:', then)
-endtime = time.clock()
+endtime = cpu_clock()
 elapsedtime = endtime - starttime
 print(elapsedtime, "seconds elapsed running this script (i.e., ", elapsedtime/60, "minutes).\n\n======================================\n")
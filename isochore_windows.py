@@ -0,0 +1,135 @@
+#!/usr/bin/python
+
+##  Columnar binary per-window output of isochore_analyzer1.831.py.
+##  Usage:
+##    >>> python isochore_analyzer1.831.py filename.fasta organism group 1000 --format binary
+##    >>> python isochore_windows.py export Run1.831_GC_output_organism_1000_1468015719 [...]
+##    >>> import isochore_windows
+##    >>> windows, contigs = isochore_windows.load('Run1.831_GC_output_organism_1000_1468015719')
+##    >>> windows['gc_percent'][windows['status'] == isochore_windows.ANALYZED]
+##  With --format binary (or both), every run folder gets two files in place of (or next to) the three TSV files:
+##    windows_<organism>_<window size>_<time since epoch>.npy << one row per line the TSV files would have, as a NumPy structured array of DTYPE:
+##      contig << number of the contig in the contig table, from 0
+##      window << index of the window in the contig, from 0 (its start is window times the window size, or times the step)
+##      gc_percent << GC percentage of the window; NaN for the rows of the two unused TSV files
+##      missing_bases << ambiguous or missing bases in the window; -1 for the final partial window of a contig, whose length is not kept
+##      status << ANALYZED (gc_content), MISSING (unused_contigs_missing_data: the first missing-data window, which ends the contig) or SHORT (unused_short_contigs_content: the final partial window)
+##      metric columns << with --metrics, one more column per metric column of isochore_metrics.py, named as in the manifest's metric_columns: counts as int64 (-1 for the rows of the two unused TSV files) and ratios as float64 (NaN for those rows and for ratios without a denominator)
+##    contigs_<organism>_<window size>_<time since epoch>.json << the keys of the contigs, in the order of their numbers
+##  Rows are buffered and written in batches of BATCH rows. The file is a standard .npy file with a header of HEADER_BYTES bytes (more with many metric columns), filled in when the run is finished, so numpy.load(path, mmap_mode='r') memory-maps it and a column is read without parsing any text.
+##  export writes the three TSV files of a run folder from its binary output, as the analyzer would have written them, so the TSV files can be made later for the runs that need them. They are written with the float formatting of the Python that runs it, as the analyzer writes them.
+
+##  Setup environment:
+from  __future__ import print_function
+import sys, os, json, struct, numpy
+import isochore_metrics
+
+ANALYZED, MISSING, SHORT = 0, 1, 2	##status of a row: which TSV file it belongs to
+DTYPE = numpy.dtype([('contig', '<i4'), ('window', '<i8'), ('gc_percent', '<f8'), ('missing_bases', '<i8'), ('status', 'u1')])
+BATCH = 1024**2	##rows held before they are written
+HEADER_BYTES = 256	##bytes of the .npy header, so it can be filled in once the number of rows is known
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+
+def window_dtype(metric_types=()):
+	"""Return DTYPE with the metric columns, given as (name, NumPy type), added at the end."""
+	return numpy.dtype(DTYPE.descr+list(metric_types))
+
+def npy_header(rows, dtype=DTYPE):
+	"""Return the .npy (version 1.0) header of a one-dimensional array of dtype with the given number of rows, padded to HEADER_BYTES, or to the next multiple of 64 bytes that holds any number of rows."""
+	header = "{'descr': "+repr(numpy.lib.format.dtype_to_descr(dtype))+", 'fortran_order': False, 'shape': ("+str(rows)+",), }"
+	size = max(HEADER_BYTES, -(-(len(NPY_MAGIC)+2+len(header)-len(str(rows))+20+1)//64)*64)
+	header = header.ljust(size-len(NPY_MAGIC)-2-1)+'\n'
+	return NPY_MAGIC+struct.pack('<H', len(header))+header.encode('latin1')
+
+class WindowColumns(object):
+	"""Binary output of the windows of one run, written in batches."""
+	def __init__(self, path, contigpath, metric_types=()):
+		self.path, self.contigpath, self.dtype = path, contigpath, window_dtype(metric_types)
+		self.handle = open(path, 'wb')
+		self.handle.write(npy_header(0, self.dtype))
+		self.keys, self.batch, self.buffered, self.rows = [], [], 0, 0
+
+	def add_contig(self, key, gc_percent, missing_bases, first_missing, nwindows, metrics=()):
+		"""Add the rows of one contig: the GC percentages and missing bases of its analyzed windows, then either its first missing-data window or its final partial window.
+		missing_bases holds the missing bases of every complete window of the contig, including any beyond the first missing-data window, and metrics the (name, values) of the metric columns of its analyzed windows."""
+		contig, analyzed = len(self.keys), len(gc_percent)
+		self.keys.append(key)
+		rows = numpy.empty(analyzed+1, dtype=self.dtype)
+		rows['contig'] = contig
+		rows['window'][:analyzed] = numpy.arange(analyzed)
+		rows['gc_percent'][:analyzed] = gc_percent
+		rows['missing_bases'][:analyzed] = missing_bases[:analyzed]
+		rows['status'][:analyzed] = ANALYZED
+		rows['gc_percent'][analyzed] = numpy.nan
+		for name, values in metrics:
+			rows[name][:analyzed] = values
+			rows[name][analyzed] = numpy.nan if rows.dtype[name].kind == 'f' else -1
+		if first_missing is not None:
+			rows['window'][analyzed], rows['missing_bases'][analyzed], rows['status'][analyzed] = first_missing, missing_bases[first_missing], MISSING
+		else:
+			rows['window'][analyzed], rows['missing_bases'][analyzed], rows['status'][analyzed] = nwindows, -1, SHORT
+		self.batch.append(rows)
+		self.buffered = self.buffered+len(rows)
+		if self.buffered >= BATCH:
+			self.flush()
+
+	def flush(self):
+		"""Write the buffered rows."""
+		if self.batch:
+			self.handle.write(numpy.concatenate(self.batch).tobytes())
+			self.rows = self.rows+self.buffered
+			self.batch, self.buffered = [], 0
+
+	def close(self):
+		"""Write the remaining rows, fill in the header and write the contig table."""
+		self.flush()
+		self.handle.seek(0)
+		self.handle.write(npy_header(self.rows, self.dtype))
+		self.handle.close()
+		with open(self.contigpath, 'w') as handle:
+			json.dump(self.keys, handle)
+			handle.write('\n')
+
+def run_files(runfolder):
+	"""Return the paths of the windows, contigs and manifest files of a run folder."""
+	name = os.path.basename(os.path.normpath(runfolder)).split('_GC_output_', 1)[1]
+	return [os.path.join(runfolder, prefix+name+suffix) for prefix, suffix in (('windows_', '.npy'), ('contigs_', '.json'), ('manifest_', '.json'))]
+
+def load(runfolder, mmap_mode='r'):
+	"""Return the rows of the binary output of a run folder (memory-mapped by default) and the list of its contig keys."""
+	windowspath, contigpath, manifestpath = run_files(runfolder)
+	with open(contigpath, 'r') as handle:
+		keys = json.load(handle)
+	return numpy.load(windowspath, mmap_mode=mmap_mode), keys
+
+def export(runfolder):
+	"""Write the three TSV files of a run folder from its binary output and its manifest, with the metric columns of the analyzed windows, if any. Returns their paths."""
+	windowspath, contigpath, manifestpath = run_files(runfolder)
+	with open(manifestpath, 'r') as handle:
+		manifest = json.load(handle)
+	rows, keys = load(runfolder)
+	organism, group, step, windowsize = manifest['organism'], manifest['group'], manifest['step'], manifest['window_size']
+	name = os.path.basename(os.path.normpath(runfolder)).split('_GC_output_', 1)[1]
+	paths = [os.path.join(runfolder, prefix+name+'.tsv') for prefix in ('gc_content_', 'unused_contigs_missing_data_', 'unused_short_contigs_content_')]
+	outputs = [open(path, 'w') for path in paths]
+	try:
+		metric_names = rows.dtype.names[len(DTYPE.names):]
+		for start in range(0, len(rows), BATCH):
+			batch = rows[start:start+BATCH]
+			contigs, windows, values, statuses = batch['contig'].tolist(), batch['window'].tolist(), batch['gc_percent'].tolist(), batch['status'].tolist()
+			extra = ['\t'+'\t'.join(row) for row in zip(*isochore_metrics.text_columns((name, batch[name]) for name in metric_names))] if metric_names else ['']*len(batch)
+			for contig, i, value, status, metric_text in zip(contigs, windows, values, statuses, extra):
+				coordinates = "\t{}\t{}".format(i*step, i*step+windowsize) if step else ''
+				outputs[status].write("{}\t{}\t{}\t{}{}{}\n".format(str(keys[contig])+'_'+str(i), value if status == ANALYZED else 1, organism, group, coordinates, metric_text if status == ANALYZED else ''))
+	finally:
+		for output in outputs:
+			output.close()
+	return paths
+
+##  Export the TSV files of every run folder given on the command line:
+if __name__ == '__main__':
+	if len(sys.argv) < 3 or sys.argv[1] != 'export':
+		sys.exit('Usage: python isochore_windows.py export runfolder [runfolder2 ...]')
+	for runfolder in sys.argv[2:]:
+		for path in export(runfolder):
+			print('Successfully created', path)